@@ -0,0 +1,125 @@
+import hashlib
+import threading
+
+import click
+from flask import Response, current_app, request
+from flask.cli import with_appcontext
+
+from utils.etag import not_modified
+
+
+SPEC_ENDPOINT = "apispec_1"
+# prefixes whose spec is kept, more only come from a misconfigured proxy
+MAX_CACHED_SPECS = 4
+
+
+class ApiDocs:
+    """
+    swagger ui under /swagger/ and the openapi spec under /apispec_1.json.
+
+    flasgger is imported by init_app(), SWAGGER_ENABLED=False neither
+    imports it nor registers its routes (production). the spec is built from
+    the view docstrings on its first request and kept as json bytes, with
+    SWAGGER_SPEC_FILE (written by `flask export-openapi`) that file is served
+    instead and nothing is built.
+
+    behind a reverse proxy mounting the app under a path the spec's paths get
+    that prefix: SWAGGER_URL_PREFIX, or else the request's SCRIPT_NAME (set
+    by the WSGI server, or by werkzeug's ProxyFix(x_prefix=1) from a proxy
+    that is trusted). a client header is never used, it would let anyone fill
+    the cache.
+    """
+
+    def __init__(self):
+        self.swagger = None
+        self.spec_file = None
+        self.prefix = None
+        # prefix -> (json bytes, etag), oldest first
+        self._specs = {}
+        # build_spec() sets the template shared by all requests
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        if not app.config.get("SWAGGER_ENABLED", True):
+            return
+        from flasgger import Swagger
+
+        app.config.setdefault("SWAGGER", {"title": "Swagger-UI", "uiversion": 2})
+        swagger_config = {
+            "headers": [],
+            "specs": [
+                {
+                    "endpoint": SPEC_ENDPOINT,
+                    "route": f"/{SPEC_ENDPOINT}.json",
+                    "rule_filter": lambda rule: True,  # all in
+                    "model_filter": lambda tag: True,  # all in
+                }
+            ],
+            "static_url_path": "/flasgger_static",
+            "swagger_ui": True,
+            "specs_route": "/swagger/",
+        }
+        self.swagger = Swagger(app, config=swagger_config)
+        self.spec_file = app.config.get("SWAGGER_SPEC_FILE")
+        self.prefix = app.config.get("SWAGGER_URL_PREFIX")
+        app.view_functions[f"flasgger.{SPEC_ENDPOINT}"] = self.spec_view
+        app.extensions["api_docs"] = self
+
+    def build_spec(self, prefix=""):
+        """
+        openapi spec of the registered routes as json bytes, their paths
+        prefixed for a reverse proxy mounting the app under prefix.
+        """
+        with self._lock:
+            self.swagger.template = {"swaggerUiPrefix": prefix} if prefix else None
+            self.swagger.apispecs.pop(SPEC_ENDPOINT, None)
+            spec = self.swagger.get_apispecs(SPEC_ENDPOINT)
+        return current_app.json.dumps(spec).encode()
+
+    def spec(self, prefix=""):
+        if self.spec_file:
+            prefix = ""
+        cached = self._specs.get(prefix)
+        if cached is not None:
+            return cached
+        if self.spec_file:
+            with open(self.spec_file, "rb") as f:
+                body = f.read()
+        else:
+            body = self.build_spec(prefix)
+        cached = (body, hashlib.sha1(body).hexdigest()[:16])
+        with self._lock:
+            while len(self._specs) >= MAX_CACHED_SPECS:
+                self._specs.pop(next(iter(self._specs)))
+            self._specs[prefix] = cached
+        return cached
+
+    def request_prefix(self):
+        if self.prefix is not None:
+            return self.prefix
+        return request.script_root
+
+    def spec_view(self):
+        body, etag = self.spec(self.request_prefix())
+        cached = not_modified(etag)
+        if cached is not None:
+            return cached
+        response = Response(body, mimetype="application/json")
+        response.set_etag(etag)
+        return response.make_conditional(request)
+
+
+def get_api_docs():
+    return current_app.extensions["api_docs"]
+
+
+@click.command("export-openapi")
+@click.argument("path", type=click.Path(dir_okay=False, writable=True))
+@with_appcontext
+def export_openapi_command(path):
+    """Write the OpenAPI spec to a file for SWAGGER_SPEC_FILE."""
+    if "api_docs" not in current_app.extensions:
+        raise click.ClickException("SWAGGER_ENABLED is off")
+    with open(path, "wb") as f:
+        f.write(get_api_docs().build_spec())
+    click.echo(f"wrote {path}")
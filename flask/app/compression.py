@@ -0,0 +1,214 @@
+import zlib
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_LEVELS = {"br": 4, "zstd": 3, "gzip": 6}
+DEFAULT_MIMETYPES = (
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "text/csv",
+    "text/css",
+    "text/html",
+    "text/plain",
+)
+
+
+class _Gzip:
+    def __init__(self, level):
+        self.level = level
+
+    def compress(self, data):
+        return zlib.compress(data, self.level, wbits=16 + zlib.MAX_WBITS)
+
+    def compress_stream(self, chunks):
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+        yield compressor.flush()
+
+
+class _Brotli:
+    def __init__(self, level):
+        self.level = level
+
+    def compress(self, data):
+        return brotli.compress(data, quality=self.level)
+
+    def compress_stream(self, chunks):
+        compressor = brotli.Compressor(quality=self.level)
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+
+
+class _Zstd:
+    def __init__(self, level):
+        self.level = level
+
+    def compress(self, data):
+        return zstandard.ZstdCompressor(level=self.level).compress(data)
+
+    def compress_stream(self, chunks):
+        compressor = zstandard.ZstdCompressor(level=self.level).compressobj()
+        for chunk in chunks:
+            yield compressor.compress(chunk) + compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+        yield compressor.flush()
+
+
+def available_encodings():
+    """
+    encodings this process can produce, in order of preference.
+    """
+    encodings = []
+    if brotli is not None:
+        encodings.append("br")
+    if zstandard is not None:
+        encodings.append("zstd")
+    encodings.append("gzip")
+    return encodings
+
+
+_ENCODERS = {"br": _Brotli, "zstd": _Zstd, "gzip": _Gzip}
+
+
+def encoded_etag(etag, encoding):
+    """
+    strong etag of the encoding of the representation tagged etag,
+    "product-1-5" -> "product-1-5-gzip". each encoding is its own byte
+    sequence, so it gets its own strong tag.
+    """
+    return f"{etag}-{encoding}"
+
+
+class _CompressedStream:
+    """
+    compresses a streamed response body chunk by chunk. every chunk is
+    flushed, so the client can decode each one as it arrives.
+    """
+
+    def __init__(self, iterable, encoder):
+        self.iterable = iterable
+        self.encoder = encoder
+
+    def __iter__(self):
+        return self.encoder.compress_stream(self._chunks())
+
+    def _chunks(self):
+        for chunk in self.iterable:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            if chunk:
+                yield chunk
+
+    def close(self):
+        close = getattr(self.iterable, "close", None)
+        if close is not None:
+            close()
+
+
+class Compression:
+    """
+    compresses responses with the best encoding the client accepts.
+
+    gzip is always available, br and zstd when the brotli or zstandard
+    package is installed. only text like mimetypes (COMPRESS_MIMETYPES) are
+    compressed, bodies smaller than COMPRESS_MIN_SIZE bytes, responses that
+    already have a Content-Encoding, partial and passthrough (send_file)
+    responses are sent as they are. streamed bodies have no size up front,
+    they are always compressed, chunk by chunk.
+
+    a compressed response keeps a strong ETag, the encoding is appended to
+    it (encoded_etag()), utils.etag.not_modified() matches either tag.
+    """
+
+    def __init__(self, min_size=DEFAULT_MIN_SIZE, mimetypes=DEFAULT_MIMETYPES):
+        self.min_size = min_size
+        self.mimetypes = frozenset(mimetypes)
+        self.encoders = {}
+
+    def init_app(self, app):
+        if not app.config.get("COMPRESS_ENABLED", True):
+            return
+        self.min_size = app.config.get("COMPRESS_MIN_SIZE", self.min_size)
+        self.mimetypes = frozenset(app.config.get("COMPRESS_MIMETYPES", self.mimetypes))
+        levels = {**DEFAULT_LEVELS, **app.config.get("COMPRESS_LEVELS", {})}
+        encodings = app.config.get("COMPRESS_ENCODINGS", available_encodings())
+        self.encoders = {
+            encoding: _ENCODERS[encoding](levels[encoding])
+            for encoding in encodings
+            if encoding in available_encodings()
+        }
+        # registered last, so it runs before the other after_request hooks
+        # and the metrics count the bytes that are actually sent
+        app.after_request(self._after_request)
+        app.extensions["compression"] = self
+
+    def negotiate(self, accept_encodings):
+        """
+        encoding to use for an Accept-Encoding header, None for identity.
+        the client's quality wins, ties go to the server's order.
+        """
+        best, best_quality = None, 0
+        for encoding in self.encoders:
+            quality = accept_encodings[encoding]
+            if quality > best_quality:
+                best, best_quality = encoding, quality
+        return best
+
+    def request_etag(self, etag):
+        """
+        tag a response tagged etag gets for the current request when it is
+        large enough to be compressed, None if it would not be compressed.
+        """
+        if request.method == "HEAD":
+            return None
+        encoding = self.negotiate(request.accept_encodings)
+        return None if encoding is None else encoded_etag(etag, encoding)
+
+    def _should_compress(self, response):
+        if response.mimetype not in self.mimetypes:
+            return False
+        if response.status_code < 200 or response.status_code in (204, 206, 304):
+            return False
+        if response.direct_passthrough or "Content-Encoding" in response.headers:
+            return False
+        if "Content-Range" in response.headers:
+            return False
+        return True
+
+    def _after_request(self, response):
+        if not self._should_compress(response):
+            return response
+        response.vary.add("Accept-Encoding")
+        encoding = self.negotiate(request.accept_encodings)
+        if encoding is None or request.method == "HEAD":
+            return response
+        encoder = self.encoders[encoding]
+
+        if response.is_streamed:
+            response.response = _CompressedStream(response.response, encoder)
+            response.headers.pop("Content-Length", None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            response.set_data(encoder.compress(data))
+
+        response.headers["Content-Encoding"] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            response.set_etag(encoded_etag(etag, encoding), weak=weak)
+        return response
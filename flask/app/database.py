@@ -0,0 +1,178 @@
+from functools import wraps
+
+from flask import current_app, g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql import Select
+
+
+READ_ENGINE = "db_read_engine"
+
+DEFAULT_POOL = {
+    "pool_size": 10,
+    "max_overflow": 20,
+    "pool_timeout": 30,
+    "pool_recycle": 1800,
+    "pool_pre_ping": True,
+}
+_POOL_CONFIG = (
+    ("DB_POOL_SIZE", "pool_size"),
+    ("DB_MAX_OVERFLOW", "max_overflow"),
+    ("DB_POOL_TIMEOUT", "pool_timeout"),
+    ("DB_POOL_RECYCLE", "pool_recycle"),
+    ("DB_POOL_PRE_PING", "pool_pre_ping"),
+)
+
+# applied to every new sqlite connection. WAL lets readers run while a
+# writer commits, NORMAL only syncs at checkpoints (a power loss can drop
+# the last commits, never corrupt the file), busy_timeout waits for the
+# write lock instead of failing with "database is locked".
+DEFAULT_SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,
+    "temp_store": "MEMORY",
+}
+
+
+def _is_sqlite(uri):
+    return uri is not None and make_url(uri).get_backend_name() == "sqlite"
+
+
+def _pool_options(config):
+    return {option: config.get(key, DEFAULT_POOL[option]) for key, option in _POOL_CONFIG}
+
+
+def engine_options(config, uri):
+    """
+    engine options of the profile for uri. server databases get the pool
+    settings, sqlite keeps the pool flask-sqlalchemy picks (a static pool
+    for :memory:) and is tuned with pragmas on connect instead.
+    """
+    if _is_sqlite(uri):
+        return {}
+    return _pool_options(config)
+
+
+def echo_flag(value):
+    """
+    SQLALCHEMY_ECHO as create_engine() takes it. from the environment
+    (.env) it is a string, "True", "False", "0" or "debug".
+    """
+    if isinstance(value, str):
+        value = value.strip().lower()
+        return "debug" if value == "debug" else value in ("1", "true", "yes", "on")
+    return value
+
+
+def configure_engines(app):
+    """
+    fill SQLALCHEMY_ENGINE_OPTIONS from the DB_* settings, must run before
+    db.init_app(). options set explicitly win.
+
+    config:
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING: pool of server databases
+    SQLITE_PRAGMAS: dict merged over DEFAULT_SQLITE_PRAGMAS
+    DB_READ_URI: database of the read_replica views, see init_engines()
+    SQLALCHEMY_ECHO: a string from the environment is made a bool
+    """
+    config = app.config
+    config["SQLALCHEMY_ECHO"] = echo_flag(config.get("SQLALCHEMY_ECHO", False))
+    options = engine_options(config, config.get("SQLALCHEMY_DATABASE_URI"))
+    options.update(config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+    config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+
+
+def init_engines(app, db):
+    """
+    after db.init_app(): create the read engine and install the sqlite
+    pragmas on every engine.
+
+    DB_READ_URI is a replica, or for sqlite the same file opened read only
+    ("sqlite:///file:/abs/path/db.sqlite3?mode=ro&uri=true") so the reads
+    get their own pool. it is not a flask-sqlalchemy bind, create_all()
+    and migrations never touch it.
+    """
+    with app.app_context():
+        engines = list(db.engines.values())
+    read_uri = app.config.get("DB_READ_URI")
+    if read_uri:
+        read_engine = create_engine(
+            read_uri, echo=app.config.get("SQLALCHEMY_ECHO", False), **engine_options(app.config, read_uri)
+        )
+        app.extensions[READ_ENGINE] = read_engine
+        engines.append(read_engine)
+    install_sqlite_pragmas(app, engines)
+
+
+def sqlite_pragmas(config):
+    return {**DEFAULT_SQLITE_PRAGMAS, **config.get("SQLITE_PRAGMAS", {})}
+
+
+def _pragma_setter(pragmas):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+        finally:
+            cursor.close()
+
+    return set_pragmas
+
+
+def install_sqlite_pragmas(app, engines):
+    """
+    set the pragmas on every connection the sqlite engines open.
+
+    the journal mode is stored in the database file and changing it needs
+    write access, read only (mode=ro) engines use the mode the primary set.
+    """
+    pragmas = sqlite_pragmas(app.config)
+    for engine in engines:
+        if engine.dialect.name != "sqlite":
+            continue
+        options = pragmas
+        if engine.url.query.get("mode") == "ro":
+            options = {name: value for name, value in pragmas.items() if name != "journal_mode"}
+        event.listen(engine, "connect", _pragma_setter(options))
+
+
+class RoutingSession(Session):
+    """
+    session sending the selects of read_replica views to the read bind.
+
+    flushes, updates and raw text statements always go to the primary, so
+    a read only view that writes anyway still writes to the right place.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (
+            bind is None
+            and not self._flushing
+            and isinstance(clause, Select)
+            and has_app_context()
+            and g.get("db_read_replica")
+        ):
+            engine = current_app.extensions.get(READ_ENGINE)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def read_replica(view):
+    """
+    run the selects of view on DB_READ_URI when it is set. only for views
+    that can serve slightly stale rows.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.db_read_replica = True
+        return view(*args, **kwargs)
+
+    return wrapper
@@ -1,49 +1,84 @@
-from flask import Flask,jsonify,request
-from app.config import db , jwt ,login_manager
-from user.user_models import User, TokenBlocklist
-from user import user_routes
-from user import user_models
+from flask import Flask,jsonify
+from app.config import db , jwt ,login_manager, migrate
+from app.api_docs import ApiDocs, export_openapi_command
+from app.compression import Compression
+from app.database import configure_engines, init_engines
+from app.json_provider import OrjsonProvider, orjson
+from app.metrics import RequestMetrics
+from app.query_stats import QueryStats
+from app.schema_check import check_schema_command
+from app.server import Readiness
+from product.coin_change import coins_command
+from product.product_importer import import_products_command
+from product.product_search import rebuild_search_index_command
+from user.user_models import User
+from user.blocklist_cache import TokenBlocklistCache, get_blocklist_cache
+from user.blocklist_purge import BlocklistPurger, purge_blocklist_command
+from user.identity_cache import UserIdentityCache, get_identity_cache
+from user.password_hasher import PasswordHasher
+from utils.custom_exception_class import CustomException
 from user.user_routes import auth_bp 
 from product.product_routes import product_bp
-from flasgger import Swagger
-from flasgger import LazyString, LazyJSONEncoder
 from dotenv import load_dotenv
 import os
 
 load_dotenv()
 
 
-def create_app():
+def create_app(config=None):
     app = Flask(__name__)
+    if orjson is not None:
+        app.json = OrjsonProvider(app)
     app.config.from_prefixed_env()
-    app.config["SWAGGER"] = {"title": "Swagger-UI", "uiversion": 2}
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('FLASK_SQLALCHEMY_DATABASE_URI')
     app.config['SECRET_KEY']== os.getenv('FLASK_SECRET_KEY')
     app.config['DEBUG']= os.getenv('FLASK_DEBUG')
     app.config['SQLALCHEMY_ECHO']=os.getenv('FLASK_SQLALCHEMY_ECHO')
     app.config['JWT_SECRET_KEY']=os.getenv('FLASK_JWT_SECRET_KEY')
 
+    # overrides (tests) must be applied before the extensions read the config
+    if config:
+        app.config.update(config)
 
 
     # initialize exts
+    configure_engines(app)
     db.init_app(app)
+    init_engines(app, db)
+    migrate.init_app(app, db, render_as_batch=True)
     jwt.init_app(app)
     login_manager.init_app(app)
+    TokenBlocklistCache().init_app(app)
+    BlocklistPurger().init_app(app)
+    UserIdentityCache().init_app(app)
+    PasswordHasher().init_app(app)
+    RequestMetrics().init_app(app)
+    QueryStats().init_app(app)
+    Compression().init_app(app)
+    Readiness().init_app(app)
 
 
     # register blueprints
     app.register_blueprint(auth_bp, url_prefix="/users")
     app.register_blueprint(product_bp, url_prefix="/products")
+    ApiDocs().init_app(app)
+
+    app.cli.add_command(check_schema_command)
+    app.cli.add_command(coins_command)
+    app.cli.add_command(export_openapi_command)
+    app.cli.add_command(import_products_command)
+    app.cli.add_command(purge_blocklist_command)
+    app.cli.add_command(rebuild_search_index_command)
 
     @login_manager.user_loader
     def load_user(user_id):
-        return User.get(user_id)
+        return get_identity_cache().resolve_id(user_id)
 
     @jwt.user_lookup_loader
     def user_lookup_callback(_jwt_headers, jwt_data):
         identity = jwt_data["sub"]
 
-        return User.query.filter_by(username=identity).one_or_none()
+        return get_identity_cache().resolve(identity)
 
     # additional claims
 
@@ -54,6 +89,10 @@ def create_app():
             return {"is_staff": True}
         return {"is_staff": False}
 
+    @app.errorhandler(CustomException)
+    def custom_exception_handler(e):
+        return jsonify({"message": e.message}), e.status_code
+
     # jwt error handlers
     @jwt.expired_token_loader
     def expired_token_callback(jwt_header, jwt_data):
@@ -84,33 +123,7 @@ def create_app():
     def token_in_blocklist_callback(jwt_header,jwt_data):
         jti = jwt_data['jti']
 
-        token = db.session.query(TokenBlocklist).filter(TokenBlocklist.jti == jti).scalar()
-
-        return token is not None
-
-        
-    swagger_config = {
-        "headers": [],
-        "specs": [
-            {
-                "endpoint": "apispec_1",
-                "route": "/apispec_1.json",
-                "rule_filter": lambda rule: True,  # all in
-                "model_filter": lambda tag: True,  # all in
-            }
-        ],
-        "static_url_path": "/flasgger_static",
-        # "static_folder": "static",  # must be set by user
-        "swagger_ui": True,
-        "specs_route": "/swagger/",
-    }
-
-    template = dict(
-        swaggerUiPrefix=LazyString(lambda: request.environ.get("HTTP_X_SCRIPT_NAME", ""))
-    )
-
-    app.json_encoder = LazyJSONEncoder
-    swagger = Swagger(app, config=swagger_config, template=template)
+        return get_blocklist_cache().is_revoked(jti)
 
         
     return app
\ No newline at end of file
@@ -0,0 +1,381 @@
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # windows, a single process there
+    fcntl = None
+
+from flask import Response, current_app, g, request
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
+DEFAULT_FLUSH_INTERVAL = 1.0
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+UNMATCHED_ENDPOINT = "unmatched"
+# counters of the workers that exited, summed into one file
+EXITED_FILE = "exited.json"
+LOCK_FILE = "metrics.lock"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _empty_totals():
+    # requests, durations, bytes, in progress
+    return {}, {}, {}, {}
+
+
+def _add_snapshot(totals, snapshot):
+    requests, durations, sizes, in_flight = totals
+    for endpoint, method, status, count in snapshot["requests"]:
+        key = (endpoint, method, status)
+        requests[key] = requests.get(key, 0) + count
+    for endpoint, method, histogram in snapshot["durations"]:
+        total = durations.setdefault((endpoint, method), [0] * len(histogram))
+        for index, value in enumerate(histogram):
+            total[index] += value
+    for endpoint, method, size in snapshot["bytes"]:
+        sizes[(endpoint, method)] = sizes.get((endpoint, method), 0) + size
+    for endpoint, method, count in snapshot["in_flight"]:
+        in_flight[(endpoint, method)] = in_flight.get((endpoint, method), 0) + count
+
+
+def _read_snapshot(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_snapshot(path, snapshot):
+    with open(path + ".tmp", "w") as f:
+        json.dump(snapshot, f)
+    os.replace(path + ".tmp", path)
+
+
+class _CountingIterable:
+    """
+    wraps a streamed response body and counts the bytes sent.
+    """
+
+    def __init__(self, iterable):
+        self.iterable = iterable
+        self.size = 0
+
+    def __iter__(self):
+        for chunk in self.iterable:
+            self.size += len(chunk.encode() if isinstance(chunk, str) else chunk)
+            yield chunk
+
+    def close(self):
+        close = getattr(self.iterable, "close", None)
+        if close is not None:
+            close()
+
+
+class RequestMetrics:
+    """
+    per endpoint request metrics exposed in prometheus text format at /metrics.
+
+    a request only takes a lock and bumps a few integers in process local
+    dicts. with METRICS_DIR set every worker process writes a snapshot of its
+    counters to METRICS_DIR/metrics_<pid>_<token>.json from a background
+    thread (at most every METRICS_FLUSH_INTERVAL seconds) and /metrics sums
+    the snapshots of all processes. the random token keeps a worker that
+    reuses a dead worker's pid from overwriting its counters. a worker
+    leaving (retire(), or found dead by /metrics) has its counters summed
+    into METRICS_DIR/exited.json under a file lock, its in progress gauges
+    are dropped. the directory must be emptied when the server restarts,
+    like prometheus_client multiprocess mode.
+
+    latency is measured until the view returns, a streamed body is counted in
+    the response bytes once it is fully sent.
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.buckets = tuple(buckets)
+        self.flush_interval = flush_interval
+        self.directory = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pid = None
+        self._token = None
+        self._dirty = False
+        self._retired = False
+        self._reset()
+
+    def init_app(self, app):
+        if not app.config.get("METRICS_ENABLED", True):
+            return
+        self.buckets = tuple(app.config.get("METRICS_BUCKETS", self.buckets))
+        self.flush_interval = app.config.get("METRICS_FLUSH_INTERVAL", self.flush_interval)
+        self.directory = app.config.get("METRICS_DIR")
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.add_url_rule("/metrics", "metrics", self.metrics_view)
+        app.extensions["request_metrics"] = self
+
+    def _reset(self):
+        # (endpoint, method, status) -> count
+        self._requests = {}
+        # (endpoint, method) -> count per bucket (last one is +Inf) and the sum
+        self._durations = {}
+        # (endpoint, method) -> bytes
+        self._bytes = {}
+        # (endpoint, method) -> requests being handled
+        self._in_flight = {}
+
+    def _ensure_process(self):
+        """
+        a forked worker starts from zero (the parent keeps its own snapshot)
+        and starts its own flush thread.
+        """
+        pid = os.getpid()
+        if self._pid == pid:
+            return
+        with self._lock:
+            if self._pid == pid:
+                return
+            if self._pid is not None:
+                self._reset()
+            self._pid = pid
+            self._token = uuid.uuid4().hex[:12]
+            self._retired = False
+            if self.directory:
+                threading.Thread(target=self._flush_loop, name="metrics-flush", daemon=True).start()
+                atexit.register(self.retire)
+
+    def _before_request(self):
+        if request.endpoint == "metrics":
+            return
+        self._ensure_process()
+        key = (request.endpoint or UNMATCHED_ENDPOINT, request.method)
+        g.metrics_key = key
+        g.metrics_started = time.perf_counter()
+        with self._lock:
+            self._in_flight[key] = self._in_flight.get(key, 0) + 1
+
+    def _after_request(self, response):
+        key = g.get("metrics_key")
+        if key is None:
+            return response
+        g.metrics_status = response.status_code
+        if response.is_streamed:
+            body = _CountingIterable(response.response)
+            response.response = body
+            response.call_on_close(lambda: self._add_bytes(key, body.size))
+        else:
+            self._add_bytes(key, response.calculate_content_length() or 0)
+        return response
+
+    def _teardown_request(self, exc):
+        key = g.pop("metrics_key", None)
+        if key is None:
+            return
+        seconds = time.perf_counter() - g.metrics_started
+        status = str(g.get("metrics_status", 500))
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            self._in_flight[key] -= 1
+            request_key = key + (status,)
+            self._requests[request_key] = self._requests.get(request_key, 0) + 1
+            histogram = self._durations.get(key)
+            if histogram is None:
+                histogram = self._durations[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            histogram[index] += 1
+            histogram[-1] += seconds
+            self._dirty = True
+
+    def _add_bytes(self, key, size):
+        with self._lock:
+            self._bytes[key] = self._bytes.get(key, 0) + size
+            self._dirty = True
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "pid": os.getpid(),
+                "token": self._token,
+                "requests": [[*key, count] for key, count in self._requests.items()],
+                "durations": [[*key, list(histogram)] for key, histogram in self._durations.items()],
+                "bytes": [[*key, size] for key, size in self._bytes.items()],
+                "in_flight": [[*key, count] for key, count in self._in_flight.items()],
+            }
+
+    def _path(self):
+        return os.path.join(self.directory, f"metrics_{os.getpid()}_{self._token}.json")
+
+    def flush(self):
+        """
+        write the snapshot of this process to METRICS_DIR.
+        """
+        if not self.directory or self._pid != os.getpid():
+            # nothing recorded in this process yet
+            return
+        with self._flush_lock:
+            if self._retired:
+                return
+            self._dirty = False
+            _write_snapshot(self._path(), self.snapshot())
+
+    def retire(self):
+        """
+        sum the counters of this process into the exited workers' file, called
+        when a worker leaves. later requests of the process are not counted.
+        """
+        if not self.directory or self._pid != os.getpid():
+            return
+        with self._flush_lock:
+            if self._retired:
+                return
+            self._retired = True
+            path = self._path()
+            _write_snapshot(path, self.snapshot())
+            with self._directory_lock():
+                self._merge_exited([path])
+
+    @contextmanager
+    def _directory_lock(self):
+        with open(os.path.join(self.directory, LOCK_FILE), "a") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _merge_exited(self, paths):
+        """
+        add the snapshots at paths to the exited file and remove them, the
+        caller holds the directory lock.
+        """
+        exited = os.path.join(self.directory, EXITED_FILE)
+        totals = _empty_totals()
+        previous = _read_snapshot(exited)
+        if previous is not None:
+            _add_snapshot(totals, previous)
+        for path in paths:
+            snapshot = _read_snapshot(path)
+            if snapshot is not None:
+                snapshot["in_flight"] = []
+                _add_snapshot(totals, snapshot)
+        requests, durations, sizes, _ = totals
+        _write_snapshot(exited, {
+            "pid": None,
+            "token": None,
+            "requests": [[*key, count] for key, count in requests.items()],
+            "durations": [[*key, histogram] for key, histogram in durations.items()],
+            "bytes": [[*key, size] for key, size in sizes.items()],
+            "in_flight": [],
+        })
+        for path in paths:
+            os.remove(path)
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if self._dirty:
+                self.flush()
+
+    def collect(self):
+        """
+        snapshots of every worker plus the exited ones, only this process
+        without METRICS_DIR. files of workers that died without retiring are
+        merged into the exited file first.
+        """
+        if not self.directory:
+            return [self.snapshot()]
+        self.flush()
+        with self._directory_lock():
+            snapshots, dead = [], []
+            for path in glob.glob(os.path.join(self.directory, "metrics_*.json")):
+                snapshot = _read_snapshot(path)
+                if snapshot is None:
+                    continue
+                if snapshot["pid"] != os.getpid() and not _pid_alive(snapshot["pid"]):
+                    dead.append(path)
+                else:
+                    snapshots.append(snapshot)
+            if dead:
+                self._merge_exited(dead)
+            exited = _read_snapshot(os.path.join(self.directory, EXITED_FILE))
+        if exited is not None:
+            snapshots.append(exited)
+        return snapshots
+
+    def render(self):
+        totals = _empty_totals()
+        for snapshot in self.collect():
+            _add_snapshot(totals, snapshot)
+        requests, durations, sizes, in_flight = totals
+
+        lines = [
+            "# HELP http_requests_total Requests handled by endpoint, method and status.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (endpoint, method, status), count in sorted(requests.items()):
+            lines.append(f"http_requests_total{_labels(endpoint=endpoint, method=method, status=status)} {count}")
+
+        lines += [
+            "# HELP http_request_duration_seconds Time spent in the view.",
+            "# TYPE http_request_duration_seconds histogram",
+        ]
+        for (endpoint, method), histogram in sorted(durations.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), histogram[:-1]):
+                cumulative += count
+                labels = _labels(endpoint=endpoint, method=method, le=bound)
+                lines.append(f"http_request_duration_seconds_bucket{labels} {cumulative}")
+            labels = _labels(endpoint=endpoint, method=method)
+            lines.append(f"http_request_duration_seconds_sum{labels} {histogram[-1]}")
+            lines.append(f"http_request_duration_seconds_count{labels} {cumulative}")
+
+        lines += [
+            "# HELP http_response_bytes_total Response body bytes sent.",
+            "# TYPE http_response_bytes_total counter",
+        ]
+        for (endpoint, method), size in sorted(sizes.items()):
+            lines.append(f"http_response_bytes_total{_labels(endpoint=endpoint, method=method)} {size}")
+
+        lines += [
+            "# HELP http_requests_in_progress Requests being handled.",
+            "# TYPE http_requests_in_progress gauge",
+        ]
+        for (endpoint, method), count in sorted(in_flight.items()):
+            lines.append(f"http_requests_in_progress{_labels(endpoint=endpoint, method=method)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def metrics_view(self):
+        return Response(self.render(), content_type=METRICS_CONTENT_TYPE)
+
+
+def get_request_metrics():
+    return current_app.extensions["request_metrics"]
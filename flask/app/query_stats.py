@@ -0,0 +1,136 @@
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+DEFAULT_REPEAT_THRESHOLD = 5
+QUERY_COUNT_HEADER = "X-Query-Count"
+QUERY_TIME_HEADER = "X-Query-Time-Ms"
+
+_BOUND_LIST = re.compile(r"\(\?(?:, \?)+\)")
+_REPEATED_ROWS = re.compile(r"(\([^()]*\))(?:, \1)+")
+
+# collectors of count_queries() blocks
+_collectors = []
+
+
+def statement_shape(statement):
+    """
+    statement with IN lists and multi row VALUES collapsed, so the same query
+    with other parameters has the same shape.
+    """
+    shape = _BOUND_LIST.sub("(?)", " ".join(statement.split()))
+    return _REPEATED_ROWS.sub(r"\1", shape)
+
+
+class QueryLog:
+    """
+    statements run while collecting, with their total time.
+    """
+
+    def __init__(self):
+        self.statements = []
+        self.seconds = 0.0
+
+    def record(self, statement, seconds):
+        self.statements.append(statement)
+        self.seconds += seconds
+
+    def repeated(self, threshold):
+        if len(self.statements) < threshold:
+            return []
+        shapes = Counter(statement_shape(statement) for statement in self.statements)
+        return [(shape, count) for shape, count in shapes.most_common() if count >= threshold]
+
+    def __len__(self):
+        return len(self.statements)
+
+
+@contextmanager
+def count_queries():
+    """
+    collect every statement run in the block, in any request.
+
+        with count_queries() as queries:
+            client.get("/products/1")
+        assert len(queries) <= 2
+    """
+    log = QueryLog()
+    _collectors.append(log)
+    try:
+        yield log
+    finally:
+        _collectors.remove(log)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # kept on the execution context, a failing statement takes its start
+    # time with it instead of leaving it on the pooled connection
+    context.query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - context.query_started
+    if has_app_context():
+        log = g.get("query_log")
+        if log is not None:
+            log.record(statement, seconds)
+    for log in _collectors:
+        log.record(statement, seconds)
+
+
+class QueryStats:
+    """
+    count and time the SQL statements of every request.
+
+    the numbers go in the request log and, with QUERY_STATS_HEADERS (on in
+    debug), in the X-Query-Count / X-Query-Time-Ms response headers. a
+    statement shape run QUERY_REPEAT_THRESHOLD times or more in one request
+    (an N+1 loop) is logged as a warning.
+    """
+
+    def __init__(self, repeat_threshold=DEFAULT_REPEAT_THRESHOLD):
+        self.repeat_threshold = repeat_threshold
+        self.headers = False
+
+    def init_app(self, app):
+        self.repeat_threshold = app.config.get("QUERY_REPEAT_THRESHOLD", self.repeat_threshold)
+        self.headers = app.config.get("QUERY_STATS_HEADERS", app.debug)
+        if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.teardown_request(self._teardown_request)
+        app.extensions["query_stats"] = self
+
+    def _before_request(self):
+        g.query_log = QueryLog()
+
+    def _after_request(self, response):
+        log = g.get("query_log")
+        if log is None:
+            return response
+        if self.headers:
+            response.headers[QUERY_COUNT_HEADER] = str(len(log))
+            response.headers[QUERY_TIME_HEADER] = f"{log.seconds * 1000:.2f}"
+        for shape, count in log.repeated(self.repeat_threshold):
+            current_app.logger.warning(
+                "%s %s ran the same statement %d times: %s", request.method, request.path, count, shape
+            )
+        return response
+
+    def _teardown_request(self, exc):
+        g.pop("query_log", None)
+
+
+def current_query_log():
+    """
+    QueryLog of the current request, None outside a request.
+    """
+    return g.get("query_log") if has_app_context() else None
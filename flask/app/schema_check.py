@@ -0,0 +1,54 @@
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import inspect
+
+from app.config import db
+
+
+class SchemaCheckError(RuntimeError):
+    pass
+
+
+def missing_indexes():
+    """
+    compare the indexes declared on the models with the ones in the database.
+
+    Returns:
+    sorted list of "table.index" names missing from the database
+
+    """
+    inspector = inspect(db.engine)
+    missing = []
+    for table in db.metadata.sorted_tables:
+        expected = {index.name for index in table.indexes}
+        if not expected:
+            continue
+        if not inspector.has_table(table.name):
+            missing += [f"{table.name}.{name}" for name in expected]
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        missing += [f"{table.name}.{name}" for name in expected - existing]
+    return sorted(missing)
+
+
+def check_schema(app):
+    """
+    refuse to start when an expected index is missing, every hot path
+    (login, jwt lookup, product listing) would fall back to a table scan.
+
+    """
+    with app.app_context():
+        missing = missing_indexes()
+    if missing:
+        raise SchemaCheckError(
+            f"missing database indexes: {', '.join(missing)}, run `flask db upgrade`"
+        )
+
+
+@click.command("check-schema")
+@with_appcontext
+def check_schema_command():
+    """Fail if the database is missing indexes declared on the models."""
+    check_schema(current_app)
+    click.echo("schema ok")
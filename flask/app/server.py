@@ -0,0 +1,115 @@
+import os
+import signal
+import threading
+
+from flask import current_app, jsonify
+
+from app.config import db
+from app.database import READ_ENGINE
+from logs.logger_utils import restart_loggers, stop_loggers
+from user.blocklist_cache import get_blocklist_cache
+from user.blocklist_purge import get_blocklist_purger
+
+
+STARTING = "starting"
+READY = "ready"
+DRAINING = "draining"
+
+
+class Readiness:
+    """
+    GET /ready: 200 once this process finished warm_up(), 503 before that
+    (create_app() does not warm up) and while it is draining. load balancers
+    send traffic only to ready workers.
+    """
+
+    def __init__(self):
+        self.state = STARTING
+
+    def init_app(self, app):
+        app.add_url_rule("/ready", "ready", self.ready_view)
+        app.extensions["readiness"] = self
+
+    def ready_view(self):
+        body = {"status": self.state, "pid": os.getpid()}
+        return jsonify(body), 200 if self.state == READY else 503
+
+
+def get_readiness(app=None):
+    return (app or current_app).extensions["readiness"]
+
+
+def _engines(app):
+    with app.app_context():
+        engines = list(db.engines.values())
+    if READ_ENGINE in app.extensions:
+        engines.append(app.extensions[READ_ENGINE])
+    return engines
+
+
+def dispose_engines(app, close=True):
+    """
+    drop the pooled connections. a forked worker passes close=False, the
+    connections belong to the parent and must not be closed by the child.
+    """
+    for engine in _engines(app):
+        engine.dispose(close=close)
+
+
+def warm_up(app):
+    """
+    open a pooled connection on every sync engine (running the connect
+    pragmas), load the token blocklist, then report ready.
+    """
+    readiness = get_readiness(app)
+    readiness.state = STARTING
+    with app.app_context():
+        for engine in _engines(app):
+            with engine.connect() as connection:
+                connection.exec_driver_sql("SELECT 1")
+        get_blocklist_cache().warm()
+    readiness.state = READY
+
+
+def start_worker(app):
+    """
+    prepare a worker forked from the preloaded app (gunicorn's post_fork):
+    its own logger threads and connections, warmed up before it accepts.
+    """
+    restart_loggers()
+    # the connections belong to the master, drop them without closing
+    dispose_engines(app, close=False)
+    warm_up(app)
+    get_blocklist_purger(app).start()
+
+
+def drain_on_sigterm(app, delay):
+    """
+    report draining on SIGTERM (gunicorn's post_worker_init, after the worker
+    installed its signal handlers). GET /ready answers 503 while the worker
+    keeps serving for delay seconds, so the load balancer stops sending
+    traffic, then the worker's own handler stops it. a second SIGTERM stops
+    it right away.
+    """
+    stop = signal.getsignal(signal.SIGTERM)
+
+    def drain(signum, frame):
+        get_readiness(app).state = DRAINING
+        signal.signal(signal.SIGTERM, stop)
+        timer = threading.Timer(delay, os.kill, (os.getpid(), signal.SIGTERM))
+        timer.daemon = True
+        timer.start()
+
+    signal.signal(signal.SIGTERM, drain)
+
+
+def stop_worker(app):
+    """
+    leave a worker (gunicorn's worker_exit), after its requests finished.
+    """
+    get_blocklist_purger(app).stop()
+    metrics = app.extensions.get("request_metrics")
+    if metrics is not None:
+        metrics.retire()
+    dispose_engines(app)
+    stop_loggers()
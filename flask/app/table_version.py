@@ -0,0 +1,113 @@
+import secrets
+from itertools import chain
+
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import db
+
+
+# session.info key of the tables written in the current transaction
+CHANGED_TABLES = "changed_tables"
+
+
+def new_version():
+    """
+    version for the rows a statement writes. random instead of read from a
+    counter, so writers share no row, and it never repeats (in practice) so
+    (id, version) stays a strong validator even when a deleted id is reused.
+    """
+    return secrets.randbits(62) + 1
+
+
+class TableVersion(db.Model):
+    """
+    change counter of a table, a reader compares one primary key lookup
+    instead of the rows.
+
+    writers only mark the table while they work (bump()), the counters are
+    incremented by one statement right before the commit, in the same
+    transaction: the counter row is held only for the commit itself, and a
+    write and its counter commit (or fail) together.
+    """
+    __tablename__ = "table_version"
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.BigInteger(), nullable=False, default=0)
+
+    @classmethod
+    def current(cls, name):
+        return db.session.execute(db.select(cls.version).where(cls.name == name)).scalar() or 0
+
+    @classmethod
+    def bump(cls, name, session=None):
+        """
+        mark table name as written by the current transaction of session
+        (db.session by default), its counter goes up when the transaction
+        commits, a rollback forgets the mark.
+        """
+        (session or db.session).info.setdefault(CHANGED_TABLES, set()).add(name)
+
+    @classmethod
+    def increment(cls, connection, names):
+        """
+        add one to the counters of names in one statement, creating the
+        missing ones.
+        """
+        table = cls.__table__
+        names = sorted(names)
+        bump = db.update(table).values(version=table.c.version + 1)
+        if connection.execute(bump.where(table.c.name.in_(names))).rowcount == len(names):
+            return
+        present = set(connection.execute(db.select(table.c.name).where(table.c.name.in_(names))).scalars())
+        for name in names:
+            if name in present:
+                continue
+            # another writer may create the same counter first
+            try:
+                with connection.begin_nested():
+                    connection.execute(db.insert(table).values(name=name, version=1))
+            except IntegrityError:
+                connection.execute(bump.where(table.c.name == name))
+
+
+class Versioned:
+    """
+    model mixin, version changes on every write to the row.
+
+    ORM writes are stamped by the before_flush hook below. core statements
+    must call TableVersion.bump() and set version=new_version() themselves.
+    """
+    # random 62 bit numbers (new_version())
+    version = db.Column(db.BigInteger(), nullable=False, default=0, server_default="0")
+
+
+@event.listens_for(Session, "before_flush")
+def _stamp_versions(session, flush_context, instances):
+    changed = {}
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if not isinstance(obj, Versioned):
+            continue
+        if obj in session.dirty and not session.is_modified(obj, include_collections=False):
+            continue
+        changed.setdefault(obj.__tablename__, []).append(obj)
+    for name, objs in changed.items():
+        TableVersion.bump(name, session)
+        version = new_version()
+        for obj in objs:
+            if obj not in session.deleted:
+                obj.version = version
+
+
+@event.listens_for(Session, "before_commit")
+def _increment_changed_tables(session):
+    # before_commit runs ahead of the final flush, whose writes mark tables too
+    session.flush()
+    names = session.info.pop(CHANGED_TABLES, None)
+    if names:
+        TableVersion.increment(session.connection(), names)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_tables(session):
+    session.info.pop(CHANGED_TABLES, None)
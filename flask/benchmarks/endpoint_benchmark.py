@@ -0,0 +1,368 @@
+"""
+throughput and latency of every user and product route.
+
+    python -m benchmarks.endpoint_benchmark --users 1000 --products 100000
+    python -m benchmarks.endpoint_benchmark --save benchmarks/baseline.json
+    python -m benchmarks.endpoint_benchmark --compare benchmarks/baseline.json --tolerance 0.25
+    python -m benchmarks.endpoint_benchmark --only products.list --only products.buy
+
+seeds a temporary sqlite database, calls each route --iterations times
+through the flask test client and prints ops/s with p50 / p99 latency.
+--compare exits with status 1 when the p50 of a route is more than
+--tolerance slower than in the baseline file.
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+from flask_jwt_extended import create_access_token
+
+from app.main import create_app, db
+from benchmarks.login_benchmark import percentile
+from product.coin_change import COINS
+from product.product_models import CoinInventory, Product
+from user.password_hasher import get_password_hasher
+from user.user_models import Role, User
+
+
+PASSWORD = "password"
+SEED_BATCH_SIZE = 10000
+BULK_ITEMS = 100
+# a buy or reset spends the whole deposit, each gets a fresh buyer
+PURCHASE_DEPOSIT = 500
+MACHINE_COINS = 10 ** 6
+DEFAULT_TOLERANCE = 0.25
+
+SCENARIOS = {}
+
+
+def scenario(name, prepare=None):
+    """
+    register a benchmark, prepare(bench, iterations) runs before the clock
+    starts and its result is passed to every call.
+    """
+    def register(call):
+        SCENARIOS[name] = (prepare, call)
+        return call
+    return register
+
+
+class Bench:
+    """
+    seeded app plus the tokens and ids the scenarios need.
+    """
+
+    def __init__(self, app, users, products):
+        self.app = app
+        self.client = app.test_client()
+        self.sellers = max(1, users // 10)
+        self.buyers = max(2, users - self.sellers)
+        with app.app_context():
+            db.create_all()
+            self.user_ids = self.seed_users()
+            self.seller_id = self.user_ids[0]
+            self.product_ids = self.insert_products(products, self.user_ids[:self.sellers])
+            self.seller_product_ids = [
+                product_id for index, product_id in enumerate(self.product_ids)
+                if index % self.sellers == 0
+            ]
+            db.session.execute(db.insert(CoinInventory), [
+                {"machine_id": 1, "coin": coin, "count": MACHINE_COINS} for coin in COINS
+            ])
+            db.session.commit()
+            self.seller = self.headers("seller0")
+            self.buyer = self.headers("buyer0")
+            self.other_buyer = self.headers("buyer1")
+
+    def headers(self, username):
+        return {"Authorization": f"Bearer {create_access_token(identity=username)}"}
+
+    def seed_users(self):
+        pwhash = get_password_hasher().hash(PASSWORD)
+        rows = [
+            {"username": f"seller{i}", "email": f"seller{i}@example.com", "password": pwhash,
+             "role": Role.seller, "deposit": 0}
+            for i in range(self.sellers)
+        ] + [
+            {"username": f"buyer{i}", "email": f"buyer{i}@example.com", "password": pwhash,
+             "role": Role.buyer, "deposit": 10 ** 9}
+            for i in range(self.buyers)
+        ]
+        return self.insert(User, rows)
+
+    def insert_products(self, count, seller_ids):
+        rows = [
+            {"product_name": f"product {i}", "cost": (i % 20 + 1) * 5, "amount_available": 10 ** 9,
+             "description": "", "seller_id": seller_ids[i % len(seller_ids)]}
+            for i in range(count)
+        ]
+        return self.insert(Product, rows)
+
+    def insert(self, model, rows):
+        ids = []
+        for start in range(0, len(rows), SEED_BATCH_SIZE):
+            result = db.session.execute(
+                db.insert(model).returning(model.id, sort_by_parameter_order=True),
+                rows[start:start + SEED_BATCH_SIZE],
+            )
+            ids.extend(result.scalars())
+        db.session.commit()
+        return ids
+
+    def run(self, name, iterations):
+        prepare, call = SCENARIOS[name]
+        with self.app.app_context():
+            prepared = prepare(self, iterations) if prepare else None
+        latencies = []
+        errors = 0
+        started = time.perf_counter()
+        for i in range(iterations):
+            call_started = time.perf_counter()
+            response = call(self, i, prepared)
+            latencies.append(time.perf_counter() - call_started)
+            if response.status_code >= 400:
+                errors += 1
+        total = time.perf_counter() - started
+        return {
+            "iterations": iterations,
+            "errors": errors,
+            "ops_per_second": round(iterations / total, 1),
+            "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+            "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        }
+
+
+# users
+
+@scenario("users.register")
+def register_user(bench, i, prepared):
+    return bench.client.post("/users/register", json={
+        "username": f"new{i}", "email": f"new{i}@example.com", "password": PASSWORD, "role": "buyer",
+    })
+
+
+@scenario("users.login")
+def login_user(bench, i, prepared):
+    return bench.client.post("/users/login", json={"username": f"buyer{i % bench.buyers}", "password": PASSWORD})
+
+
+@scenario("users.refresh")
+def refresh_access(bench, i, prepared):
+    return bench.client.get("/users/refresh", headers=bench.seller)
+
+
+@scenario("users.logout", prepare=lambda bench, n: [bench.headers("seller0") for _ in range(n)])
+def logout_user(bench, i, tokens):
+    return bench.client.get("/users/logout", headers=tokens[i])
+
+
+@scenario("users.list")
+def list_users(bench, i, prepared):
+    return bench.client.get("/users/list", headers=bench.seller)
+
+
+@scenario("users.current")
+def get_current_user(bench, i, prepared):
+    return bench.client.get("/users/current/user", headers=bench.seller)
+
+
+@scenario("users.get")
+def get_user(bench, i, prepared):
+    user_id = bench.user_ids[i % len(bench.user_ids)]
+    return bench.client.get(f"/users/{user_id}", headers=bench.seller)
+
+
+@scenario("users.update")
+def update_user(bench, i, prepared):
+    # buyer0 and buyer1 keep their usernames, the other scenarios log in as them
+    user_id = bench.user_ids[bench.sellers + 2 + i % (bench.buyers - 2)] if bench.buyers > 2 else bench.seller_id
+    return bench.client.put(f"/users/{user_id}", headers=bench.seller, json={"email": f"changed{i}@example.com"})
+
+
+def _paying_buyers(prefix):
+    def prepare(bench, n):
+        bench.insert(User, [
+            {"username": f"{prefix}{i}", "email": f"{prefix}{i}@example.com", "role": Role.buyer,
+             "deposit": PURCHASE_DEPOSIT}
+            for i in range(n)
+        ])
+        return [bench.headers(f"{prefix}{i}") for i in range(n)]
+    return prepare
+
+
+def _spare_users(bench, n):
+    return bench.insert(User, [
+        {"username": f"spare{i}", "email": f"spare{i}@example.com", "role": Role.buyer, "deposit": 0}
+        for i in range(n)
+    ])
+
+
+@scenario("users.delete", prepare=_spare_users)
+def delete_user(bench, i, user_ids):
+    return bench.client.delete(f"/users/{user_ids[i]}", headers=bench.seller)
+
+
+@scenario("users.deposit")
+def deposit_money(bench, i, prepared):
+    return bench.client.post("/users/deposit/money", headers=bench.other_buyer, json={"amount": 5})
+
+
+# the reset pays the deposit out, every call gets a fresh buyer
+@scenario("users.reset_deposit", prepare=_paying_buyers("refunded"))
+def reset_deposit(bench, i, buyers):
+    return bench.client.post("/users/reset/deposit", headers=buyers[i], json={})
+
+
+# products
+
+@scenario("products.list")
+def list_products(bench, i, prepared):
+    return bench.client.get("/products", headers=bench.seller)
+
+
+@scenario("products.list_filtered")
+def list_filtered_products(bench, i, prepared):
+    return bench.client.get("/products?min_cost=10&max_cost=20&sort=-cost", headers=bench.seller)
+
+
+@scenario("products.get")
+def get_product(bench, i, prepared):
+    product_id = bench.product_ids[i % len(bench.product_ids)]
+    return bench.client.get(f"/products/{product_id}", headers=bench.seller)
+
+
+@scenario("products.create")
+def create_product(bench, i, prepared):
+    return bench.client.post("/products", headers=bench.seller, json={
+        "product_name": f"created {i}", "cost": 5, "amount_available": 10, "description": "",
+    })
+
+
+@scenario("products.update")
+def update_product(bench, i, prepared):
+    product_id = bench.seller_product_ids[i % len(bench.seller_product_ids)]
+    return bench.client.put(f"/products/{product_id}", headers=bench.seller, json={"description": f"update {i}"})
+
+
+@scenario("products.delete", prepare=lambda bench, n: bench.insert_products(n, [bench.seller_id]))
+def delete_product(bench, i, product_ids):
+    return bench.client.delete(f"/products/{product_ids[i]}", headers=bench.seller)
+
+
+@scenario("products.bulk_create")
+def bulk_create_products(bench, i, prepared):
+    return bench.client.post("/products/bulk", headers=bench.seller, json={"items": [
+        {"product_name": f"bulk {i} {j}", "cost": 5, "amount_available": 10} for j in range(BULK_ITEMS)
+    ]})
+
+
+@scenario("products.bulk_update")
+def bulk_update_products(bench, i, prepared):
+    ids = bench.seller_product_ids
+    start = i * BULK_ITEMS % len(ids)
+    return bench.client.patch("/products/bulk", headers=bench.seller, json={"items": [
+        {"id": ids[(start + j) % len(ids)], "description": f"bulk {i}"} for j in range(min(BULK_ITEMS, len(ids)))
+    ]})
+
+
+@scenario("products.bulk_delete", prepare=lambda bench, n: bench.insert_products(n * BULK_ITEMS, [bench.seller_id]))
+def bulk_delete_products(bench, i, product_ids):
+    return bench.client.delete("/products/bulk", headers=bench.seller, json={
+        "ids": product_ids[i * BULK_ITEMS:(i + 1) * BULK_ITEMS],
+    })
+
+
+@scenario("products.import")
+def import_catalog(bench, i, prepared):
+    lines = ["product_name,cost,amount_available,description"]
+    lines += [f"imported {i} {j},5,10," for j in range(BULK_ITEMS)]
+    catalog = io.BytesIO(("\n".join(lines) + "\n").encode())
+    return bench.client.post("/products/import", headers=bench.seller, data={
+        "file": (catalog, "catalog.csv"), "job": f"bench {i}",
+    }, content_type="multipart/form-data")
+
+
+@scenario("products.buy", prepare=_paying_buyers("payer"))
+def buy_product(bench, i, buyers):
+    product_id = bench.product_ids[i % len(bench.product_ids)]
+    return bench.client.post("/products/buy/product", headers=buyers[i], json={"product_id": product_id, "amount": 1})
+
+
+@scenario("products.checkout", prepare=_paying_buyers("shopper"))
+def checkout_cart(bench, i, buyers):
+    ids = bench.product_ids
+    return bench.client.post("/products/checkout", headers=buyers[i], json={"items": [
+        {"product_id": ids[(i * 5 + j) % len(ids)], "amount": 1} for j in range(5)
+    ]})
+
+
+def run(users=100, products=1000, iterations=100, only=None, config=None):
+    # a failing view is counted as an error instead of raising
+    app = create_app({
+        "DEBUG": False,
+        "PROPAGATE_EXCEPTIONS": False,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"),
+        "SQLALCHEMY_ECHO": False,
+        **(config or {}),
+    })
+    bench = Bench(app, users, products)
+    results = {name: bench.run(name, iterations) for name in (only or SCENARIOS)}
+    return results
+
+
+def compare(results, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    routes whose p50 grew more than tolerance over the baseline, as
+    (name, baseline p50, p50).
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before and result["p50_ms"] > before["p50_ms"] * (1 + tolerance):
+            regressions.append((name, before["p50_ms"], result["p50_ms"]))
+    return regressions
+
+
+def report(results):
+    lines = [f"{'route':28} {'ops/s':>10} {'p50 ms':>10} {'p99 ms':>10} {'errors':>7}"]
+    for name, result in results.items():
+        lines.append(
+            f"{name:28} {result['ops_per_second']:>10} {result['p50_ms']:>10} {result['p99_ms']:>10} {result['errors']:>7}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--products", type=int, default=1000)
+    parser.add_argument("--iterations", type=int, default=100)
+    parser.add_argument("--only", action="append", choices=sorted(SCENARIOS), help="run only this route, repeatable")
+    parser.add_argument("--hash-method", help="werkzeug password hash method, e.g. pbkdf2:sha256:1000")
+    parser.add_argument("--save", metavar="FILE", help="write the results as a baseline")
+    parser.add_argument("--compare", metavar="FILE", help="fail on routes slower than this baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    config = {"PASSWORD_HASH_METHOD": args.hash_method} if args.hash_method else None
+    results = run(args.users, args.products, args.iterations, args.only, config)
+    print(report(results))
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: p50 {before} ms -> {after} ms", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
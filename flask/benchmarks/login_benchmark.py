@@ -0,0 +1,102 @@
+"""
+login latency under concurrency.
+
+    python -m benchmarks.login_benchmark --concurrency 16 --requests 400
+    python -m benchmarks.login_benchmark --method pbkdf2:sha256:600000
+
+seeds users in a temporary sqlite database, logs them in from
+--concurrency threads and prints throughput with p50 / p99 latency.
+"""
+import argparse
+import json
+import os
+import statistics
+import tempfile
+import threading
+import time
+
+from app.main import create_app, db
+from user.user_models import User
+from user.password_hasher import get_password_hasher
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    index = min(len(values) - 1, round(percent / 100 * (len(values) - 1)))
+    return values[index]
+
+
+def seed_users(app, count):
+    with app.app_context():
+        db.create_all()
+        hasher = get_password_hasher()
+        # every user gets the same password, hash it once
+        pwhash = hasher.hash("password")
+        db.session.add_all(
+            User(username=f"user{i}", email=f"user{i}@example.com", password=pwhash, role="buyer")
+            for i in range(count)
+        )
+        db.session.commit()
+
+
+def run(concurrency, requests, method=None, workers=None, users=50):
+    config = {
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///" + os.path.join(tempfile.mkdtemp(), "bench.db"),
+        "SQLALCHEMY_ECHO": False,
+    }
+    if method:
+        config["PASSWORD_HASH_METHOD"] = method
+    if workers:
+        config["PASSWORD_HASH_WORKERS"] = workers
+    app = create_app(config)
+    seed_users(app, users)
+
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    counter = iter(range(requests))
+
+    def worker():
+        client = app.test_client()
+        for i in counter:
+            body = json.dumps({"username": f"user{i % users}", "password": "password"})
+            started = time.perf_counter()
+            response = client.post("/users/login", data=body, content_type="application/json")
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    total = time.perf_counter() - started
+
+    return {
+        "method": app.config.get("PASSWORD_HASH_METHOD", "default"),
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "statuses": statuses,
+        "ops_per_second": round(len(latencies) / total, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--method", help="werkzeug hash method, e.g. scrypt:32768:8:1")
+    parser.add_argument("--workers", type=int, help="password hashes running at once")
+    args = parser.parse_args()
+    print(json.dumps(run(args.concurrency, args.requests, args.method, args.workers), indent=2))
+
+
+if __name__ == "__main__":
+    main()
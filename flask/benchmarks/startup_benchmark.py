@@ -0,0 +1,77 @@
+"""
+cold start time: importing the app and creating it.
+
+    python -m benchmarks.startup_benchmark --runs 10
+    python -m benchmarks.startup_benchmark --no-swagger
+
+every run starts a fresh interpreter (like a new worker or a test process)
+and times `import app.main`, the first create_app() and the mean of
+--creates more create_app() calls (a test setUp). prints the medians.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+FLASK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+from app.main import create_app
+imported = time.perf_counter()
+config = json.loads(sys.argv[1])
+create_app(config)
+created = time.perf_counter()
+creates = int(sys.argv[2])
+for _ in range(creates):
+    create_app(config)
+done = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "first_create_app_ms": (created - imported) * 1000,
+    "create_app_ms": (done - created) * 1000 / max(creates, 1),
+    "modules": len(sys.modules),
+}))
+"""
+
+
+def run_once(config, creates):
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD, json.dumps(config), str(creates)],
+        cwd=FLASK_DIR,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def run(runs=5, creates=20, swagger=True):
+    config = {
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "SQLALCHEMY_ECHO": False,
+        "SWAGGER_ENABLED": swagger,
+    }
+    results = [run_once(config, creates) for _ in range(runs)]
+    summary = {"runs": runs, "swagger": swagger}
+    for key in ("import_ms", "first_create_app_ms", "create_app_ms", "modules"):
+        summary[key] = round(statistics.median(result[key] for result in results), 2)
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters")
+    parser.add_argument("--creates", type=int, default=20, help="create_app() calls timed per interpreter")
+    parser.add_argument("--no-swagger", dest="swagger", action="store_false", help="SWAGGER_ENABLED=False")
+    args = parser.parse_args()
+    print(json.dumps(run(args.runs, args.creates, args.swagger), indent=2))
+
+
+if __name__ == "__main__":
+    main()
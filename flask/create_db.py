@@ -1,10 +1,220 @@
+"""
+create the tables and optionally fill them with synthetic data.
+
+    python create_db.py
+    python create_db.py --users 10000 --products 1000000 --revoked-tokens 5000 --seed 7
+
+rows are written with core executemany inserts in chunks, every user gets the
+same password hashed once. the same --seed always gives the same rows, so
+benchmarks and query plans can be compared between machines. only the token
+expiries move with the clock, they are spread around the current time.
+"""
+import argparse
+import math
+import random
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+
 from app.main import create_app, db
+from app.table_version import TableVersion, Versioned
+from product.product_models import Product
+from product.product_search import create_search_index, drop_search_index
+from user.password_hasher import get_password_hasher
+from user.user_models import Role, TokenBlocklist, TokenBlocklistVersion, User
+
+
+SEED_CHUNK_SIZE = 50000
+SELLER_SHARE = 0.1
+OUT_OF_STOCK_SHARE = 0.1
+PRICE_MU = math.log(100)
+PRICE_SIGMA = 0.6
+COINS = (0, 5, 10, 20, 50, 100)
+PRODUCT_WORDS = (
+    "cola", "water", "juice", "chips", "candy", "cookies", "gum", "coffee",
+    "tea", "soda", "nuts", "crackers", "chocolate", "mints", "pretzels",
+)
+PRODUCT_SIZES = ("mini", "small", "regular", "large", "family")
+# flask-jwt-extended's default access token lifetime
+TOKEN_LIFETIME = timedelta(minutes=15)
+
+
+def _insert(model, rows, rng=None):
+    """
+    executemany insert of an iterable of dicts, one chunk at a time. rows of
+    a versioned model get their version from rng, so a seed gives the same
+    rows.
+
+    into an empty table the secondary indexes (and the product search index
+    with its triggers) are dropped during the load and built again at the
+    end, sorting once is much cheaper than updating every index per row. a
+    table that has rows keeps them: without the unique indexes duplicates
+    would be accepted and readers would lose the index meanwhile.
+    """
+    table = model.__table__
+    statement = table.insert()
+    if issubclass(model, Versioned):
+        TableVersion.bump(table.name)
+        statement = statement.values(version=rng.getrandbits(62) + 1)
+    if not _is_empty(table):
+        return _insert_chunks(statement, rows)
+    connection = db.session.connection()
+    search = model is Product and connection.dialect.name == "sqlite"
+    if search:
+        drop_search_index(connection)
+    for index in table.indexes:
+        index.drop(connection)
+    try:
+        return _insert_chunks(statement, rows)
+    finally:
+        for index in table.indexes:
+            index.create(connection)
+        if search:
+            create_search_index(connection)
+
+
+def _is_empty(table):
+    return db.session.execute(db.select(db.literal(1)).select_from(table).limit(1)).first() is None
+
+
+def _insert_chunks(statement, rows):
+    count = 0
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == SEED_CHUNK_SIZE:
+            db.session.execute(statement, chunk)
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(statement, chunk)
+        count += len(chunk)
+    return count
+
+
+def _first_id(model):
+    return (db.session.execute(db.select(db.func.max(model.id))).scalar() or 0) + 1
+
+
+def seed_users(rng, count, password, seller_share=SELLER_SHARE):
+    """
+    count users, seller_share of them sellers, buyers hold a coin as deposit.
+    returns the ids of the sellers.
+    """
+    pwhash = get_password_hasher().hash(password)
+    first_id = _first_id(User)
+    sellers = max(1, round(count * seller_share)) if count else 0
+    seller_ids = list(range(first_id, first_id + sellers))
+
+    def rows():
+        for i in range(count):
+            user_id = first_id + i
+            seller = i < sellers
+            yield {
+                "id": user_id,
+                "username": f"{'seller' if seller else 'buyer'}{user_id}",
+                "email": f"user{user_id}@example.com",
+                "password": pwhash,
+                "role": Role.seller if seller else Role.buyer,
+                "deposit": 0 if seller else rng.choice(COINS),
+            }
+
+    _insert(User, rows(), rng)
+    return seller_ids
+
+
+def seed_products(rng, count, seller_ids):
+    """
+    count products. a few sellers own most of the catalog (pareto weights),
+    prices are log normal around one euro in 5 cent steps and about
+    OUT_OF_STOCK_SHARE of the products are sold out.
+    """
+    if not seller_ids:
+        raise ValueError("products need at least one seller")
+    weights = list(accumulate(rng.paretovariate(1.2) for _ in seller_ids))
+    first_id = _first_id(Product)
+
+    def rows():
+        # pick names and owners a chunk at a time, choices(k=) is much cheaper than one call per row
+        for start in range(0, count, SEED_CHUNK_SIZE):
+            size = min(SEED_CHUNK_SIZE, count - start)
+            words = rng.choices(PRODUCT_WORDS, k=size)
+            sizes = rng.choices(PRODUCT_SIZES, k=size)
+            owners = rng.choices(seller_ids, cum_weights=weights, k=size)
+            for i in range(size):
+                product_id = first_id + start + i
+                in_stock = rng.random() >= OUT_OF_STOCK_SHARE
+                yield {
+                    "id": product_id,
+                    "product_name": f"{words[i]} {sizes[i]} {product_id}",
+                    "cost": max(5, 5 * round(rng.lognormvariate(PRICE_MU, PRICE_SIGMA) / 5)),
+                    "amount_available": math.ceil(rng.expovariate(1 / 40)) if in_stock else 0,
+                    "description": "",
+                    "seller_id": owners[i],
+                }
+
+    return _insert(Product, rows(), rng)
+
+
+def seed_revoked_tokens(rng, count, now=None):
+    """
+    count revoked jti whose expiries are spread over one token lifetime
+    either side of now (unix time, the current time by default): about half
+    of them are still live and must be found by a lookup, the rest wait for
+    the next purge. with the same now the same seed gives the same rows.
+    """
+    now = int(time.time()) if now is None else now
+    lifetime = int(TOKEN_LIFETIME.total_seconds())
+
+    def rows():
+        for _ in range(count):
+            exp = now + rng.randrange(-lifetime, lifetime)
+            issued = exp - lifetime
+            # revoked at some point of the token's life, never in the future
+            revoked = issued + rng.randrange(min(exp, now) - issued + 1)
+            yield {
+                "jti": uuid.UUID(int=rng.getrandbits(128), version=4).bytes,
+                "exp": exp,
+                "create_at": datetime.fromtimestamp(revoked, timezone.utc).replace(tzinfo=None),
+            }
+
+    inserted = _insert(TokenBlocklist, rows())
+    if inserted:
+        TokenBlocklistVersion.bump()
+    return inserted
+
+
+def seed(users=0, products=0, revoked_tokens=0, seed=0, password="password", now=None):
+    rng = random.Random(seed)
+    seller_ids = seed_users(rng, users, password)
+    product_count = seed_products(rng, products, seller_ids) if products else 0
+    token_count = seed_revoked_tokens(rng, revoked_tokens, now)
+    db.session.commit()
+    return {"users": users, "products": product_count, "revoked_tokens": token_count}
 
-app = create_app()
 
-with app.app_context():
-    db.create_all()
-    print("Database initialized.")
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=0)
+    parser.add_argument("--products", type=int, default=0)
+    parser.add_argument("--revoked-tokens", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--password", default="password", help="password of every generated user")
+    args = parser.parse_args()
 
+    app = create_app({"SQLALCHEMY_ECHO": False})
+    with app.app_context():
+        db.create_all()
+        print("Database initialized.")
+        if args.users or args.products or args.revoked_tokens:
+            started = time.perf_counter()
+            counts = seed(args.users, args.products, args.revoked_tokens, args.seed, args.password)
+            print(
+                f"{counts['users']} users, {counts['products']} products and "
+                f"{counts['revoked_tokens']} revoked tokens in {time.perf_counter() - started:.1f}s"
+            )
 
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# gunicorn -c gunicorn.conf.py run:app
+#
+# the app is loaded once in the master and forked, every worker opens its own
+# connections and warms up before it accepts. the settings can be overridden
+# on the command line or in GUNICORN_CMD_ARGS.
+import os
+
+from app.schema_check import check_schema
+from app.server import dispose_engines, drain_on_sigterm, start_worker, stop_worker
+
+
+bind = os.getenv("GUNICORN_BIND", "127.0.0.1:8000")
+backlog = 2048
+# one request at a time per worker. a gthread worker drops the connections it
+# accepted but had not started when max_requests recycles it
+worker_class = "sync"
+workers = int(os.getenv("WEB_CONCURRENCY", 2 * (os.cpu_count() or 1) + 1))
+preload_app = True
+# recycle a worker after max_requests plus up to max_requests_jitter requests,
+# spread so the workers are not all replaced at once
+max_requests = 10000
+max_requests_jitter = 1000
+# seconds a stopping worker waits for its requests in flight
+graceful_timeout = 30
+# seconds a worker keeps serving after SIGTERM with GET /ready answering 503,
+# at most half the graceful_timeout
+DRAIN_DELAY = float(os.getenv("GUNICORN_DRAIN_DELAY", 5))
+
+
+def when_ready(server):
+    app = server.app.wsgi()
+    # refuse to serve a database missing an index the models declare
+    check_schema(app)
+    # the workers connect on their own
+    dispose_engines(app)
+
+
+def post_fork(server, worker):
+    # a worker that can not warm up stops the master (WORKER_BOOT_ERROR)
+    start_worker(server.app.wsgi())
+
+
+def post_worker_init(worker):
+    drain_on_sigterm(worker.wsgi, min(DRAIN_DELAY, worker.cfg.graceful_timeout / 2))
+
+
+def worker_exit(server, worker):
+    stop_worker(server.app.wsgi())
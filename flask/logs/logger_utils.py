@@ -1,16 +1,135 @@
+import atexit
+import json
 import logging
+import os
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+
+LOG_DIR = os.getenv("LOG_DIR", "./logs")
+LOG_MAX_BYTES = int(os.getenv("LOG_MAX_BYTES", 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.getenv("LOG_BACKUP_COUNT", 5))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+_listeners = {}
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    one json object per record, the "event" extra is merged as is.
+    """
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        event = getattr(record, "event", None)
+        if event:
+            entry.update(event)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class EnqueueHandler(QueueHandler):
+    """
+    QueueHandler that does not format on the calling thread, the listener
+    thread formats and writes. safe because the queue never leaves the process.
+    """
+
+    def prepare(self, record):
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # never block a request on logging, drop the record instead
+            pass
+
+
+def worker_log_file(log_file, pid=None):
+    """
+    log_file of one worker process, "requests.log" -> "requests.1234.log".
+    """
+    root, ext = os.path.splitext(log_file)
+    return f"{root}.{pid or os.getpid()}{ext}"
+
+
+def _rotating_handler(log_file):
+    handler = RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, delay=True)
+    handler.setFormatter(JsonLinesFormatter())
+    return handler
+
+
+def _worker_handler(handler):
+    if not isinstance(handler, RotatingFileHandler):
+        return handler
+    # the parent's file, a child must not rotate it under the other workers
+    handler.close()
+    return _rotating_handler(worker_log_file(handler.baseFilename))
 
 
 def setup_logger(logger_name, log_file):
-    # Configure the logging format
-    log_format = "%(asctime)s - %(levelname)s - %(message)s"
+    """
+    get a logger writing json lines to a rotating log_file from a background
+    thread, the caller only puts the record on a bounded queue.
+
+    safe to call many times, the handler and listener are created once per
+    logger name.
 
+    """
     logger = logging.getLogger(logger_name)
+    if logger_name in _listeners:
+        return logger
+
+    file_handler = _rotating_handler(log_file)
+
+    records = queue.Queue(LOG_QUEUE_SIZE)
+    listener = QueueListener(records, file_handler, respect_handler_level=True)
+    listener.start()
+    _listeners[logger_name] = listener
+
+    logger.addHandler(EnqueueHandler(records))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    return logger
+
+
+def restart_loggers():
+    """
+    give every logger a new queue and listener thread, for a forked child:
+    the parent's listener threads do not exist there and its queues may
+    hold records the parent writes itself.
+
+    the child writes its own file (worker_log_file()), every process rotates
+    only its files, several processes rotating one file lose records.
+    """
+    for logger_name, listener in _listeners.items():
+        records = queue.Queue(LOG_QUEUE_SIZE)
+        for handler in logging.getLogger(logger_name).handlers:
+            if isinstance(handler, EnqueueHandler):
+                handler.queue = records
+        handlers = [_worker_handler(handler) for handler in listener.handlers]
+        listener = QueueListener(records, *handlers, respect_handler_level=True)
+        listener.start()
+        _listeners[logger_name] = listener
+
 
-    file_handler = logging.FileHandler(log_file)
+def flush_loggers():
+    """
+    wait until every queued record is written.
+    """
+    for listener in _listeners.values():
+        listener.queue.join()
 
-    formatter = logging.Formatter(log_format)
-    file_handler.setFormatter(formatter)
 
-    logger.addHandler(file_handler)
-    return logger
\ No newline at end of file
+@atexit.register
+def stop_loggers():
+    while _listeners:
+        _, listener = _listeners.popitem()
+        listener.stop()
@@ -1,38 +1,152 @@
+import json
+import logging
+import random
+import time
+from functools import wraps
+
+from flask import current_app, request
+from flask_jwt_extended import get_jwt_identity
+from werkzeug.exceptions import HTTPException
+from werkzeug.wrappers import Response
+
+from app.query_stats import current_query_log
 from logs.logger_utils import setup_logger
 from utils.custom_exception_class import CustomException
-from datetime import datetime
 
-read_methods = set("GET")
+read_methods = {"GET", "HEAD", "OPTIONS"}
+
+DEFAULT_PAYLOAD_MAX_BYTES = 1024
+DEFAULT_PAYLOAD_MAX_BODY_BYTES = 64 * 1024
+DEFAULT_READ_SAMPLE_RATE = 0.0
+REDACTED = "[redacted]"
+# keys whose value never reaches the log, also any key containing one of these
+SENSITIVE_KEY_PARTS = ("password", "token", "secret")
+
+
+def _status_code(response):
+    if isinstance(response, Response):
+        return response.status_code
+    if isinstance(response, tuple) and len(response) > 1 and isinstance(response[1], int):
+        return response[1]
+    return 200
+
+
+def _identity():
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        return None
+
+
+def _redact(value):
+    """
+    value with the values of sensitive keys (passwords, tokens, secrets)
+    replaced, in nested objects and lists too.
+    """
+    if isinstance(value, dict):
+        return {
+            key: REDACTED if any(part in str(key).lower() for part in SENSITIVE_KEY_PARTS) else _redact(item)
+            for key, item in value.items()
+        }
+    if isinstance(value, list):
+        return [_redact(item) for item in value]
+    return value
+
+
+class _Payload:
+    """
+    json body of a request, redacted and cut to max_bytes when the listener
+    thread formats the record (the formatter calls str() on it).
+    """
+
+    __slots__ = ("body", "max_bytes")
+
+    def __init__(self, body, max_bytes):
+        self.body = body
+        self.max_bytes = max_bytes
+
+    def __str__(self):
+        return json.dumps(_redact(self.body), default=str)[:self.max_bytes]
+
+
+def _payload():
+    """
+    json body of the request for the log, see _Payload. only bodies up to
+    LOG_PAYLOAD_MAX_BODY_BYTES are kept, larger ones (bulk batches) and
+    other bodies (file uploads) are logged by size. a body that is not valid
+    json is not logged at all as it can not be redacted.
+    """
+    max_bytes = current_app.config.get("LOG_PAYLOAD_MAX_BYTES", DEFAULT_PAYLOAD_MAX_BYTES)
+    max_body = current_app.config.get("LOG_PAYLOAD_MAX_BODY_BYTES", DEFAULT_PAYLOAD_MAX_BODY_BYTES)
+    if not max_bytes or not request.is_json:
+        return None
+    if request.content_length is None or request.content_length > max_body:
+        return None
+    # parsed once, the view has read it already
+    body = request.get_json(silent=True)
+    if body is None:
+        return None
+    return _Payload(body, max_bytes)
+
+
+def _event(started, status):
+    event = {
+        "method": request.method,
+        "path": request.path,
+        "endpoint": request.endpoint,
+        "user": _identity(),
+        "status": status,
+        "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+        "content_length": request.content_length,
+    }
+    queries = current_query_log()
+    if queries is not None:
+        event["queries"] = len(queries)
+        event["query_ms"] = round(queries.seconds * 1000, 2)
+    payload = _payload()
+    if payload is not None:
+        event["payload"] = payload
+    return event
 
 
 def view_logging_aspect(logger_name, log_file_path):
+    """
+    log calls of a flask view as json lines.
+
+    the request thread only builds a small dict and puts it on the logger
+    queue, a background listener redacts the payload, formats and writes it. writes and errors
+    are always logged, successful reads are sampled with LOG_READ_SAMPLE_RATE
+    (0 by default). must be the innermost decorator so the route registers
+    the wrapped view.
+
+    """
     logger = setup_logger(logger_name, log_file_path)
 
     def decorator(view_method):
+        @wraps(view_method)
         def wrapper(*args, **kwargs):
-            request = args[1]
-            user = request.user
+            started = time.perf_counter()
             try:
                 response = view_method(*args, **kwargs)
-
-                logger.info(
-                    f"user {user.id if not user.is_anonymous else user} called successfully {request} with data {request.data} at {datetime.now()}"
-                ) if request.method not in read_methods else ...
             except CustomException as e:
-                logger.error(
-                    f"user {user.id if not user.is_anonymous else user} called wrongfully {request} with data {request.data} with errors {e.errors or e.message} at {datetime.now()}"
-                )
-
-                raise e
-            except Exception as e:
-                logger.exception(
-                    f"user {user.id if not user.is_anonymous else user} called wrongfully {request} with data {request.data} with Exception {e} at {datetime.now()}"
-                )
-
-                raise e
+                event = _event(started, e.status_code)
+                event["errors"] = e.errors or e.message
+                logger.error("request failed", extra={"event": event})
+                raise
+            except HTTPException as e:
+                # abort(404) and friends are answers, not crashes
+                level = logging.ERROR if e.code is None or e.code >= 500 else logging.WARNING
+                logger.log(level, "request failed", extra={"event": _event(started, e.code)})
+                raise
+            except Exception:
+                logger.exception("request failed", extra={"event": _event(started, 500)})
+                raise
 
+            sample_rate = current_app.config.get("LOG_READ_SAMPLE_RATE", DEFAULT_READ_SAMPLE_RATE)
+            if request.method not in read_methods or random.random() < sample_rate:
+                logger.info("request", extra={"event": _event(started, _status_code(response))})
             return response
 
         return wrapper
 
-    return decorator
\ No newline at end of file
+    return decorator
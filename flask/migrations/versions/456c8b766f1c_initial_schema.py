@@ -0,0 +1,57 @@
+"""initial schema
+
+tables as created by db.create_all() before migrations existed. databases
+built that way are adopted with `flask db stamp 456c8b766f1c` and then
+upgraded like any other.
+
+Revision ID: 456c8b766f1c
+Revises: 
+Create Date: 2026-10-18 20:15:07.975237
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '456c8b766f1c'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'users',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('username', sa.String(), nullable=False),
+        sa.Column('email', sa.String(), nullable=False),
+        sa.Column('password', sa.Text(), nullable=True),
+        sa.Column('deposit', sa.Float(), nullable=False),
+        sa.Column('role', sa.Enum('seller', 'buyer', name='role'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'token_blocklist',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('jti', sa.String(), nullable=True),
+        sa.Column('create_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_table(
+        'product',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('product_name', sa.String(length=100), nullable=False),
+        sa.Column('amount_available', sa.Float(), nullable=True),
+        sa.Column('cost', sa.Float(), nullable=False),
+        sa.Column('description', sa.Text(), nullable=True),
+        sa.Column('seller_id', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['seller_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade():
+    op.drop_table('product')
+    op.drop_table('token_blocklist')
+    op.drop_table('users')
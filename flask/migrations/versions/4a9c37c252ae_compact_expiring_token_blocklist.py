@@ -0,0 +1,111 @@
+"""compact expiring token blocklist
+
+token_blocklist.jti becomes the 16 byte key of the jti (the uuid bytes, a
+blake2b digest of other strings) and gets the token's exp, indexed for the
+purge. the table is rebuilt and the rows converted in chunks. its id
+becomes AUTOINCREMENT, the ids of purged rows must not come back.
+
+the old rows have no exp, they get create_at plus the longest default
+token lifetime (30 days, refresh tokens) so the purge drops them then.
+
+Revision ID: 4a9c37c252ae
+Revises: 61d4ff95cad4
+Create Date: 2026-10-18 20:58:29.036620
+
+"""
+from datetime import datetime, timedelta, timezone
+import hashlib
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4a9c37c252ae'
+down_revision = '61d4ff95cad4'
+branch_labels = None
+depends_on = None
+
+
+LEGACY_TOKEN_LIFETIME = timedelta(days=30)
+CHUNK_SIZE = 10000
+
+
+def jti_key(jti):
+    try:
+        return uuid.UUID(jti).bytes
+    except ValueError:
+        return hashlib.blake2b(jti.encode(), digest_size=16).digest()
+
+
+def legacy_exp(create_at):
+    if isinstance(create_at, str):
+        create_at = datetime.fromisoformat(create_at)
+    create_at = create_at or datetime.utcnow()
+    return int((create_at + LEGACY_TOKEN_LIFETIME).replace(tzinfo=timezone.utc).timestamp())
+
+
+def jti_string(key):
+    return str(uuid.UUID(bytes=key))
+
+
+def copy_rows(old, new, convert):
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(old).where(old.c.id > last_id).order_by(old.c.id).limit(CHUNK_SIZE)
+        ).all()
+        if not rows:
+            return
+        converted = [convert(row) for row in rows if row.jti is not None]
+        if converted:
+            bind.execute(new.insert(), converted)
+        last_id = rows[-1].id
+
+
+def upgrade():
+    old = sa.table(
+        'token_blocklist',
+        sa.column('id', sa.Integer()),
+        sa.column('jti', sa.String()),
+        sa.column('create_at', sa.DateTime()),
+    )
+    new = op.create_table(
+        'token_blocklist_new',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('jti', sa.LargeBinary(length=16), nullable=False),
+        sa.Column('exp', sa.Integer(), nullable=True),
+        sa.Column('create_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sqlite_autoincrement=True,
+    )
+    copy_rows(old, new, lambda row: {
+        'id': row.id, 'jti': jti_key(row.jti), 'exp': legacy_exp(row.create_at), 'create_at': row.create_at,
+    })
+    op.drop_table('token_blocklist')
+    op.rename_table('token_blocklist_new', 'token_blocklist')
+    op.create_index('ix_token_blocklist_jti', 'token_blocklist', ['jti'], unique=True)
+    op.create_index('ix_token_blocklist_exp', 'token_blocklist', ['exp'])
+
+
+def downgrade():
+    old = sa.table(
+        'token_blocklist',
+        sa.column('id', sa.Integer()),
+        sa.column('jti', sa.LargeBinary()),
+        sa.column('create_at', sa.DateTime()),
+    )
+    new = op.create_table(
+        'token_blocklist_old',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('jti', sa.String(), nullable=True),
+        sa.Column('create_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    # jti that were not uuids come back as their digest in uuid form
+    copy_rows(old, new, lambda row: {'id': row.id, 'jti': jti_string(row.jti), 'create_at': row.create_at})
+    op.drop_table('token_blocklist')
+    op.rename_table('token_blocklist_old', 'token_blocklist')
+    op.create_index('ix_token_blocklist_jti', 'token_blocklist', ['jti'], unique=True)
@@ -0,0 +1,77 @@
+"""hot path indexes
+
+unique index on users.username (login, register, jwt lookup), unique index
+on token_blocklist.jti, the product listing indexes (seller_id, cost,
+product_name, in stock) and the token_blocklist_version counter.
+
+only indexes and a new table are created, so it runs against a live
+database without rebuilding any table. objects that db.create_all() may
+already have created are skipped.
+
+Revision ID: 4aa24e1d99b2
+Revises: 456c8b766f1c
+Create Date: 2026-10-18 20:15:13.897835
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4aa24e1d99b2'
+down_revision = '456c8b766f1c'
+branch_labels = None
+depends_on = None
+
+
+UNIQUE_COLUMNS = (
+    ('users', 'username'),
+    ('token_blocklist', 'jti'),
+)
+
+
+def upgrade():
+    bind = op.get_bind()
+
+    for table, column in UNIQUE_COLUMNS:
+        duplicate = bind.execute(sa.text(
+            f'SELECT {column} FROM {table} WHERE {column} IS NOT NULL '
+            f'GROUP BY {column} HAVING COUNT(*) > 1 LIMIT 1'
+        )).scalar()
+        if duplicate is not None:
+            raise RuntimeError(
+                f'{table}.{column} has duplicate values (e.g. {duplicate!r}), '
+                'remove them before creating the unique index'
+            )
+
+    op.create_index('ix_users_username', 'users', ['username'], unique=True, if_not_exists=True)
+    op.create_index('ix_token_blocklist_jti', 'token_blocklist', ['jti'], unique=True, if_not_exists=True)
+    op.create_index('ix_product_seller_id_id', 'product', ['seller_id', 'id'], if_not_exists=True)
+    op.create_index('ix_product_cost_id', 'product', ['cost', 'id'], if_not_exists=True)
+    op.create_index('ix_product_product_name_id', 'product', ['product_name', 'id'], if_not_exists=True)
+    op.create_index(
+        'ix_product_in_stock_id',
+        'product',
+        ['id'],
+        if_not_exists=True,
+        sqlite_where=sa.text('amount_available > 0'),
+        postgresql_where=sa.text('amount_available > 0'),
+    )
+
+    if not sa.inspect(bind).has_table('token_blocklist_version'):
+        op.create_table(
+            'token_blocklist_version',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('version', sa.Integer(), nullable=False),
+            sa.PrimaryKeyConstraint('id'),
+        )
+
+
+def downgrade():
+    op.drop_table('token_blocklist_version')
+    op.drop_index('ix_product_in_stock_id', table_name='product')
+    op.drop_index('ix_product_product_name_id', table_name='product')
+    op.drop_index('ix_product_cost_id', table_name='product')
+    op.drop_index('ix_product_seller_id_id', table_name='product')
+    op.drop_index('ix_token_blocklist_jti', table_name='token_blocklist')
+    op.drop_index('ix_users_username', table_name='users')
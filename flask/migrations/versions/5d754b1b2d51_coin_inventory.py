@@ -0,0 +1,35 @@
+"""coin inventory
+
+the coins every vending machine holds for change, one row per machine and
+coin value. a machine without rows keeps paying change without counting
+coins, so existing databases behave as before until `flask coins` fills it.
+
+Revision ID: 5d754b1b2d51
+Revises: 4a9c37c252ae
+Create Date: 2026-10-18 21:05:35.268493
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d754b1b2d51'
+down_revision = '4a9c37c252ae'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'coin_inventory',
+        sa.Column('machine_id', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('coin', sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.CheckConstraint('count >= 0', name='ck_coin_inventory_count'),
+        sa.PrimaryKeyConstraint('machine_id', 'coin'),
+    )
+
+
+def downgrade():
+    op.drop_table('coin_inventory')
@@ -0,0 +1,75 @@
+"""product full text search
+
+fts5 external content table over product.product_name and
+product.description, the triggers keeping it in sync and the index of the
+existing rows. sqlite only, other databases are left unchanged.
+
+Revision ID: 61d4ff95cad4
+Revises: 88f1abe7169e
+Create Date: 2026-10-18 20:43:11.515693
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '61d4ff95cad4'
+down_revision = '88f1abe7169e'
+branch_labels = None
+depends_on = None
+
+
+UPGRADE = (
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5(
+        product_name, description,
+        content='product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    "INSERT INTO product_fts(product_fts, rank) VALUES ('rank', 'bm25(10.0, 1.0)')",
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_insert AFTER INSERT ON product BEGIN
+        INSERT INTO product_fts(rowid, product_name, description)
+        VALUES (new.id, new.product_name, new.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_delete AFTER DELETE ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, product_name, description)
+        VALUES ('delete', old.id, old.product_name, old.description);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS product_fts_update AFTER UPDATE OF product_name, description ON product BEGIN
+        INSERT INTO product_fts(product_fts, rowid, product_name, description)
+        VALUES ('delete', old.id, old.product_name, old.description);
+        INSERT INTO product_fts(rowid, product_name, description)
+        VALUES (new.id, new.product_name, new.description);
+    END
+    """,
+    "INSERT INTO product_fts(product_fts) VALUES ('rebuild')",
+    "INSERT INTO product_fts(product_fts) VALUES ('optimize')",
+)
+
+DOWNGRADE = (
+    "DROP TRIGGER IF EXISTS product_fts_update",
+    "DROP TRIGGER IF EXISTS product_fts_delete",
+    "DROP TRIGGER IF EXISTS product_fts_insert",
+    "DROP TABLE IF EXISTS product_fts",
+)
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for statement in UPGRADE:
+        op.execute(sa.text(statement))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    for statement in DOWNGRADE:
+        op.execute(sa.text(statement))
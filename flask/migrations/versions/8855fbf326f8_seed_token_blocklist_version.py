@@ -0,0 +1,31 @@
+"""seed token blocklist version
+
+the counter row is created up front, revocations only update it instead of
+racing to insert it.
+
+Revision ID: 8855fbf326f8
+Revises: 5d754b1b2d51
+Create Date: 2026-10-18 21:15:33.411175
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8855fbf326f8'
+down_revision = '5d754b1b2d51'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute(
+        "INSERT INTO token_blocklist_version (id, version) "
+        "SELECT 1, 0 WHERE NOT EXISTS (SELECT 1 FROM token_blocklist_version WHERE id = 1)"
+    )
+
+
+def downgrade():
+    # the row is still used by the older revisions
+    pass
@@ -0,0 +1,47 @@
+"""row versions and table change counters
+
+version column of product and users plus the per table change counter
+behind the ETags of product and user reads. the row versions are random 62
+bit numbers, hence BigInteger (counters too).
+
+Revision ID: 88f1abe7169e
+Revises: a6b5b9676ffe
+Create Date: 2026-10-18 20:36:50.748292
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '88f1abe7169e'
+down_revision = 'a6b5b9676ffe'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    table_version = op.create_table(
+        'table_version',
+        sa.Column('name', sa.String(length=64), nullable=False),
+        sa.Column('version', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('name'),
+    )
+    # the rows exist up front, so concurrent first writers only ever UPDATE them
+    op.bulk_insert(table_version, [{'name': 'product', 'version': 0}, {'name': 'users', 'version': 0}])
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.BigInteger(), server_default='0', nullable=False))
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.BigInteger(), server_default='0', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_column('version')
+
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_column('version')
+
+    op.drop_table('table_version')
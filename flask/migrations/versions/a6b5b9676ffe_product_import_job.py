@@ -0,0 +1,41 @@
+"""product import job
+
+checkpoint table of the streaming catalog importer.
+
+Revision ID: a6b5b9676ffe
+Revises: 4aa24e1d99b2
+Create Date: 2026-10-18 20:20:38.742582
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a6b5b9676ffe'
+down_revision = '4aa24e1d99b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'product_import_job',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('name', sa.String(length=255), nullable=False),
+        sa.Column('seller_id', sa.Integer(), nullable=False),
+        sa.Column('byte_offset', sa.BigInteger(), nullable=False),
+        sa.Column('rows', sa.Integer(), nullable=False),
+        sa.Column('imported', sa.Integer(), nullable=False),
+        sa.Column('rejected', sa.Integer(), nullable=False),
+        sa.Column('finished', sa.Boolean(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(['seller_id'], ['users.id']),
+        sa.PrimaryKeyConstraint('id'),
+    )
+    op.create_index('ix_product_import_job_name', 'product_import_job', ['name'], unique=True)
+
+
+def downgrade():
+    op.drop_index('ix_product_import_job_name', table_name='product_import_job')
+    op.drop_table('product_import_job')
@@ -0,0 +1,201 @@
+from functools import reduce
+from math import gcd
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import bindparam
+
+from app.config import db
+from product.product_models import CoinInventory
+
+
+# coin values in cents, the ones buyers can deposit
+COINS = (100, 50, 20, 10, 5)
+DEFAULT_MACHINE_ID = 1
+# above this many cents the table would get too big, such change is refused
+# unless the machine holds the coins of the unlimited answer
+MAX_SOLVER_AMOUNT = 100_000
+
+
+class ChangeTooLarge(ValueError):
+    """
+    the change needs the bounded solver but is above MAX_SOLVER_AMOUNT.
+    """
+
+
+def to_cents(amount):
+    """
+    whole cents of a stored amount (deposit and cost columns hold cents as
+    floats), None when it is not a whole number of cents.
+    """
+    if amount is None:
+        return None
+    cents = round(amount)
+    if abs(amount - cents) > 1e-6:
+        return None
+    return cents
+
+
+def _greedy(amount, inventory):
+    change = {}
+    for coin in sorted(inventory, reverse=True):
+        count = min(inventory[coin], amount // coin)
+        if count:
+            change[coin] = count
+            amount -= coin * count
+    return change if amount == 0 else None
+
+
+def make_change(amount, inventory=None):
+    """
+    fewest coins adding up to amount cents with at most inventory[coin] of
+    each coin, inventory None means unlimited COINS.
+
+    when the machine holds the coins of the unlimited answer that answer is
+    returned, otherwise it is a bounded coin change solved with a table over
+    the amount in steps of the coins' gcd. every coin's count is split into
+    1, 2, 4, ... pieces so each piece is used once (0/1 knapsack), one
+    table row is computed per piece with list operations.
+
+    Returns:
+    dict coin -> count (no zero counts), {} for 0
+    None when no combination is exact
+    raise ChangeTooLarge when the solver is needed above MAX_SOLVER_AMOUNT
+
+    """
+    if amount is None or amount < 0:
+        return None
+    if amount == 0:
+        return {}
+    if inventory is None:
+        # COINS is a canonical system, unlimited greedy is optimal
+        return _greedy(amount, {coin: amount // coin for coin in COINS})
+
+    inventory = {coin: count for coin, count in inventory.items() if count > 0 and coin <= amount}
+    if sum(coin * count for coin, count in inventory.items()) < amount:
+        return None
+    if inventory.keys() <= set(COINS):
+        # the unlimited answer is optimal, if the machine has those coins
+        # nothing with fewer coins exists
+        change = make_change(amount)
+        if change is not None and all(inventory.get(coin, 0) >= count for coin, count in change.items()):
+            return change
+    if amount > MAX_SOLVER_AMOUNT:
+        # a greedy answer could miss an exact one, refuse instead
+        raise ChangeTooLarge(amount)
+    unit = reduce(gcd, inventory, amount)
+    target = amount // unit
+
+    pieces = []
+    for coin, count in inventory.items():
+        count = min(count, amount // coin)
+        size = 1
+        while count:
+            size = min(size, count)
+            pieces.append((coin, size, coin // unit * size))
+            count -= size
+            size *= 2
+
+    # tables[i][a]: fewest coins for a units with the first i pieces
+    unreachable = amount + 1
+    tables = [[0] + [unreachable] * target]
+    for coin, size, weight in pieces:
+        best = tables[-1]
+        with_piece = [unreachable] * weight + list(map(size.__add__, best[:target + 1 - weight]))
+        tables.append(list(map(min, best, with_piece)))
+    if tables[-1][target] >= unreachable:
+        return None
+
+    # walk back, a piece was used where it improved on the table before it
+    change = {}
+    position = target
+    for i in range(len(pieces), 0, -1):
+        if tables[i][position] < tables[i - 1][position]:
+            coin, size, weight = pieces[i - 1]
+            change[coin] = change.get(coin, 0) + size
+            position -= weight
+    return change
+
+
+def machine_id():
+    return current_app.config.get("MACHINE_ID", DEFAULT_MACHINE_ID)
+
+
+def load_inventory(machine=None):
+    """
+    coin -> count of the machine, None when it does not track its coins.
+    """
+    machine = machine_id() if machine is None else machine
+    rows = db.session.execute(
+        db.select(CoinInventory.coin, CoinInventory.count).where(CoinInventory.machine_id == machine)
+    ).all()
+    return {coin: count for coin, count in rows} or None
+
+
+def dispense(change, machine=None):
+    """
+    take the coins of change out of the machine's inventory in the current
+    transaction, every row only if it still has enough coins.
+
+    Returns:
+    True if every coin row matched
+
+    """
+    if not change:
+        return True
+    machine = machine_id() if machine is None else machine
+    statement = (
+        db.update(CoinInventory)
+        .where(
+            CoinInventory.machine_id == machine,
+            CoinInventory.coin == bindparam("c_coin"),
+            CoinInventory.count >= bindparam("c_count"),
+        )
+        .values(count=CoinInventory.count - bindparam("c_count"))
+    )
+    params = [{"c_coin": coin, "c_count": count} for coin, count in sorted(change.items())]
+    connection = db.session.connection()
+    if connection.dialect.supports_sane_multi_rowcount:
+        return connection.execute(statement, params).rowcount == len(params)
+    return all(connection.execute(statement, param).rowcount == 1 for param in params)
+
+
+def insert_coin(coin, machine=None):
+    """
+    a deposited coin goes into the machine, a no-op for untracked machines.
+    """
+    machine = machine_id() if machine is None else machine
+    db.session.execute(
+        db.update(CoinInventory)
+        .where(CoinInventory.machine_id == machine, CoinInventory.coin == coin)
+        .values(count=CoinInventory.count + 1)
+    )
+
+
+def change_coins(change):
+    """
+    {coin: count} as the api shows it, largest coin first.
+    """
+    return {f"{coin} cent": change[coin] for coin in sorted(change, reverse=True)}
+
+
+@click.command("coins")
+@click.argument("counts", nargs=-1)
+@click.option("--machine", type=int, help="machine id, default MACHINE_ID")
+@with_appcontext
+def coins_command(counts, machine):
+    """Show or set the coin inventory, e.g. `flask coins 5=100 10=100`."""
+    machine = machine_id() if machine is None else machine
+    for item in counts:
+        coin, _, count = item.partition("=")
+        if not (coin.isdigit() and count.isdigit()) or int(coin) not in COINS:
+            raise click.BadParameter(f"{item!r}, expected COIN=COUNT with COIN in {sorted(COINS)}")
+        db.session.merge(CoinInventory(machine_id=machine, coin=int(coin), count=int(count)))
+    db.session.commit()
+    inventory = load_inventory(machine)
+    if inventory is None:
+        click.echo(f"machine {machine} does not track its coins")
+        return
+    for coin in sorted(inventory):
+        click.echo(f"{coin} cent: {inventory[coin]}")
@@ -0,0 +1,271 @@
+from marshmallow import ValidationError
+
+from app.config import db
+from app.table_version import TableVersion, new_version
+from product.product_models import Product
+from schemas import ProductCreateSchema, ProductUpdateSchema
+from utils.custom_exception_class import CustomException
+
+
+BULK_CHUNK_SIZE = 1000
+BULK_MAX_ITEMS = 20000
+
+NOT_FOUND = "product not found"
+FORBIDDEN = "you don't have permission to access this product"
+
+# built once, marshmallow schemas are reusable and building one is not free
+product_create_schema = ProductCreateSchema(many=True)
+product_update_schema = ProductUpdateSchema(many=True)
+
+
+def chunks(items, size=None):
+    size = size or BULK_CHUNK_SIZE
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _check_batch(items):
+    if not isinstance(items, list) or not items:
+        raise CustomException(400, "items must be a non empty list")
+    if len(items) > BULK_MAX_ITEMS:
+        raise CustomException(400, f"a batch can have at most {BULK_MAX_ITEMS} items")
+
+
+def _load(schema, items):
+    """
+    validate the whole batch with one schema load.
+
+    Returns:
+    (rows, errors) rows aligned with items, errors index -> messages
+
+    """
+    _check_batch(items)
+    try:
+        return schema.load(items), {}
+    except ValidationError as e:
+        return e.valid_data, e.messages
+
+
+def _error(index, message=None, errors=None):
+    result = {"index": index, "status": "error"}
+    if message:
+        result["error"] = message
+    if errors:
+        result["errors"] = errors
+    return result
+
+
+def product_owners(ids):
+    return dict(
+        db.session.execute(db.select(Product.id, Product.seller_id).where(Product.id.in_(ids))).all()
+    )
+
+
+def stamp_products(ids, seller_id):
+    """
+    set the version of rows changed by an ORM bulk update, which can not mix
+    sql expressions into its per row parameters. call with TableVersion.bump().
+
+    Returns:
+    set of the ids stamped, the rows of ids seller_id still owns
+
+    """
+    version = new_version()
+    statement = (
+        db.update(Product)
+        .where(Product.id.in_(ids), Product.seller_id == seller_id)
+        .values(version=version)
+        .execution_options(synchronize_session=False)
+    )
+    if db.session.get_bind().dialect.update_returning:
+        return set(db.session.execute(statement.returning(Product.id)).scalars())
+    db.session.execute(statement)
+    return set(
+        db.session.execute(
+            db.select(Product.id).where(Product.id.in_(ids), Product.version == version)
+        ).scalars()
+    )
+
+
+def delete_products(ids, seller_id):
+    """
+    delete the rows of ids seller_id owns. call with TableVersion.bump().
+
+    Returns:
+    set of the ids deleted
+
+    """
+    statement = db.delete(Product).where(Product.id.in_(ids), Product.seller_id == seller_id)
+    if db.session.get_bind().dialect.delete_returning:
+        return set(db.session.execute(statement.returning(Product.id)).scalars())
+    owned = set(
+        db.session.execute(
+            db.select(Product.id)
+            .where(Product.id.in_(ids), Product.seller_id == seller_id)
+            .with_for_update()
+        ).scalars()
+    )
+    db.session.execute(statement)
+    return owned
+
+
+def insert_products(rows):
+    """
+    insert rows with one executemany insert. call with TableVersion.bump().
+
+    the ids are not RETURNed, an INSERT ... RETURNING with a parameter list
+    runs one statement per row. every row of the insert gets the same random
+    version, the ids are read back by it above the largest id before the
+    insert, in the same transaction. ids grow in insert order.
+
+    Returns:
+    ids of rows, in the order of rows
+
+    """
+    version = new_version()
+    last_id = db.session.execute(db.select(db.func.max(Product.id))).scalar() or 0
+    db.session.execute(db.insert(Product).values(version=version), rows)
+    ids = db.session.execute(
+        db.select(Product.id)
+        .where(Product.id > last_id, Product.version == version)
+        .order_by(Product.id)
+    ).scalars().all()
+    if len(ids) < len(rows):
+        # the largest rows were deleted between the two statements and their
+        # ids reused, read the whole table
+        ids = db.session.execute(
+            db.select(Product.id).where(Product.version == version).order_by(Product.id)
+        ).scalars().all()
+    return ids
+
+
+def _write_errors(results, chunk, written, key):
+    """
+    error results for the items of chunk whose row was not written, the row
+    was deleted or changed owner since product_owners() read it.
+    """
+    missed = {key(item) for _, item in chunk} - written
+    owners = product_owners(missed) if missed else {}
+    for index, item in chunk:
+        if key(item) in missed:
+            results[index] = _error(index, NOT_FOUND if owners.get(key(item)) is None else FORBIDDEN)
+
+
+def bulk_create(seller_id, items):
+    """
+    insert every valid item as a product of seller_id.
+
+    rows are inserted BULK_CHUNK_SIZE at a time with one executemany insert
+    and one commit per chunk, see insert_products().
+
+    Returns:
+    list of per item results in the order of items
+
+    """
+    rows, errors = _load(product_create_schema, items)
+    results = [_error(index, errors=errors[index]) if index in errors else None for index in range(len(items))]
+    valid = [(index, dict(row, seller_id=seller_id)) for index, row in enumerate(rows) if index not in errors]
+
+    for chunk in chunks(valid):
+        try:
+            TableVersion.bump(Product.__tablename__)
+            ids = insert_products([row for _, row in chunk])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        for (index, _), product_id in zip(chunk, ids):
+            results[index] = {"index": index, "id": product_id, "status": "created"}
+    return results
+
+
+def bulk_update(seller_id, items):
+    """
+    update every valid item ({id, fields...}) owned by seller_id.
+
+    ownership of a chunk is checked with one IN query, the owned rows are
+    written with one executemany update by primary key guarded by seller_id.
+    the status of an item is what the guarded write did: the version stamp
+    returns the rows seller_id still owned when they were written.
+
+    Returns:
+    list of per item results in the order of items
+
+    """
+    rows, errors = _load(product_update_schema, items)
+    results = [_error(index, errors=errors[index]) if index in errors else None for index in range(len(items))]
+    valid = [(index, row) for index, row in enumerate(rows) if index not in errors]
+
+    for chunk in chunks(valid):
+        owners = product_owners({row["id"] for _, row in chunk})
+        owned = []
+        for index, row in chunk:
+            owner = owners.get(row["id"])
+            if owner is None:
+                results[index] = _error(index, NOT_FOUND)
+            elif owner != seller_id:
+                results[index] = _error(index, FORBIDDEN)
+            else:
+                owned.append((index, row))
+                results[index] = {"index": index, "id": row["id"], "status": "updated"}
+        updates = [row for _, row in owned if len(row) > 1]
+        try:
+            if owned:
+                TableVersion.bump(Product.__tablename__)
+            if updates:
+                db.session.execute(
+                    db.update(Product)
+                    .where(Product.seller_id == seller_id)
+                    .execution_options(synchronize_session=None),
+                    updates,
+                )
+            if owned:
+                written = stamp_products([row["id"] for _, row in owned], seller_id)
+                _write_errors(results, owned, written, lambda row: row["id"])
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    return results
+
+
+def bulk_delete(seller_id, ids):
+    """
+    delete every product of ids owned by seller_id, one DELETE per chunk.
+    an item is deleted when the DELETE guarded by seller_id removed its row.
+
+    Returns:
+    list of per item results in the order of ids
+
+    """
+    _check_batch(ids)
+    results = [None] * len(ids)
+    valid = []
+    for index, product_id in enumerate(ids):
+        if isinstance(product_id, int) and not isinstance(product_id, bool):
+            valid.append((index, product_id))
+        else:
+            results[index] = _error(index, "id must be an integer")
+
+    for chunk in chunks(valid):
+        owners = product_owners({product_id for _, product_id in chunk})
+        owned = []
+        for index, product_id in chunk:
+            owner = owners.get(product_id)
+            if owner is None:
+                results[index] = _error(index, NOT_FOUND)
+            elif owner != seller_id:
+                results[index] = _error(index, FORBIDDEN)
+            else:
+                owned.append((index, product_id))
+                results[index] = {"index": index, "id": product_id, "status": "deleted"}
+        try:
+            if owned:
+                TableVersion.bump(Product.__tablename__)
+                deleted = delete_products({product_id for _, product_id in owned}, seller_id)
+                _write_errors(results, owned, deleted, lambda product_id: product_id)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+    return results
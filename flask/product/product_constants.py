@@ -1,2 +1,13 @@
+import os
+
+from logs.logger_utils import LOG_DIR
+
 PRODUCT_LOGGER = "product_logger"
-PRODUCT_LOG_FILE_PATH = "./logs/product_importing_log_file.log"
+PRODUCT_LOG_FILE_PATH = os.path.join(LOG_DIR, "product_importing_log_file.log")
+
+# sort param -> Product column, each one has a (column, id) index
+PRODUCT_SORT_COLUMNS = {
+    "id": "id",
+    "cost": "cost",
+    "product_name": "product_name",
+}
@@ -0,0 +1,306 @@
+import csv
+import hashlib
+import json
+import logging
+import os
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from marshmallow import EXCLUDE, ValidationError
+
+from app.config import db
+from app.table_version import TableVersion, new_version
+from product.product_bulk import FORBIDDEN, NOT_FOUND, product_owners, stamp_products
+from product.product_constants import PRODUCT_LOGGER
+from product.product_models import Product, ProductImportJob
+from schemas import ProductCreateSchema, ProductUpdateSchema
+from user.user_models import User
+from utils.custom_exception_class import CustomException
+
+
+IMPORT_FORMATS = ("csv", "ndjson")
+DEFAULT_IMPORT_CHUNK_SIZE = 1000
+HASH_BLOCK_SIZE = 1 << 20
+
+logger = logging.getLogger(PRODUCT_LOGGER)
+
+product_create_schema = ProductCreateSchema()
+product_update_schema = ProductUpdateSchema()
+
+
+class LineReader:
+    """
+    iterate the decoded lines of a binary stream and keep the byte offset of
+    the end of the last line read, the resume position of the import.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.offset = 0
+
+    def seek(self, offset):
+        self.stream.seek(offset)
+        self.offset = offset
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.stream.readline()
+        if not line:
+            raise StopIteration
+        self.offset += len(line)
+        return line.decode("utf-8")
+
+
+def format_from_filename(filename):
+    extension = os.path.splitext(filename or "")[1].lower().lstrip(".")
+    return {"jsonl": "ndjson", "json": "ndjson"}.get(extension, extension)
+
+
+def parse_records(stream, fmt, offset=0, skip=0):
+    """
+    lazily parse a binary stream of csv or ndjson, one record at a time.
+
+    param :offset: byte position to resume from, needs a seekable stream
+    param :skip: records to drop first (resume on a stream that can not seek)
+
+    Returns:
+    generator of (byte position after the record, record dict or None, error)
+
+    """
+    lines = LineReader(stream)
+
+    if fmt == "csv":
+        header_line = next(lines, None)
+        if header_line is None:
+            return
+        fieldnames = [name.strip() for name in next(csv.reader([header_line.lstrip("\ufeff")]))]
+        if offset > lines.offset:
+            lines.seek(offset)
+        records = (
+            (lines.offset, _csv_record(row), None)
+            for row in csv.DictReader(lines, fieldnames=fieldnames)
+        )
+    else:
+        if offset:
+            lines.seek(offset)
+        records = (_json_record(lines.offset, line) for line in lines if line.strip())
+
+    for position, record, error in records:
+        if skip:
+            skip -= 1
+            continue
+        yield position, record, error
+
+
+def _csv_record(row):
+    record = {k: (v if v != "" else None) for k, v in row.items() if k is not None}
+    # csv values are strings, the update schema only takes a real integer id
+    product_id = record.get("id")
+    if isinstance(product_id, str) and product_id.strip().isdigit():
+        record["id"] = int(product_id)
+    return record
+
+
+def _json_record(position, line):
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return position, None, "invalid json"
+    if not isinstance(record, dict):
+        return position, None, "a line must be a json object"
+    return position, record, None
+
+
+def validate_records(records):
+    """
+    load every parsed record with the product schemas, records with an id
+    update that product, the others create a new one.
+
+    Returns:
+    generator of (position, row or None, error)
+
+    """
+    for position, record, error in records:
+        row = None
+        if error is None:
+            try:
+                if record.get("id") is not None:
+                    row = product_update_schema.load(record, unknown=EXCLUDE)
+                else:
+                    record.pop("id", None)
+                    row = product_create_schema.load(record, unknown=EXCLUDE)
+            except ValidationError as e:
+                error = e.messages
+        yield position, row, error
+
+
+def reject(job, row_number, error):
+    logger.warning(f"import {job.name} rejected row {row_number}: {error}")
+
+
+def write_chunk(job, chunk):
+    """
+    upsert one chunk of (row_number, row): new rows with one executemany
+    insert, rows with an id with one executemany update guarded by seller.
+
+    Returns:
+    number of rows written
+
+    """
+    inserts = [dict(row, seller_id=job.seller_id) for _, row in chunk if "id" not in row]
+    updates = [(row_number, row) for row_number, row in chunk if "id" in row]
+
+    owned = []
+    if updates:
+        owners = product_owners({row["id"] for _, row in updates})
+        for row_number, row in updates:
+            owner = owners.get(row["id"])
+            if owner == job.seller_id:
+                owned.append(row)
+            else:
+                job.rejected += 1
+                reject(job, row_number, NOT_FOUND if owner is None else FORBIDDEN)
+
+    if inserts or owned:
+        TableVersion.bump(Product.__tablename__)
+    if inserts:
+        db.session.execute(db.insert(Product).values(version=new_version()), inserts)
+    if owned:
+        db.session.execute(
+            db.update(Product)
+            .where(Product.seller_id == job.seller_id)
+            .execution_options(synchronize_session=None),
+            owned,
+        )
+        stamp_products([row["id"] for row in owned], job.seller_id)
+    return len(inserts) + len(owned)
+
+
+def content_key(stream):
+    """
+    digest of a seekable stream's content, the stream is rewound after.
+    the default job name, so only the same file resumes a checkpoint.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for block in iter(lambda: stream.read(HASH_BLOCK_SIZE), b""):
+        digest.update(block)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def start_job(name, seller_id):
+    """
+    load the checkpoint of an unfinished job with this name or start a new one.
+    """
+    job = ProductImportJob.query.filter_by(name=name).one_or_none()
+    if job is not None and job.seller_id != seller_id:
+        raise CustomException(403, f"import {name} belongs to another seller")
+    if job is None:
+        job = ProductImportJob(name=name, seller_id=seller_id)
+        db.session.add(job)
+    if job.finished:
+        job.byte_offset = job.rows = job.imported = job.rejected = 0
+        job.finished = False
+    db.session.commit()
+    return job
+
+
+def import_products(stream, fmt, seller_id, name, chunk_size=None):
+    """
+    stream a csv or ndjson catalog into the product table.
+
+    the file is parsed and validated lazily and written chunk_size rows at a
+    time, every chunk is committed together with the job checkpoint (byte
+    offset and counters), so memory stays flat for any file size and running
+    the same job name again resumes after the last committed chunk.
+
+    param :stream: binary file object
+    param :fmt: csv or ndjson
+    param :name: job name used as checkpoint key
+
+    Returns:
+    summary dict (job, rows, imported, rejected, resumed_from, seconds, rows_per_second)
+
+    """
+    if fmt not in IMPORT_FORMATS:
+        raise CustomException(400, f"format can only be one of {list(IMPORT_FORMATS)}")
+    chunk_size = chunk_size or current_app.config.get("IMPORT_CHUNK_SIZE", DEFAULT_IMPORT_CHUNK_SIZE)
+    job = start_job(name, seller_id)
+    resumed_from = job.rows
+    seekable = stream.seekable() if hasattr(stream, "seekable") else False
+    records = parse_records(
+        stream,
+        fmt,
+        offset=job.byte_offset if seekable else 0,
+        skip=0 if seekable else job.rows,
+    )
+
+    started = time.perf_counter()
+    chunk = []
+    row_number = job.rows
+    position = job.byte_offset
+    try:
+        for position, row, error in validate_records(records):
+            row_number += 1
+            if error is not None:
+                job.rejected += 1
+                reject(job, row_number, error)
+            else:
+                chunk.append((row_number, row))
+            if len(chunk) >= chunk_size:
+                job.imported += write_chunk(job, chunk)
+                job.rows, job.byte_offset = row_number, position
+                db.session.commit()
+                chunk = []
+
+        job.imported += write_chunk(job, chunk)
+        job.rows, job.byte_offset = row_number, position
+        job.finished = True
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    seconds = time.perf_counter() - started
+    processed = job.rows - resumed_from
+    summary = {
+        "job": job.name,
+        "rows": job.rows,
+        "imported": job.imported,
+        "rejected": job.rejected,
+        "resumed_from": resumed_from,
+        "seconds": round(seconds, 3),
+        "rows_per_second": round(processed / seconds) if seconds else processed,
+    }
+    logger.info(f"import {job.name} finished: {summary}")
+    return summary
+
+
+@click.command("import-products")
+@with_appcontext
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--seller", "seller_username", required=True, help="username of the seller owning the products")
+@click.option("--format", "fmt", type=click.Choice(IMPORT_FORMATS), help="default: from the file extension")
+@click.option("--chunk-size", type=int, help="rows per transaction")
+@click.option("--job", "name", help="checkpoint name, default: seller and file content")
+def import_products_command(path, seller_username, fmt, chunk_size, name):
+    """Import (or resume importing) a csv / ndjson product catalog."""
+    seller = User.get_user_by_username(seller_username)
+    if seller is None or seller.role is None or seller.role.name != "seller":
+        raise click.BadParameter(f"{seller_username} is not a seller", param_hint="--seller")
+    fmt = fmt or format_from_filename(path)
+
+    with open(path, "rb") as stream:
+        name = name or f"{seller.username}:{content_key(stream)}"
+        try:
+            summary = import_products(stream, fmt, seller.id, name, chunk_size)
+        except CustomException as e:
+            raise click.ClickException(e.message)
+    click.echo(
+        f"{summary['rows']} rows ({summary['imported']} imported, {summary['rejected']} rejected) "
+        f"in {summary['seconds']}s, {summary['rows_per_second']} rows/s"
+    )
@@ -1,8 +1,11 @@
 from app.config import db
+from app.table_version import Versioned
+from utils.serialization import SerializerMixin
+from datetime import datetime
 
 
 
-class Product(db.Model):
+class Product(db.Model, Versioned, SerializerMixin):
     id = db.Column(db.Integer, primary_key=True)
     product_name = db.Column(db.String(100), nullable=False)
     amount_available = db.Column(db.Float, nullable=True)
@@ -10,7 +13,58 @@ class Product(db.Model):
     description = db.Column(db.Text, nullable=True)
     seller_id = db.Column(db.Integer, db.ForeignKey('users.id'),nullable=False)
 
+    # keyset listing indexes, every sort ends with id so the cursor is unique
+    __table_args__ = (
+        db.Index("ix_product_seller_id_id", "seller_id", "id"),
+        db.Index("ix_product_cost_id", "cost", "id"),
+        db.Index("ix_product_product_name_id", "product_name", "id"),
+        db.Index(
+            "ix_product_in_stock_id",
+            "id",
+            sqlite_where=db.text("amount_available > 0"),
+            postgresql_where=db.text("amount_available > 0"),
+        ),
+    )
+
 
 
     def __repr__(self):
         return f"Product('{self.product_name}', {self.cost})"
+
+
+class ProductImportJob(db.Model):
+    """
+    checkpoint of a catalog import, committed together with every chunk so
+    an interrupted import resumes right after the last committed chunk.
+    """
+    __tablename__ = "product_import_job"
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(255), nullable=False, unique=True, index=True)
+    seller_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    byte_offset = db.Column(db.BigInteger, nullable=False, default=0)
+    rows = db.Column(db.Integer, nullable=False, default=0)
+    imported = db.Column(db.Integer, nullable=False, default=0)
+    rejected = db.Column(db.Integer, nullable=False, default=0)
+    finished = db.Column(db.Boolean, nullable=False, default=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<ProductImportJob {self.name} rows={self.rows}>"
+
+
+class CoinInventory(db.Model):
+    """
+    coins a vending machine holds for change, one row per machine and coin
+    value (cents). a machine without rows does not track its coins.
+    """
+    __tablename__ = "coin_inventory"
+    machine_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    coin = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.CheckConstraint("count >= 0", name="ck_coin_inventory_count"),
+    )
+
+    def __repr__(self):
+        return f"<CoinInventory machine={self.machine_id} {self.coin} cent x{self.count}>"
@@ -1,15 +1,26 @@
-from app.main import db
-from flask import Blueprint, jsonify, request 
+from flask import Blueprint, abort, jsonify, request 
 from logs.logging_aspects import view_logging_aspect
 from utils.role_required_decorator import role_required
 from utils.exception_handler_decorator import CustomException
 from utils.exception_handler_decorator import handle_exceptions
 from flask_jwt_extended import jwt_required,current_user
-from schemas import ProductSchema
+from schemas import product_serializer
+from app.config import db
+from app.database import read_replica
+from app.table_version import TableVersion
+from product.coin_change import change_coins, to_cents
 from product.product_models import Product
+from product.purchase import checkout, purchase
+from product.product_bulk import bulk_create, bulk_delete, bulk_update
+from product.product_importer import content_key, format_from_filename, import_products
+from product.product_search import search_products
+from utils.pagination import keyset_paginate, page_size
+from utils.etag import listing_etag, not_modified, row_etag, with_etag
+from utils.streaming import ndjson_response, wants_ndjson
 from .product_constants import (
     PRODUCT_LOGGER,
-    PRODUCT_LOG_FILE_PATH
+    PRODUCT_LOG_FILE_PATH,
+    PRODUCT_SORT_COLUMNS,
 )
 
 
@@ -17,51 +28,178 @@ product_bp = Blueprint("product", __name__)
 
 
 @handle_exceptions
-@view_logging_aspect(PRODUCT_LOGGER, PRODUCT_LOG_FILE_PATH)
 @product_bp.get("")
 @jwt_required()
+@read_replica
+@view_logging_aspect(PRODUCT_LOGGER, PRODUCT_LOG_FILE_PATH)
 def list():
     """
-    list all products.
+    list products page by page.
+
+    query params:
+    limit: page size (default 20, max 100)
+    cursor: opaque "next" value of the previous page
+    seller_id: integer
+    min_cost, max_cost: float
+    in_stock: true to list only amount_available > 0
+    sort: id, cost or product_name, prefix with "-" for descending
+
+    send "Accept: application/x-ndjson" to stream every matching product
+    (one json object per line, ordered by id) instead of a page.
+
+    the response has an ETag built from the product table counter, sending
+    it back in If-None-Match gives 304 until a product changes.
 
     Returns:
-    list of products 
+    list of products and next cursor (null on the last page)
 
     """
-    products = Product.query.all()
-    result = ProductSchema().dump(products, many=True)
-    return (
+    sort = request.args.get("sort", default="id")
+    descending = sort.startswith("-")
+    sort_key = sort.lstrip("-")
+    if sort_key not in PRODUCT_SORT_COLUMNS:
+        return jsonify({"error": f"sort can only be one of {sorted(PRODUCT_SORT_COLUMNS)}"}), 400
+
+    etag = listing_etag("products", TableVersion.current(Product.__tablename__))
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
+    query = Product.query
+    seller_id = request.args.get("seller_id", type=int)
+    if seller_id is not None:
+        query = query.filter(Product.seller_id == seller_id)
+    min_cost = request.args.get("min_cost", type=float)
+    if min_cost is not None:
+        query = query.filter(Product.cost >= min_cost)
+    max_cost = request.args.get("max_cost", type=float)
+    if max_cost is not None:
+        query = query.filter(Product.cost <= max_cost)
+    if request.args.get("in_stock", "").lower() in ("1", "true", "yes"):
+        query = query.filter(Product.amount_available > 0)
+
+    if wants_ndjson():
+        return with_etag(etag, ndjson_response(query.order_by(Product.id).statement, product_serializer))
+
+    try:
+        products, next_cursor = keyset_paginate(
+            query,
+            getattr(Product, PRODUCT_SORT_COLUMNS[sort_key]),
+            Product.id,
+            sort,
+            cursor=request.args.get("cursor"),
+            limit=page_size(request.args.get("limit", type=int)),
+            descending=descending,
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    result = product_serializer.dump(products, many=True)
+    return with_etag(
+        etag,
         jsonify(
             {
                 "products": result,
+                "next": next_cursor,
             }
         ),
-        200,
     )
 
 @handle_exceptions
+@product_bp.get("/search")
+@jwt_required()
+@read_replica
 @view_logging_aspect(PRODUCT_LOGGER, PRODUCT_LOG_FILE_PATH)
+def search():
+    """
+    full text search over product_name and description.
+
+    query params:
+    q: words to search, every word must match, the last one may be partial
+    (3 letters or more)
+    limit: page size (default 20, max 100)
+    cursor: opaque "next" value of the previous page, up to 1000 results
+
+    results are ordered by relevance (bm25, name hits first). "highlight"
+    has the html escaped product_name and a description snippet with the
+    matched words in <mark></mark>.
+
+    Returns:
+    list of products and next cursor (null on the last page)
+
+    """
+    etag = listing_etag("search", TableVersion.current(Product.__tablename__))
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
+    try:
+        results, next_cursor = search_products(
+            request.args.get("q"),
+            page_size(request.args.get("limit", type=int)),
+            cursor=request.args.get("cursor"),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    products = []
+    for product, highlight in results:
+        item = product.to_dict()
+        item["highlight"] = highlight
+        products.append(item)
+    return with_etag(
+        etag,
+        jsonify(
+            {
+                "products": products,
+                "next": next_cursor,
+            }
+        ),
+    )
+
+@handle_exceptions
 @product_bp.get("/<int:product_id>")
 @jwt_required()
+@read_replica
+@view_logging_aspect(PRODUCT_LOGGER, PRODUCT_LOG_FILE_PATH)
 def get(product_id):
     """
     get product by id .
 
     param :product_id:
 
+    with If-None-Match only the row version is read to answer 304.
+
     Returns:
     "tokens":  product_id data in success
     message error in fail
 
     """
+    if request.if_none_match:
+        version = db.session.execute(
+            db.select(Product.version).where(Product.id == product_id)
+        ).scalar()
+        if version is None:
+            abort(404)
+        cached = not_modified(row_etag("product", product_id, version))
+        if cached is not None:
+            return cached
     product = Product.query.get_or_404(product_id)
-    return jsonify(product.to_dict())
+    return with_etag(row_etag("product", product.id, product.version), jsonify(product.to_dict()))
+
+
+def valid_cost(cost):
+    """
+    cost is a non negative whole number of cents (as int or float).
+    """
+    return isinstance(cost, (int, float)) and not isinstance(cost, bool) and cost >= 0 and to_cents(cost) is not None
+
 
 @handle_exceptions
-@view_logging_aspect(PRODUCT_LOGGER, PRODUCT_LOG_FILE_PATH)
 @product_bp.post("")
 @jwt_required()
 @role_required('seller')
+@view_logging_aspect(PRODUCT_LOGGER, PRODUCT_LOG_FILE_PATH)
 def create_product():
     """
     create product .
@@ -75,6 +213,8 @@ def create_product():
     data = request.get_json()
     if not data or  'product_name' not in data or 'cost' not in data :
         return jsonify({"message": "please required fields(product_name,cost,email)"}), 400
+    if not valid_cost(data['cost']):
+        return jsonify({"error": "cost must be a whole number of cents"}), 400
 
     new_product = Product(product_name=data.get('product_name'),
                           cost=data.get('cost'),
@@ -84,7 +224,7 @@ def create_product():
                           )
     db.session.add(new_product)
     db.session.commit()    
-    result = ProductSchema().dump(new_product)
+    result = new_product.to_dict()
     return (
         jsonify(
             {
@@ -97,10 +237,10 @@ def create_product():
 
 
 @handle_exceptions
-@view_logging_aspect(PRODUCT_LOGGER, PRODUCT_LOG_FILE_PATH)
 @product_bp.put("/<int:product_id>")
 @jwt_required()
 @role_required('seller')
+@view_logging_aspect(PRODUCT_LOGGER, PRODUCT_LOG_FILE_PATH)
 def update_product(product_id):
     """
     update product .
@@ -116,6 +256,8 @@ def update_product(product_id):
 
     if product.seller_id == current_user.id:
         data = request.get_json()
+        if 'cost' in data and not valid_cost(data['cost']):
+            return jsonify({"error": "cost must be a whole number of cents"}), 400
         product.product_name = data.get('product_name', product.product_name)
         product.amount_available = data.get('amount_available', product.amount_available)
         product.cost = data.get('cost', product.cost)
@@ -123,7 +265,7 @@ def update_product(product_id):
         product.seller_id = data.get('seller_id', product.seller_id)
 
         db.session.commit()
-        return jsonify(ProductSchema().dump(product))
+        return jsonify(product.to_dict())
     else:
         return jsonify({"error": "you don't have permission to access this product"}), 403
 
@@ -131,9 +273,10 @@ def update_product(product_id):
 
 
 @handle_exceptions
-@view_logging_aspect(PRODUCT_LOGGER, PRODUCT_LOG_FILE_PATH)
-@role_required('seller')
 @product_bp.delete("/<int:product_id>")
+@jwt_required()
+@role_required('seller')
+@view_logging_aspect(PRODUCT_LOGGER, PRODUCT_LOG_FILE_PATH)
 def delete_product(product_id):
     """
     delete product .
@@ -161,10 +304,132 @@ def delete_product(product_id):
 
 
 
+def bulk_response(results):
+    failed = sum(1 for result in results if result["status"] == "error")
+    return (
+        jsonify(
+            {
+                "results": results,
+                "succeeded": len(results) - failed,
+                "failed": failed,
+            }
+        ),
+        200,
+    )
+
+
+@product_bp.post("/bulk")
+@jwt_required()
+@role_required('seller')
+@view_logging_aspect(PRODUCT_LOGGER, PRODUCT_LOG_FILE_PATH)
+def bulk_create_products():
+    """
+    create many products at once .
+
+    role_required :only seller role:
+
+    body
+    items: list of {product_name, cost, amount_available, description}
+
+    Returns:
+    per item result (created with id, or error) in the order of items
+
+    """
+    data = request.get_json() or {}
+    try:
+        return bulk_response(bulk_create(current_user.id, data.get('items')))
+    except CustomException as e:
+        return jsonify({"error": e.message}), e.status_code
+
+
+@product_bp.patch("/bulk")
+@jwt_required()
+@role_required('seller')
+@view_logging_aspect(PRODUCT_LOGGER, PRODUCT_LOG_FILE_PATH)
+def bulk_update_products():
+    """
+    update many products at once .
+
+    role_required :only seller role:
+
+    body
+    items: list of {id, product_name, cost, amount_available, description}
+
+    Returns:
+    per item result (updated, or error) in the order of items
+
+    """
+    data = request.get_json() or {}
+    try:
+        return bulk_response(bulk_update(current_user.id, data.get('items')))
+    except CustomException as e:
+        return jsonify({"error": e.message}), e.status_code
+
+
+@product_bp.delete("/bulk")
+@jwt_required()
+@role_required('seller')
+@view_logging_aspect(PRODUCT_LOGGER, PRODUCT_LOG_FILE_PATH)
+def bulk_delete_products():
+    """
+    delete many products at once .
+
+    role_required :only seller role:
+
+    body
+    ids: list of product ids
+
+    Returns:
+    per item result (deleted, or error) in the order of ids
+
+    """
+    data = request.get_json() or {}
+    try:
+        return bulk_response(bulk_delete(current_user.id, data.get('ids')))
+    except CustomException as e:
+        return jsonify({"error": e.message}), e.status_code
+
+
+
+@product_bp.post("/import")
+@jwt_required()
+@role_required('seller')
 @view_logging_aspect(PRODUCT_LOGGER, PRODUCT_LOG_FILE_PATH)
+def import_catalog():
+    """
+    import a csv or ndjson catalog file .
+
+    role_required :only seller role:
+
+    multipart form
+    file: csv (header row) or ndjson file, rows with an id update that product
+    format: csv or ndjson (default: from the file name)
+    chunk_size: rows per transaction
+    job: checkpoint name, uploading again with the same job resumes an interrupted import.
+    default: the seller and a digest of the file, so only the same file resumes
+
+    Returns:
+    import summary (rows, imported, rejected, rows_per_second)
+
+    """
+    upload = request.files.get('file')
+    if upload is None:
+        return jsonify({"error": "please upload the catalog as file"}), 400
+    fmt = request.form.get('format') or format_from_filename(upload.filename)
+    name = request.form.get('job') or f"{current_user.username}:{content_key(upload.stream)}"
+    try:
+        summary = import_products(upload.stream, fmt, current_user.id, name,
+                                  chunk_size=request.form.get('chunk_size', type=int))
+    except CustomException as e:
+        return jsonify({"error": e.message}), e.status_code
+    return jsonify(summary), 200
+
+
+
 @product_bp.post("/buy/product")
 @jwt_required()
 @role_required('buyer')
+@view_logging_aspect(PRODUCT_LOGGER, PRODUCT_LOG_FILE_PATH)
 def buy_product():
     """
     make user with role buyer buy product by any amount with the money they’ve deposited. 
@@ -175,55 +440,60 @@ def buy_product():
     product_id: integer
     amount :integer
 
+    the stock, the buyer's deposit and the machine's coins are updated
+    together in one transaction, see product.purchase.purchase. the rest of
+    the deposit is paid back as change and the deposit set to 0
+
     Returns:
     products_purchased,total_spent data,change in success
      
 
     """
-    data = request.get_json()
-    product = Product.query.get_or_404(data.get('product_id'))
-    amount= data.get('amount')
-    buyer_deposit=  data.get('deposit')
-    if product.amount_available < amount:
-        return jsonify({"error": "not enough amount of product you want"}), 400
-    
-    total_cost = product.cost * amount
-    if buyer_deposit < total_cost:
-        return jsonify({"error": "you deposit not enough ,please add more money"}), 400
+    data = request.get_json() or {}
+    try:
+        receipt = purchase(current_user.id, data.get('product_id'), data.get('amount'))
+    except CustomException as e:
+        return jsonify({"error": e.message}), e.status_code
 
-    change = buyer_deposit - total_cost
-    change_coins = calculate_change(change)
-   
     return jsonify(
         {
-            'products_purchased': {'id': product.id, 'name': product.product_name, 'amount': amount},
-            "total_spent":total_cost,
-            "change": change_coins
+            'products_purchased': {'id': receipt['id'], 'name': receipt['name'], 'amount': receipt['amount']},
+            "total_spent": receipt['total_cost'],
+            "change": change_coins(receipt['change'])
          
-         }), 400
+         }), 200
 
     
     
-def calculate_change(amount):
+@product_bp.post("/checkout")
+@jwt_required()
+@role_required('buyer')
+@view_logging_aspect(PRODUCT_LOGGER, PRODUCT_LOG_FILE_PATH)
+def checkout_cart():
     """
-    return only coin in [5, 10, 20, 50, 100]
-    
-    param :amount
+    make user with role buyer buy several products at once with the money they’ve deposited.
 
-    product_id: integer
-    amount :integer
+    role_required :only buyer role:
+
+    body
+    items: list of {product_id: integer, amount: integer}
+
+    all products are loaded with one query and every decrement is applied in
+    one transaction, nothing is bought if one item fails.
 
     Returns:
-    change
+    products_purchased,total_spent data,change in success
 
     """
-    
-    coins = [ 0.5, 0.2, 0.1, 0.05]
-    change = {}
-    remaining = round(amount, 2)
-    for coin in coins:
-        count = int(remaining // coin)
-        if count > 0:
-            change[f'{int(coin*100)} cent'] = count
-            remaining -= count * coin
-    return change     
\ No newline at end of file
+    data = request.get_json() or {}
+    try:
+        receipt = checkout(current_user.id, data.get('items'))
+    except CustomException as e:
+        return jsonify({"error": e.message}), e.status_code
+
+    return jsonify(
+        {
+            'products_purchased': receipt['products'],
+            "total_spent": receipt['total_cost'],
+            "change": change_coins(receipt['change'])
+        }), 200
@@ -0,0 +1,195 @@
+import html
+import re
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import event
+
+from app.config import db
+from product.product_models import Product
+from utils.pagination import decode_cursor, encode_cursor
+
+
+SEARCH_TABLE = "product_fts"
+# bm25 weights of product_name and description, a name hit ranks higher
+SEARCH_RANK = "bm25(10.0, 1.0)"
+SNIPPET_TOKENS = 16
+# every match is ranked, a shorter prefix matches a large part of the
+# catalog (about 60k of 300k seeded products for "co", ~100 ms). shorter
+# words only match whole
+MIN_PREFIX_LENGTH = 3
+# the deepest result the cursor pages to, each page ranks all matches again
+# and skips the offset
+MAX_SEARCH_OFFSET = 1000
+HIGHLIGHT_OPEN = "<mark>"
+HIGHLIGHT_CLOSE = "</mark>"
+
+# highlight()/snippet() wrap matches in these, the text is escaped before
+# they become HIGHLIGHT_OPEN/HIGHLIGHT_CLOSE
+_OPEN = "\x02"
+_CLOSE = "\x03"
+_TOKEN = re.compile(r"\w+")
+
+# external content index over product, the triggers keep it in sync with
+# every write, ORM or Core. stock and price updates do not touch it.
+SEARCH_DDL = (
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        product_name, description,
+        content='product', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )
+    """,
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rank) VALUES ('rank', '{SEARCH_RANK}')",
+    f"""
+    CREATE TRIGGER IF NOT EXISTS product_fts_insert AFTER INSERT ON product BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, product_name, description)
+        VALUES (new.id, new.product_name, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS product_fts_delete AFTER DELETE ON product BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, product_name, description)
+        VALUES ('delete', old.id, old.product_name, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS product_fts_update AFTER UPDATE OF product_name, description ON product BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, product_name, description)
+        VALUES ('delete', old.id, old.product_name, old.description);
+        INSERT INTO {SEARCH_TABLE}(rowid, product_name, description)
+        VALUES (new.id, new.product_name, new.description);
+    END
+    """,
+)
+
+
+def create_search_index(connection):
+    """
+    create the fts5 table and its triggers, then index the existing rows.
+    """
+    for statement in SEARCH_DDL:
+        connection.exec_driver_sql(statement)
+    rebuild_search_index(connection)
+
+
+def drop_search_index(connection):
+    for trigger in ("product_fts_insert", "product_fts_delete", "product_fts_update"):
+        connection.exec_driver_sql(f"DROP TRIGGER IF EXISTS {trigger}")
+    connection.exec_driver_sql(f"DROP TABLE IF EXISTS {SEARCH_TABLE}")
+
+
+def rebuild_search_index(connection=None):
+    """
+    reindex every product (after loading rows with the triggers missing or
+    a restore) and merge the index into one b-tree for the fastest reads.
+    """
+    connection = connection or db.session.connection()
+    connection.exec_driver_sql(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')")
+    connection.exec_driver_sql(f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('optimize')")
+
+
+@event.listens_for(Product.__table__, "after_create")
+def _after_create(table, connection, **kw):
+    # db.create_all() (tests, create_db.py), migrations create it themselves
+    if connection.dialect.name == "sqlite":
+        create_search_index(connection)
+
+
+@event.listens_for(Product.__table__, "before_drop")
+def _before_drop(table, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        drop_search_index(connection)
+
+
+def match_expression(q):
+    """
+    fts5 query of free text: every word must match, the last one (of at
+    least MIN_PREFIX_LENGTH characters) as a prefix so partially typed words
+    find results. fts5 syntax in the input is not interpreted.
+
+    Returns:
+    match string, None if q has no words
+
+    """
+    words = _TOKEN.findall(q or "")
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    if len(words[-1]) >= MIN_PREFIX_LENGTH:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _highlighted(text):
+    if text is None:
+        return None
+    return html.escape(text).replace(_OPEN, HIGHLIGHT_OPEN).replace(_CLOSE, HIGHLIGHT_CLOSE)
+
+
+def search_products(q, limit, cursor=None):
+    """
+    products matching q, best bm25 rank first.
+
+    the rank order has no stable key to seek from, the cursor holds the
+    offset of the next page (and the query, a cursor of another search is
+    rejected). paging stops at MAX_SEARCH_OFFSET results.
+
+    every match is ranked before the page is cut, the time grows with the
+    number of matching products (about 40 ms for 20k matches), not with
+    the size of the catalog: a query is only fast when its words are
+    selective.
+
+    Returns:
+    ([(product, highlight dict)], next_cursor), raise ValueError on an
+    empty query or a bad cursor
+
+    """
+    match = match_expression(q)
+    if match is None:
+        raise ValueError("q must contain at least one word")
+    offset = 0
+    if cursor:
+        payload = decode_cursor(cursor)
+        if payload.get("q") != match or not isinstance(payload.get("o"), int):
+            raise ValueError("cursor does not match query")
+        if not 0 <= payload["o"] < MAX_SEARCH_OFFSET:
+            raise ValueError("cursor is past the last page")
+        offset = payload["o"]
+
+    fts = db.table(SEARCH_TABLE, db.column("rowid"), db.column("rank"))
+    fts_name = db.literal_column(SEARCH_TABLE)
+    statement = (
+        db.select(
+            Product,
+            db.func.highlight(fts_name, 0, _OPEN, _CLOSE),
+            db.func.snippet(fts_name, 1, _OPEN, _CLOSE, "…", SNIPPET_TOKENS),
+        )
+        .select_from(fts)
+        .join(Product, Product.id == fts.c.rowid)
+        .where(fts_name.op("MATCH")(match))
+        .order_by(fts.c.rank)
+        .limit(limit + 1)
+        .offset(offset)
+    )
+    rows = db.session.execute(statement).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        if offset + limit < MAX_SEARCH_OFFSET:
+            next_cursor = encode_cursor({"q": match, "o": offset + limit})
+    results = [
+        (product, {"product_name": _highlighted(name), "description": _highlighted(description)})
+        for product, name, description in rows
+    ]
+    return results, next_cursor
+
+
+@click.command("rebuild-search-index")
+@with_appcontext
+def rebuild_search_index_command():
+    """Rebuild the product full text search index from the product table."""
+    create_search_index(db.session.connection())
+    db.session.commit()
+    click.echo("product search index rebuilt")
@@ -0,0 +1,319 @@
+from sqlalchemy import bindparam
+from sqlalchemy.exc import OperationalError
+
+from app.config import db
+from app.table_version import TableVersion, new_version
+from product.coin_change import (
+    MAX_SOLVER_AMOUNT,
+    ChangeTooLarge,
+    dispense,
+    load_inventory,
+    make_change,
+    to_cents,
+)
+from product.product_models import Product
+from user.user_models import User
+from utils.custom_exception_class import CustomException
+
+
+PURCHASE_RETRIES = 3
+MAX_CART_ITEMS = 100
+
+
+def _is_busy(error):
+    """
+    True for the sqlite "database is locked" errors a retry can fix: the
+    write lock was not free within busy_timeout, or the WAL snapshot the
+    transaction read went stale before its first write (SQLITE_BUSY_SNAPSHOT,
+    busy_timeout does not wait for that one).
+    """
+    message = str(error.orig).lower()
+    return "database is locked" in message or "database table is locked" in message
+
+
+def _positive_int(value):
+    return isinstance(value, int) and not isinstance(value, bool) and value > 0
+
+
+def parse_cart_items(items):
+    """
+    validate [{product_id, amount}, ...] and merge repeated products.
+
+    Returns:
+    dict product_id -> amount
+    raise CustomException(400) on invalid items
+
+    """
+    if not isinstance(items, (list, tuple)) or not items:
+        raise CustomException(400, "items must be a non empty list of {product_id, amount}")
+    if len(items) > MAX_CART_ITEMS:
+        raise CustomException(400, f"a cart can have at most {MAX_CART_ITEMS} items")
+
+    amounts = {}
+    for item in items:
+        if not isinstance(item, dict) or not _positive_int(item.get("product_id")):
+            raise CustomException(400, "product_id must be a positive integer")
+        if not _positive_int(item.get("amount")):
+            raise CustomException(400, "amount must be a positive integer")
+        amounts[item["product_id"]] = amounts.get(item["product_id"], 0) + item["amount"]
+    return amounts
+
+
+def _decrement_stock(products, amounts):
+    """
+    conditional stock decrement for every product in one executemany.
+
+    Returns:
+    True if every row matched (enough stock and unchanged cost)
+
+    """
+    statement = (
+        db.update(Product)
+        .where(
+            Product.id == bindparam("p_id"),
+            Product.amount_available >= bindparam("p_amount"),
+            Product.cost == bindparam("p_cost"),
+        )
+        .values(
+            amount_available=Product.amount_available - bindparam("p_amount"),
+            version=new_version(),
+        )
+    )
+    # same order in every transaction, so concurrent carts can not deadlock
+    params = [
+        {"p_id": product.id, "p_amount": amounts[product.id], "p_cost": product.cost}
+        for product in sorted(products, key=lambda product: product.id)
+    ]
+    connection = db.session.connection()
+    TableVersion.bump(Product.__tablename__)
+    if connection.dialect.supports_sane_multi_rowcount:
+        return connection.execute(statement, params).rowcount == len(params)
+    return all(connection.execute(statement, param).rowcount == 1 for param in params)
+
+
+def _stock_error(products, amounts):
+    """
+    after a failed decrement tell if a price changed (retry) or raise the
+    stock error for the first product that is short.
+    """
+    current = {
+        row.id: row
+        for row in db.session.execute(
+            db.select(Product.id, Product.cost, Product.amount_available).where(Product.id.in_(amounts))
+        )
+    }
+    for product in products:
+        row = current.get(product.id)
+        if row is not None and row.cost != product.cost:
+            return
+    for product in products:
+        row = current.get(product.id)
+        if row is None:
+            raise CustomException(404, f"product {product.id} not found")
+        if (row.amount_available or 0) < amounts[product.id]:
+            raise CustomException(400, f"not enough amount of product {product.id}")
+    raise CustomException(409, "stock changed, please try again")
+
+
+def _solve_change(amount, inventory, no_change_message):
+    """
+    coins for amount cents from inventory.
+
+    raise CustomException(409) when there is no exact change or it is too
+    large to solve
+
+    """
+    try:
+        change = make_change(amount, inventory)
+    except ChangeTooLarge:
+        raise CustomException(409, f"the machine pays out at most {MAX_SOLVER_AMOUNT} cents of change")
+    if change is None:
+        raise CustomException(409, no_change_message)
+    return change
+
+
+def _pay_out(buyer_id, deposit, change, inventory):
+    """
+    set the deposit read as deposit to 0 and take change out of the machine
+    in the current transaction.
+
+    Returns:
+    False when the deposit or the coins changed since they were read
+
+    """
+    TableVersion.bump(User.__tablename__)
+    paid = db.session.execute(
+        db.update(User)
+        .where(User.id == buyer_id, User.deposit == deposit)
+        .values(deposit=0, version=new_version())
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    return bool(paid) and (inventory is None or dispense(change))
+
+
+def checkout(buyer_id, items, retries=PURCHASE_RETRIES):
+    """
+    buy every item of a cart with the buyer's deposit in one short transaction
+    and pay the rest of the deposit back in coins.
+
+    the products, the deposit and the machine's coins are read without a
+    lock, the change is solved with make_change() before anything is written
+    (a cart the machine can not give exact change for is rejected), then
+    everything is written with conditional updates, so two buyers can never
+    oversell, spend the same deposit twice or get the same coins
+
+    UPDATE product SET amount_available = amount_available - n
+    WHERE id = :id AND amount_available >= n AND cost = :cost_read
+    UPDATE users SET deposit = 0
+    WHERE id = :buyer AND deposit = :deposit_read
+    UPDATE coin_inventory SET count = count - n
+    WHERE machine_id = :machine AND coin = :coin AND count >= n
+
+    the values read are the optimistic versions, if a seller changed a price,
+    the deposit changed or another purchase took the coins in between an
+    update matches nothing and the checkout is retried. a write that finds
+    the sqlite database locked by another writer is retried the same way.
+
+    param :items: [{product_id, amount}, ...]
+
+    Returns:
+    dict with products (id, name, amount, cost), total_cost, the change
+    {coin: count} and the buyer's balance (0)
+    raise CustomException when a product is missing, out of stock, the
+    deposit is not enough or there is no exact change (or too much of it)
+
+    """
+    amounts = parse_cart_items(items)
+
+    for _ in range(retries):
+        products = db.session.execute(
+            db.select(Product.id, Product.product_name, Product.cost)
+            .where(Product.id.in_(amounts))
+            .order_by(Product.id)
+        ).all()
+        missing = set(amounts) - {product.id for product in products}
+        if missing:
+            raise CustomException(404, f"product {min(missing)} not found")
+        total_cost = sum(product.cost * amounts[product.id] for product in products)
+
+        deposit = db.session.execute(db.select(User.deposit).where(User.id == buyer_id)).scalar()
+        if deposit is None or deposit < total_cost:
+            db.session.rollback()
+            raise CustomException(400, "you deposit not enough ,please add more money")
+        due = to_cents(deposit - total_cost)
+        if due is None:
+            db.session.rollback()
+            raise CustomException(409, "a product's cost is not a whole number of cents")
+        inventory = load_inventory()
+        try:
+            change = _solve_change(due, inventory, "the machine can not give exact change, please insert other coins")
+        except CustomException:
+            db.session.rollback()
+            raise
+
+        try:
+            if not _decrement_stock(products, amounts):
+                db.session.rollback()
+                _stock_error(products, amounts)
+                continue
+
+            if not _pay_out(buyer_id, deposit, change, inventory):
+                db.session.rollback()
+                continue
+            db.session.commit()
+        except OperationalError as error:
+            db.session.rollback()
+            if not _is_busy(error):
+                raise
+            continue
+        except Exception:
+            db.session.rollback()
+            raise
+
+        return {
+            "products": [
+                {
+                    "id": product.id,
+                    "name": product.product_name,
+                    "amount": amounts[product.id],
+                    "cost": product.cost * amounts[product.id],
+                }
+                for product in products
+            ],
+            "total_cost": total_cost,
+            "change": change,
+            "balance": 0,
+        }
+
+    raise CustomException(409, "the purchase conflicted with another one, please try again")
+
+
+def purchase(buyer_id, product_id, amount, retries=PURCHASE_RETRIES):
+    """
+    buy amount of one product, a checkout with a single item.
+
+    Returns:
+    dict with product id, name, amount, total_cost, change and the buyer's balance
+
+    """
+    if not _positive_int(amount):
+        raise CustomException(400, "amount must be a positive integer")
+    if not _positive_int(product_id):
+        raise CustomException(404, "product not found")
+
+    receipt = checkout(buyer_id, [{"product_id": product_id, "amount": amount}], retries=retries)
+    product = receipt["products"][0]
+    return {
+        "id": product["id"],
+        "name": product["name"],
+        "amount": product["amount"],
+        "total_cost": receipt["total_cost"],
+        "change": receipt["change"],
+        "balance": receipt["balance"],
+    }
+
+
+def refund(buyer_id, retries=PURCHASE_RETRIES):
+    """
+    pay the buyer's whole deposit back in coins and set it to 0, checked and
+    written like the change of a checkout().
+
+    Returns:
+    dict with the change {coin: count} and the buyer's balance (0)
+    raise CustomException when the buyer is missing or the machine can not
+    give exact change
+
+    """
+    for _ in range(retries):
+        deposit = db.session.execute(db.select(User.deposit).where(User.id == buyer_id)).scalar()
+        if deposit is None:
+            db.session.rollback()
+            raise CustomException(404, "user not found")
+        due = to_cents(deposit)
+        if due is None:
+            db.session.rollback()
+            raise CustomException(409, "the deposit is not a whole number of cents")
+        inventory = load_inventory()
+        try:
+            change = _solve_change(due, inventory, "the machine can not give exact change, please buy something")
+        except CustomException:
+            db.session.rollback()
+            raise
+
+        try:
+            if not _pay_out(buyer_id, deposit, change, inventory):
+                db.session.rollback()
+                continue
+            db.session.commit()
+        except OperationalError as error:
+            db.session.rollback()
+            if not _is_busy(error):
+                raise
+            continue
+        except Exception:
+            db.session.rollback()
+            raise
+
+        return {"change": change, "balance": 0}
+
+    raise CustomException(409, "the refund conflicted with another request, please try again")
@@ -1,7 +1,11 @@
 # run.py
 from app.main import create_app
+from app.schema_check import check_schema
+from app.server import warm_up
 
 app = create_app()
 
 if __name__ == '__main__':
+    check_schema(app)
+    warm_up(app)
     app.run(debug=True)
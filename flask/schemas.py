@@ -1,4 +1,8 @@
-from marshmallow import fields, Schema
+from marshmallow import fields, Schema, ValidationError, validate
+from product.coin_change import to_cents
+from product.product_models import Product
+from user.user_models import Role, User
+from utils.serialization import register_serializer
 
 
 class UserSchema(Schema):
@@ -6,7 +10,7 @@ class UserSchema(Schema):
     username = fields.String()
     email = fields.String()
     deposit = fields.Integer()
-    role = fields.Integer()
+    role = fields.Enum(Role)
 
 
 
@@ -18,3 +22,29 @@ class ProductSchema(Schema):
     cost  = fields.Integer()
     description = fields.String()
     seller_id = fields.Integer()
+
+
+# compiled dumps used by the views and by Model.to_dict()
+user_serializer = register_serializer(User, UserSchema())
+product_serializer = register_serializer(Product, ProductSchema())
+
+
+def whole_cents(value):
+    # costs are cents, a fraction could never be paid in coins
+    if to_cents(value) is None:
+        raise ValidationError("must be a whole number of cents")
+
+
+class ProductCreateSchema(Schema):
+    product_name = fields.String(required=True, validate=validate.Length(min=1, max=100))
+    cost = fields.Float(required=True, validate=[validate.Range(min=0), whole_cents])
+    amount_available = fields.Float(load_default=None, allow_none=True, validate=validate.Range(min=0))
+    description = fields.String(load_default="", allow_none=True)
+
+
+class ProductUpdateSchema(Schema):
+    id = fields.Integer(required=True, strict=True)
+    product_name = fields.String(validate=validate.Length(min=1, max=100))
+    cost = fields.Float(validate=[validate.Range(min=0), whole_cents])
+    amount_available = fields.Float(allow_none=True, validate=validate.Range(min=0))
+    description = fields.String(allow_none=True)
@@ -0,0 +1,5 @@
+import os
+import tempfile
+
+# the routes log to LOG_DIR, keep the tests out of the tracked logs/ files
+os.environ["LOG_DIR"] = tempfile.mkdtemp()
@@ -0,0 +1,122 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from app.api_docs import MAX_CACHED_SPECS
+from app.main import create_app
+
+
+FLASK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ApiDocsTestCase(unittest.TestCase):
+    def make_app(self, **config):
+        return create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'SQLALCHEMY_ECHO': False,
+            **config,
+        })
+
+    def make_documented_app(self, **config):
+        app = self.make_app(**config)
+
+        def ping():
+            """
+            ping
+            ---
+            responses:
+              200:
+                description: pong
+            """
+            return 'pong'
+
+        app.add_url_rule('/ping', view_func=ping)
+        return app
+
+    def test_spec_is_built_once_and_tagged(self):
+        app = self.make_app(COMPRESS_MIN_SIZE=100)
+        client = app.test_client()
+        response = client.get('/apispec_1.json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['info']['title'], 'Swagger-UI')
+        self.assertIs(app.extensions['api_docs'].spec()[0], app.extensions['api_docs'].spec()[0])
+
+        cached = client.get('/apispec_1.json', headers={'If-None-Match': response.headers['ETag']})
+        self.assertEqual(cached.status_code, 304)
+        gzipped = client.get('/apispec_1.json', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(gzipped.headers['Content-Encoding'], 'gzip')
+        cached = client.get('/apispec_1.json', headers={'Accept-Encoding': 'gzip',
+                                                        'If-None-Match': gzipped.headers['ETag']})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(client.get('/swagger/').status_code, 200)
+
+    def test_prefix_is_not_taken_from_the_client(self):
+        app = self.make_documented_app()
+        client = app.test_client()
+        for i in range(10):
+            response = client.get('/apispec_1.json', headers={'X-Script-Name': f'/attacker{i}'})
+            self.assertEqual(list(response.json['paths']), ['/ping'])
+        self.assertEqual(list(app.extensions['api_docs']._specs), [''])
+
+        # the server's SCRIPT_NAME (ProxyFix x_prefix) is trusted
+        response = client.get('/apispec_1.json', base_url='http://localhost/api')
+        self.assertEqual(list(response.json['paths']), ['/api/ping'])
+
+        configured = self.make_documented_app(SWAGGER_URL_PREFIX='/shop').test_client()
+        response = configured.get('/apispec_1.json', base_url='http://localhost/api')
+        self.assertEqual(list(response.json['paths']), ['/shop/ping'])
+
+    def test_cache_is_bounded_and_built_under_a_lock(self):
+        app = self.make_documented_app()
+        docs = app.extensions['api_docs']
+        prefixes = [f'/p{i}' for i in range(8)]
+
+        def build(prefix):
+            with app.app_context():
+                return prefix, json.loads(docs.spec(prefix)[0])
+
+        with ThreadPoolExecutor(8) as pool:
+            for prefix, spec in pool.map(build, prefixes):
+                self.assertEqual(list(spec['paths']), [f'{prefix}/ping'])
+        self.assertEqual(len(docs._specs), MAX_CACHED_SPECS)
+
+    def test_disabled(self):
+        app = self.make_app(SWAGGER_ENABLED=False)
+        client = app.test_client()
+        self.assertEqual(client.get('/apispec_1.json').status_code, 404)
+        self.assertEqual(client.get('/swagger/').status_code, 404)
+        self.assertNotIn('api_docs', app.extensions)
+
+    def test_exported_spec_file_is_served(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'openapi.json')
+            result = self.make_app().test_cli_runner().invoke(args=['export-openapi', path])
+            self.assertEqual(result.exit_code, 0, result.output)
+            with open(path) as f:
+                exported = json.load(f)
+
+            exported['info']['title'] = 'from file'
+            with open(path, 'w') as f:
+                json.dump(exported, f)
+            response = self.make_app(SWAGGER_SPEC_FILE=path).test_client().get('/apispec_1.json')
+            self.assertEqual(response.json['info']['title'], 'from file')
+
+    def test_import_graph(self):
+        # the blueprints import on their own and flasgger is only loaded by
+        # create_app()
+        code = (
+            'import sys\n'
+            'import product.product_routes, user.user_routes\n'
+            'import app.main\n'
+            'assert "flasgger" not in sys.modules\n'
+        )
+        result = subprocess.run([sys.executable, '-c', code], cwd=FLASK_DIR, capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+from benchmarks.endpoint_benchmark import SCENARIOS, compare, run
+from benchmarks import startup_benchmark
+
+
+
+class EndpointBenchmarkTestCase(unittest.TestCase):
+    def test_every_route_runs(self):
+        results = run(users=10, products=50, iterations=3, config={'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000'})
+        self.assertEqual(set(results), set(SCENARIOS))
+        for name, result in results.items():
+            self.assertEqual(result['iterations'], 3)
+            self.assertGreater(result['ops_per_second'], 0)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+        self.assertEqual({name for name, result in results.items() if result['errors']}, set())
+
+    def test_compare_flags_slower_routes(self):
+        baseline = {'a': {'p50_ms': 10.0}, 'b': {'p50_ms': 10.0}}
+        results = {'a': {'p50_ms': 12.0}, 'b': {'p50_ms': 13.0}, 'new': {'p50_ms': 99.0}}
+        self.assertEqual(compare(results, baseline, tolerance=0.25), [('b', 10.0, 13.0)])
+
+    def test_startup_benchmark(self):
+        result = startup_benchmark.run(runs=1, creates=1, swagger=False)
+        self.assertGreater(result['import_ms'], 0)
+        self.assertGreater(result['create_app_ms'], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
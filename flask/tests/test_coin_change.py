@@ -0,0 +1,71 @@
+import itertools
+import random
+import time
+import unittest
+from product.coin_change import COINS, MAX_SOLVER_AMOUNT, ChangeTooLarge, make_change, to_cents
+
+
+def fewest_coins(amount, inventory):
+    coins = sorted(inventory)
+    counts = [
+        sum(combo)
+        for combo in itertools.product(*[range(min(inventory[coin], amount // coin) + 1) for coin in coins])
+        if sum(coin * count for coin, count in zip(coins, combo)) == amount
+    ]
+    return min(counts) if counts else None
+
+
+class MakeChangeTestCase(unittest.TestCase):
+    def test_unlimited_coins(self):
+        self.assertEqual(make_change(0), {})
+        self.assertEqual(make_change(95), {50: 1, 20: 2, 5: 1})
+        self.assertEqual(make_change(285), {100: 2, 50: 1, 20: 1, 10: 1, 5: 1})
+        self.assertIsNone(make_change(3))
+        self.assertIsNone(make_change(-5))
+
+    def test_limited_coins(self):
+        # greedy takes the 50 and is left with 10 it can not pay
+        self.assertEqual(make_change(60, {50: 1, 20: 3}), {20: 3})
+        self.assertEqual(make_change(30, {20: 1, 10: 0, 5: 2}), {20: 1, 5: 2})
+        self.assertIsNone(make_change(30, {50: 2, 20: 1}))
+        self.assertIsNone(make_change(100, {5: 19}))
+
+    def test_large_change_is_refused(self):
+        amount = MAX_SOLVER_AMOUNT + 10
+        # the machine holds the coins of the unlimited answer
+        self.assertEqual(make_change(amount, {100: amount // 100, 10: 1}), {100: amount // 100, 10: 1})
+        # a greedy answer would give up here although 20s and 50s pay it
+        with self.assertRaises(ChangeTooLarge):
+            make_change(amount, {50: amount, 20: amount})
+
+    def test_fewest_coins(self):
+        rng = random.Random(7)
+        for _ in range(300):
+            inventory = {coin: rng.randint(0, 5) for coin in COINS}
+            amount = rng.randrange(0, 300, 5)
+            with self.subTest(amount=amount, inventory=inventory):
+                change = make_change(amount, inventory)
+                best = fewest_coins(amount, inventory)
+                if best is None:
+                    self.assertIsNone(change)
+                    continue
+                self.assertEqual(sum(coin * count for coin, count in change.items()), amount)
+                self.assertEqual(sum(change.values()), best)
+                self.assertTrue(all(count <= inventory[coin] for coin, count in change.items()))
+
+    def test_sub_millisecond(self):
+        # the change of a 5 euro deposit from a machine short of large coins
+        inventory = {100: 0, 50: 1, 20: 40, 10: 3, 5: 30}
+        started = time.perf_counter()
+        for _ in range(20):
+            make_change(495, inventory)
+        self.assertLess((time.perf_counter() - started) / 20, 0.001)
+
+    def test_to_cents(self):
+        self.assertEqual(to_cents(35.0), 35)
+        self.assertIsNone(to_cents(35.5))
+        self.assertIsNone(to_cents(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
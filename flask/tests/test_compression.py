@@ -0,0 +1,141 @@
+import gzip
+import unittest
+import zlib
+from app.main import create_app, db
+from app.compression import Compression, available_encodings
+from user.user_models import User
+from product.product_models import Product
+from flask import Response, request
+from flask_jwt_extended import create_access_token
+
+
+
+class CompressionTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'SQLALCHEMY_ECHO': False,
+            'COMPRESS_MIN_SIZE': 500,
+        })
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            seller = User(username='seller', email='seller@example.com', role='seller')
+            db.session.add(seller)
+            db.session.flush()
+            db.session.add_all(
+                Product(product_name=f'item {i}', cost=5, amount_available=10, seller_id=seller.id,
+                        description='a fine product ' * 10)
+                for i in range(50)
+            )
+            db.session.commit()
+            self.headers = {'Authorization': f"Bearer {create_access_token(identity='seller')}"}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def get(self, url, **headers):
+        return self.client.get(url, headers={**self.headers, **headers})
+
+    def test_gzip_listing(self):
+        plain = self.get('/products?limit=50')
+        response = self.get('/products?limit=50', **{'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(gzip.decompress(response.data), plain.data)
+        self.assertEqual(int(response.headers['Content-Length']), len(response.data))
+        self.assertLess(len(response.data), len(plain.data) / 4)
+
+    def test_identity_without_accept_encoding(self):
+        for value in [None, 'identity', 'gzip;q=0', 'compress']:
+            with self.subTest(value=value):
+                headers = {} if value is None else {'Accept-Encoding': value}
+                response = self.get('/products?limit=50', **headers)
+                self.assertNotIn('Content-Encoding', response.headers)
+                self.assertEqual(len(response.json['products']), 50)
+
+    def test_small_response_is_not_compressed(self):
+        response = self.get('/products/1', **{'Accept-Encoding': 'gzip'})
+        self.assertLess(len(response.data), 500)
+        self.assertNotIn('Content-Encoding', response.headers)
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+
+    def test_streamed_response(self):
+        plain = self.get('/products', Accept='application/x-ndjson')
+        with self.get('/products', Accept='application/x-ndjson', **{'Accept-Encoding': 'gzip'}) as response:
+            self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+            self.assertNotIn('Content-Length', response.headers)
+            chunks = list(response.response)
+        # every chunk is flushed, so each one decodes as soon as it arrives
+        decoder = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        lines = decoder.decompress(chunks[0])
+        self.assertTrue(lines.endswith(b'\n'))
+        body = lines + b''.join(decoder.decompress(chunk) for chunk in chunks[1:])
+        self.assertEqual(body, plain.data)
+
+    def test_each_encoding_has_its_own_strong_etag(self):
+        plain = self.get('/products?limit=50').headers['ETag']
+        response = self.get('/products?limit=50', **{'Accept-Encoding': 'gzip'})
+        etag = response.headers['ETag']
+        self.assertFalse(etag.startswith('W/'))
+        self.assertEqual(etag, plain[:-1] + '-gzip"')
+        cached = self.get('/products?limit=50', **{'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.headers['ETag'], etag)
+        self.assertIn('Accept-Encoding', cached.headers['Vary'])
+        # a client that only takes identity does not get the gzip bytes' tag
+        cached = self.get('/products?limit=50', **{'If-None-Match': etag})
+        self.assertEqual(cached.status_code, 200)
+        self.assertEqual(cached.headers['ETag'], plain)
+
+    def test_identity_etag_matches_when_compressing(self):
+        # the body of /products/1 is below COMPRESS_MIN_SIZE, sent as identity
+        etag = self.get('/products/1', **{'Accept-Encoding': 'gzip'}).headers['ETag']
+        cached = self.get('/products/1', **{'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(cached.headers['ETag'], etag)
+
+    def test_skips_encoded_and_other_mimetypes(self):
+        @self.app.route('/encoded')
+        def encoded():
+            return Response(gzip.compress(b'x' * 2000), mimetype='application/json',
+                            headers={'Content-Encoding': 'gzip'})
+
+        @self.app.route('/image')
+        def image():
+            return Response(b'x' * 2000, mimetype='image/png')
+
+        response = self.client.get('/encoded', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(gzip.decompress(response.data), b'x' * 2000)
+        response = self.client.get('/image', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.data, b'x' * 2000)
+        self.assertNotIn('Content-Encoding', response.headers)
+
+    def test_negotiate(self):
+        compression = self.app.extensions['compression']
+        self.assertEqual(list(compression.encoders), available_encodings())
+        self.assertEqual(available_encodings()[-1], 'gzip')
+        with self.app.test_request_context(headers={'Accept-Encoding': 'gzip;q=0.5, br, zstd'}):
+            # equal quality, the server prefers br and zstd when installed
+            self.assertEqual(compression.negotiate(request.accept_encodings), available_encodings()[0])
+        with self.app.test_request_context(headers={'Accept-Encoding': 'br;q=0.2, zstd;q=0.2, gzip'}):
+            self.assertEqual(compression.negotiate(request.accept_encodings), 'gzip')
+        with self.app.test_request_context(headers={'Accept-Encoding': '*'}):
+            self.assertEqual(compression.negotiate(request.accept_encodings), available_encodings()[0])
+
+    def test_disabled(self):
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'SQLALCHEMY_ECHO': False,
+            'COMPRESS_ENABLED': False,
+        })
+        self.assertNotIn('compression', app.extensions)
+        self.assertEqual(Compression().encoders, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
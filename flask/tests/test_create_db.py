@@ -0,0 +1,81 @@
+import time
+import unittest
+from sqlalchemy import event, inspect
+from app.main import create_app, db
+from create_db import seed
+from user.user_models import Role, TokenBlocklist, TokenBlocklistVersion, User
+from product.product_models import Product
+
+
+
+class CreateDbTestCase(unittest.TestCase):
+    def seeded(self, **counts):
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'SQLALCHEMY_ECHO': False,
+            'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        })
+        with app.app_context():
+            db.create_all()
+            seed(**counts)
+            users = db.session.execute(db.select(User.username, User.role, User.deposit).order_by(User.id)).all()
+            products = db.session.execute(db.select(Product.__table__).order_by(Product.id)).all()
+            jtis = db.session.execute(db.select(TokenBlocklist.jti, TokenBlocklist.exp).order_by(TokenBlocklist.id)).all()
+            indexes = {index['name'] for index in inspect(db.engine).get_indexes('product')}
+            version = TokenBlocklistVersion.current()
+            password = User.query.first().password
+        return users, products, jtis, indexes, version, password
+
+    def test_same_seed_same_rows(self):
+        now = int(time.time())
+        first = self.seeded(users=50, products=500, revoked_tokens=20, seed=3, now=now)
+        second = self.seeded(users=50, products=500, revoked_tokens=20, seed=3, now=now)
+        other = self.seeded(users=50, products=500, revoked_tokens=20, seed=4, now=now)
+        self.assertEqual(first[:3], second[:3])
+        self.assertNotEqual(first[1], other[1])
+
+    def test_generated_rows(self):
+        now = int(time.time())
+        users, products, jtis, indexes, version, password = self.seeded(
+            users=100, products=2000, revoked_tokens=200, now=now)
+        self.assertEqual(sum(1 for user in users if user.role == Role.seller), 10)
+        self.assertEqual(len(products), 2000)
+        self.assertTrue(all(product.cost >= 5 and product.cost % 5 == 0 for product in products))
+        self.assertTrue(any(product.amount_available == 0 for product in products))
+        seller_ids = {product.seller_id for product in products}
+        self.assertLessEqual(seller_ids, set(range(1, 11)))
+        self.assertEqual(len({jti for jti, _ in jtis}), 200)
+        # about half of the revoked tokens are still live
+        live = sum(1 for _, exp in jtis if exp > now)
+        self.assertTrue(60 < live < 140, live)
+        self.assertEqual(version, 1)
+        self.assertTrue(password.startswith('pbkdf2:sha256:1000$'))
+        self.assertIn('ix_product_cost_id', indexes)
+
+    def test_indexes_kept_on_a_table_with_rows(self):
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'SQLALCHEMY_ECHO': False,
+            'PASSWORD_HASH_METHOD': 'pbkdf2:sha256:1000',
+        })
+        with app.app_context():
+            db.create_all()
+            statements = []
+            event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+            seed(users=10, products=100, revoked_tokens=5, seed=1)
+            self.assertTrue(any(statement.lstrip().startswith('DROP INDEX') for statement in statements))
+
+            del statements[:]
+            seed(users=10, products=100, revoked_tokens=5, seed=2)
+            self.assertFalse([statement for statement in statements if statement.lstrip().startswith('DROP')])
+            self.assertEqual(User.query.count(), 20)
+            self.assertEqual(Product.query.count(), 200)
+            search = db.session.execute(db.text("SELECT count(*) FROM product_fts WHERE product_fts MATCH 'cola'"))
+            cola = Product.query.filter(Product.product_name.like('cola %')).count()
+            self.assertEqual(search.scalar(), cola)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import tempfile
+import unittest
+from app.main import create_app, db
+from app.database import DEFAULT_POOL, READ_ENGINE, echo_flag, engine_options
+from user.user_models import User
+from product.product_models import Product
+from flask_jwt_extended import create_access_token
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+
+
+class DatabaseProfileTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, 'db.sqlite3')
+        self.replica = os.path.join(self.tmp.name, 'replica.sqlite3')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def make_app(self, **config):
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.path}',
+            'SQLALCHEMY_ECHO': False,
+            **config,
+        })
+        self.addCleanup(self.dispose, app)
+        return app
+
+    def dispose(self, app):
+        with app.app_context():
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+        if READ_ENGINE in app.extensions:
+            app.extensions[READ_ENGINE].dispose()
+
+    def pragma(self, engine, name):
+        with engine.connect() as connection:
+            return connection.exec_driver_sql(f'PRAGMA {name}').scalar()
+
+    def test_sqlite_pragmas(self):
+        app = self.make_app(SQLITE_PRAGMAS={'busy_timeout': 1234})
+        with app.app_context():
+            self.assertEqual(self.pragma(db.engine, 'journal_mode'), 'wal')
+            self.assertEqual(self.pragma(db.engine, 'synchronous'), 1)
+            self.assertEqual(self.pragma(db.engine, 'busy_timeout'), 1234)
+            self.assertEqual(self.pragma(db.engine, 'mmap_size'), 256 * 1024 * 1024)
+            self.assertEqual(self.pragma(db.engine, 'cache_size'), -64 * 1024)
+            # every pooled connection, not only the first one
+            with db.engine.connect() as first, db.engine.connect() as second:
+                self.assertEqual(second.exec_driver_sql('PRAGMA busy_timeout').scalar(), 1234)
+
+    def test_server_pool_options(self):
+        self.assertEqual(engine_options({}, 'postgresql://db/app'), DEFAULT_POOL)
+        options = engine_options({'DB_POOL_SIZE': 3, 'DB_POOL_PRE_PING': False}, 'postgresql://db/app')
+        self.assertEqual((options['pool_size'], options['pool_pre_ping']), (3, False))
+        self.assertEqual(engine_options({'DB_POOL_SIZE': 3}, 'sqlite:///db.sqlite3'), {})
+
+        app = self.make_app(SQLALCHEMY_ENGINE_OPTIONS={'pool_size': 2})
+        self.assertEqual(app.config['SQLALCHEMY_ENGINE_OPTIONS'], {'pool_size': 2})
+
+    def test_echo_from_environment(self):
+        self.assertEqual([echo_flag(v) for v in ('True', 'false', '0', '1', 'debug', '', True)],
+                         [True, False, False, True, 'debug', False, True])
+        # the .env sets FLASK_SQLALCHEMY_ECHO=True, a string
+        for value, echo in (('True', True), ('False', False), ('0', False)):
+            app = self.make_app(SQLALCHEMY_ECHO=value, DB_READ_URI=f'sqlite:///{self.replica}')
+            with app.app_context():
+                self.assertIs(db.engine.echo, echo)
+            self.assertIs(app.extensions[READ_ENGINE].echo, echo)
+
+    def test_read_views_use_replica(self):
+        app = self.make_app(DB_READ_URI=f'sqlite:///file:{self.replica}?mode=ro&uri=true')
+        client = app.test_client()
+        with app.app_context():
+            db.create_all()
+            seller = User(username='seller', email='seller@example.com', role='seller')
+            db.session.add(seller)
+            db.session.flush()
+            db.session.add(Product(product_name='old', cost=5, amount_available=1, seller_id=seller.id))
+            db.session.commit()
+            db.session.execute(text('VACUUM INTO :path'), {'path': self.replica})
+            headers = {'Authorization': f"Bearer {create_access_token(identity='seller')}"}
+
+        response = client.put('/products/1', headers=headers, json={'product_name': 'new'})
+        self.assertEqual(response.json['product_name'], 'new')
+        # the replica has not caught up, the write went to the primary
+        self.assertEqual(client.get('/products/1', headers=headers).json['product_name'], 'old')
+        self.assertEqual(client.get('/products', headers=headers).json['products'][0]['product_name'], 'old')
+        with app.app_context():
+            self.assertEqual(db.session.get(Product, 1).product_name, 'new')
+            with app.extensions[READ_ENGINE].connect() as connection, self.assertRaises(OperationalError):
+                connection.execute(text("UPDATE product SET product_name = 'x'"))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+import unittest
+import json
+from app.main import create_app, db
+from app.query_stats import count_queries
+from app.table_version import TableVersion
+from user.user_models import User
+from product.product_models import Product
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event, text
+from sqlalchemy.exc import OperationalError
+
+
+
+class ETagTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'SQLALCHEMY_ECHO': False,
+        })
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            seller = User(username='seller', email='seller@example.com', role='seller')
+            buyer = User(username='buyer', email='buyer@example.com', role='buyer', deposit=100)
+            db.session.add_all([seller, buyer])
+            db.session.flush()
+            db.session.add_all(
+                Product(product_name=f'item {i}', cost=5, amount_available=10, seller_id=seller.id)
+                for i in range(3)
+            )
+            db.session.commit()
+            self.seller = {'Authorization': f"Bearer {create_access_token(identity='seller')}"}
+            self.buyer = {'Authorization': f"Bearer {create_access_token(identity='buyer')}"}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def revalidate(self, url, headers=None):
+        headers = headers or self.seller
+        first = self.client.get(url, headers=headers)
+        self.assertEqual(first.status_code, 200)
+        etag = first.headers['ETag']
+        second = self.client.get(url, headers={**headers, 'If-None-Match': etag})
+        return etag, second
+
+    def assertNotModified(self, url, headers=None):
+        etag, response = self.revalidate(url, headers)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers['ETag'], etag)
+        self.assertEqual(response.data, b'')
+        return etag
+
+    def test_not_modified(self):
+        for url in ['/products', '/products?seller_id=1', '/products/1', '/users/list', '/users/1']:
+            with self.subTest(url=url):
+                self.assertNotModified(url)
+
+    def test_listing_variants_have_own_etags(self):
+        tags = {
+            self.client.get(url, headers=self.seller).headers['ETag']
+            for url in ['/products', '/products?limit=1', '/products?in_stock=true']
+        }
+        self.assertEqual(len(tags), 3)
+        ndjson = self.client.get('/products', headers={**self.seller, 'Accept': 'application/x-ndjson'})
+        self.assertNotIn(ndjson.headers['ETag'], tags)
+
+    def test_update_changes_etags(self):
+        listing = self.assertNotModified('/products')
+        row = self.assertNotModified('/products/1')
+        other = self.assertNotModified('/products/2')
+        response = self.client.put('/products/1', headers=self.seller, json={'cost': 7})
+        self.assertEqual(response.status_code, 200)
+
+        self.assertNotEqual(self.assertNotModified('/products'), listing)
+        self.assertNotEqual(self.assertNotModified('/products/1'), row)
+        self.assertEqual(self.assertNotModified('/products/2'), other)
+
+    def test_purchase_changes_etags(self):
+        product = self.assertNotModified('/products/2')
+        user = self.assertNotModified('/users/2')
+        response = self.client.post('/products/buy/product', headers=self.buyer,
+                                    json={'product_id': 2, 'amount': 1})
+        self.assertEqual(response.status_code, 200, response.json)
+
+        self.assertNotEqual(self.assertNotModified('/products/2'), product)
+        self.assertNotEqual(self.assertNotModified('/users/2'), user)
+
+    def test_bulk_writes_change_etags(self):
+        listing = self.assertNotModified('/products')
+        row = self.assertNotModified('/products/1')
+        response = self.client.patch('/products/bulk', headers=self.seller, content_type='application/json',
+                                     data=json.dumps({'items': [{'id': 1, 'cost': 9}]}))
+        self.assertEqual(response.status_code, 200, response.json)
+        self.assertNotEqual(self.assertNotModified('/products/1'), row)
+        self.assertNotEqual(self.assertNotModified('/products'), listing)
+
+        listing = self.assertNotModified('/products')
+        response = self.client.post('/products/bulk', headers=self.seller, content_type='application/json',
+                                    data=json.dumps({'items': [{'product_name': 'new', 'cost': 1}]}))
+        self.assertEqual(response.status_code, 200, response.json)
+        new_id = response.json['results'][0]['id']
+        self.assertNotEqual(self.assertNotModified('/products'), listing)
+        self.assertNotModified(f'/products/{new_id}')
+
+    def test_deleted_row(self):
+        etag = self.assertNotModified('/products/3')
+        self.client.delete('/products/3', headers=self.seller)
+        response = self.client.get('/products/3', headers={**self.seller, 'If-None-Match': etag})
+        self.assertEqual(response.status_code, 404)
+
+    def test_not_modified_skips_rows(self):
+        for url in ['/products', '/products/1']:
+            etag = self.client.get(url, headers=self.seller).headers['ETag']
+            with count_queries() as queries:
+                response = self.client.get(url, headers={**self.seller, 'If-None-Match': etag})
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(len(queries), 1, queries.statements)
+            self.assertNotIn('product_name', queries.statements[0])
+
+    def test_stale_etag_gets_body(self):
+        response = self.client.get('/products/1', headers={**self.seller, 'If-None-Match': '"product-1-999"'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['id'], 1)
+
+    def test_counter_is_bumped_in_the_write_transaction(self):
+        events = []
+
+        def statement(conn, cursor, statement, *args):
+            events.append(statement.split()[0] + (' table_version' if 'table_version' in statement else ''))
+
+        with self.app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', statement)
+            event.listen(db.engine, 'commit', lambda conn: events.append('COMMIT'))
+        response = self.client.post('/products/buy/product', headers=self.buyer, json={'product_id': 2, 'amount': 1})
+        self.assertEqual(response.status_code, 200, response.json)
+
+        # one statement bumps both counters, last before the one commit
+        self.assertEqual(events.count('COMMIT'), 1)
+        self.assertEqual(events.count('UPDATE table_version'), 1)
+        self.assertEqual(events[-2:], ['UPDATE table_version', 'COMMIT'])
+        with self.app.app_context():
+            self.assertEqual(TableVersion.current('product'), TableVersion.current('users'))
+
+    def test_write_fails_with_its_counter(self):
+        with self.app.app_context():
+            db.session.execute(text('DROP TABLE table_version'))
+            db.session.commit()
+            db.session.get(Product, 1).cost = 99
+            with self.assertRaises(OperationalError):
+                db.session.commit()
+            db.session.rollback()
+            self.assertNotEqual(db.session.get(Product, 1).cost, 99)
+
+    def test_rollback_does_not_bump(self):
+        with self.app.app_context():
+            before = TableVersion.current('product')
+            db.session.get(Product, 1).cost = 99
+            db.session.flush()
+            db.session.rollback()
+            db.session.commit()
+            self.assertEqual(TableVersion.current('product'), before)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+import time
+import unittest
+import json
+from app.main import create_app, db
+from user.user_models import Role, User
+from user.identity_cache import UserIdentityCache, get_identity_cache
+from sqlalchemy import event
+from flask_jwt_extended import create_access_token
+
+
+
+class UserIdentityCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'SQLALCHEMY_ECHO': False,
+        })
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            user = User(username='buyer', email='buyer@example.com', role='buyer')
+            db.session.add(user)
+            db.session.commit()
+            self.user_id = user.id
+            self.headers = {'Authorization': f"Bearer {create_access_token(identity='buyer')}"}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def user_statements(self):
+        statements = []
+
+        def collect(conn, cursor, statement, *args):
+            if 'FROM users' in statement:
+                statements.append(statement)
+
+        with self.app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', collect)
+        return statements
+
+    def test_repeated_requests_do_not_query_users(self):
+        self.client.get('/users/current/user', headers=self.headers)
+        statements = self.user_statements()
+        for _ in range(3):
+            response = self.client.get('/users/current/user', headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(statements, [])
+
+    def test_deposit_is_never_cached(self):
+        self.client.get('/users/current/user', headers=self.headers)
+        response = self.client.post('/users/deposit/money', data=json.dumps({'amount': 50}),
+                                    content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        with self.app.test_request_context():
+            record = get_identity_cache().resolve('buyer')
+            self.assertFalse(hasattr(record, 'deposit'))
+            self.assertEqual(record.load().deposit, 50)
+
+    def test_deleted_user_still_cached(self):
+        self.client.get('/users/current/user', headers=self.headers)
+        with self.app.app_context():
+            db.session.execute(db.delete(User).where(User.id == self.user_id))
+            db.session.commit()
+        for url in ('/users/deposit/money', '/users/reset/deposit'):
+            with self.subTest(url=url):
+                response = self.client.post(url, data=json.dumps({'amount': 50}),
+                                            content_type='application/json', headers=self.headers)
+                self.assertEqual(response.status_code, 401)
+
+    def test_update_invalidates_old_username(self):
+        self.client.get('/users/current/user', headers=self.headers)
+        response = self.client.put(f'/users/{self.user_id}', data=json.dumps({'username': 'renamed'}),
+                                   content_type='application/json', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/users/current/user', headers=self.headers)
+        self.assertEqual(response.status_code, 401)
+
+    def test_other_workers_see_changes_after_ttl(self):
+        cache = UserIdentityCache(ttl=0.05)
+        with self.app.app_context():
+            self.assertEqual(cache.resolve('buyer').role, Role.buyer)
+            # another worker changes the role, this cache is not told
+            db.session.execute(db.update(User).where(User.id == self.user_id).values(role=Role.seller))
+            db.session.commit()
+            self.assertEqual(cache.resolve('buyer').role, Role.buyer)
+            time.sleep(0.06)
+            self.assertEqual(cache.resolve('buyer').role, Role.seller)
+
+    def test_zero_ttl_disables_cache(self):
+        cache = UserIdentityCache(ttl=0)
+        with self.app.app_context():
+            cache.resolve('buyer')
+            db.session.execute(db.delete(User).where(User.id == self.user_id))
+            db.session.commit()
+            self.assertIsNone(cache.resolve('buyer'))
+
+    def test_cache_is_bounded(self):
+        cache = UserIdentityCache(max_size=2)
+        with self.app.app_context():
+            for i in range(3):
+                db.session.add(User(username=f'user{i}', email='x@example.com', role='buyer'))
+            db.session.commit()
+            for i in range(3):
+                cache.resolve(f'user{i}')
+        self.assertEqual(len(cache), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import unittest
+from app.main import create_app, db
+from user.user_models import User
+from product.product_models import Product
+from flask_jwt_extended import create_access_token
+
+
+def config(**overrides):
+    return {
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+        'SQLALCHEMY_ECHO': False,
+        **overrides,
+    }
+
+
+def serve_requests(metrics_dir, count, retire=False):
+    app = create_app(config(METRICS_DIR=metrics_dir))
+    with app.app_context():
+        db.create_all()
+    client = app.test_client()
+    for _ in range(count):
+        client.post('/users/login', data=json.dumps({'username': 'x', 'password': 'y'}), content_type='application/json')
+    if retire:
+        app.extensions['request_metrics'].retire()
+    else:
+        app.extensions['request_metrics'].flush()
+
+
+class MetricsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app(config())
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            seller = User(username='seller', email='seller@example.com', role='seller')
+            db.session.add(seller)
+            db.session.flush()
+            db.session.add(Product(product_name='tea', cost=5, amount_available=3, seller_id=seller.id))
+            db.session.commit()
+            self.headers = {'Authorization': f"Bearer {create_access_token(identity='seller')}"}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def metrics(self, client=None):
+        response = (client or self.client).get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content_type.startswith('text/plain; version=0.0.4'))
+        return response.get_data(as_text=True).splitlines()
+
+    def test_requests_by_endpoint_and_status(self):
+        self.client.get('/products', headers=self.headers)
+        self.client.get('/products', headers=self.headers)
+        self.client.get('/products')
+        lines = self.metrics()
+        self.assertIn('http_requests_total{endpoint="product.list",method="GET",status="200"} 2', lines)
+        self.assertIn('http_requests_total{endpoint="product.list",method="GET",status="401"} 1', lines)
+        self.assertIn('http_request_duration_seconds_count{endpoint="product.list",method="GET"} 3', lines)
+        self.assertIn('http_request_duration_seconds_bucket{endpoint="product.list",method="GET",le="+Inf"} 3', lines)
+        self.assertIn('http_requests_in_progress{endpoint="product.list",method="GET"} 0', lines)
+        self.assertFalse(any('endpoint="metrics"' in line for line in lines))
+
+    def test_response_bytes(self):
+        body = self.client.get('/products', headers=self.headers).get_data()
+        with self.client.get('/products', headers={**self.headers, 'Accept': 'application/x-ndjson'}) as response:
+            streamed = response.get_data()
+        self.assertIn(b'tea', streamed)
+        lines = self.metrics()
+        self.assertIn(f'http_response_bytes_total{{endpoint="product.list",method="GET"}} {len(body) + len(streamed)}', lines)
+
+    def test_unmatched_and_failing_requests(self):
+        self.client.get('/nowhere')
+        self.client.post('/users/login', data=json.dumps({'username': 'x', 'password': 'y'}), content_type='application/json')
+        lines = self.metrics()
+        self.assertIn('http_requests_total{endpoint="unmatched",method="GET",status="404"} 1', lines)
+        self.assertIn('http_requests_total{endpoint="auth.login_user",method="POST",status="400"} 1', lines)
+
+    def test_worker_processes_are_summed(self):
+        metrics_dir = tempfile.mkdtemp()
+        # one worker dies without retiring, the other retires on its way out
+        workers = [
+            multiprocessing.get_context('fork').Process(target=serve_requests, args=(metrics_dir, count, retire))
+            for count, retire in ((2, False), (3, True))
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+            self.assertEqual(worker.exitcode, 0)
+
+        app = create_app(config(METRICS_DIR=metrics_dir))
+        client = app.test_client()
+        for _ in range(2):
+            lines = self.metrics(client)
+            self.assertIn('http_requests_total{endpoint="auth.login_user",method="POST",status="400"} 5', lines)
+            self.assertFalse(any(line.startswith('http_requests_in_progress{') for line in lines))
+        # the dead workers' files were folded into the exited file
+        self.assertEqual([name for name in os.listdir(metrics_dir) if name.endswith('.json')], ['exited.json'])
+
+    def test_reused_pid_keeps_the_old_counters(self):
+        # two processes with the same pid look like two app instances in one process
+        metrics_dir = tempfile.mkdtemp()
+        serve_requests(metrics_dir, 2)
+        serve_requests(metrics_dir, 3)
+        lines = self.metrics(create_app(config(METRICS_DIR=metrics_dir)).test_client())
+        self.assertIn('http_requests_total{endpoint="auth.login_user",method="POST",status="400"} 5', lines)
+
+    def test_disabled(self):
+        app = create_app(config(METRICS_ENABLED=False))
+        self.assertEqual(app.test_client().get('/metrics').status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+import uuid
+from app.main import create_app, db
+from app.schema_check import SchemaCheckError, check_schema, missing_indexes
+from flask_migrate import upgrade
+from sqlalchemy import text
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'migrations')
+
+
+
+class MigrationsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(self.tmp.name, 'db.sqlite3')}",
+            'SQLALCHEMY_ECHO': False,
+        })
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        self.tmp.cleanup()
+
+    def test_upgrade_creates_expected_indexes(self):
+        with self.app.app_context():
+            upgrade(directory=MIGRATIONS_DIR)
+            self.assertEqual(missing_indexes(), [])
+        check_schema(self.app)
+
+    def test_check_fails_on_missing_index(self):
+        with self.app.app_context():
+            upgrade(directory=MIGRATIONS_DIR)
+            db.session.execute(text('DROP INDEX ix_users_username'))
+            db.session.commit()
+        with self.assertRaises(SchemaCheckError):
+            check_schema(self.app)
+
+    def test_upgrade_indexes_existing_products(self):
+        with self.app.app_context():
+            upgrade(directory=MIGRATIONS_DIR, revision='88f1abe7169e')
+            db.session.execute(text("INSERT INTO users (username, email, role, deposit) VALUES ('s', 's@x', 'seller', 0)"))
+            db.session.execute(text("INSERT INTO product (product_name, cost, seller_id) VALUES ('lemon soda', 1, 1)"))
+            db.session.commit()
+            upgrade(directory=MIGRATIONS_DIR)
+            matches = db.session.execute(text("SELECT rowid FROM product_fts WHERE product_fts MATCH 'lemon'"))
+            self.assertEqual(matches.scalars().all(), [1])
+
+    def test_upgrade_converts_blocklist(self):
+        jti = '0b0e1b2a-7f5e-4b8e-9a36-6cbe2f5b2b11'
+        with self.app.app_context():
+            upgrade(directory=MIGRATIONS_DIR, revision='61d4ff95cad4')
+            db.session.execute(text(
+                "INSERT INTO token_blocklist (jti, create_at) VALUES (:jti, '2024-01-01 00:00:00.000000')"
+            ), {'jti': jti})
+            db.session.commit()
+            upgrade(directory=MIGRATIONS_DIR)
+            row = db.session.execute(text('SELECT jti, exp FROM token_blocklist')).one()
+            self.assertEqual(row, (uuid.UUID(jti).bytes, 1706659200))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,133 @@
+import json
+import threading
+import time
+import unittest
+from app.main import create_app, db
+from user.user_models import User
+from user.password_hasher import PasswordHasher, get_password_hasher
+from utils.custom_exception_class import CustomException
+from werkzeug.security import generate_password_hash
+
+FAST_METHOD = 'pbkdf2:sha256:1000'
+
+
+class PasswordHasherTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'SQLALCHEMY_ECHO': False,
+            'PASSWORD_HASH_METHOD': FAST_METHOD,
+        })
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def login(self, password='password'):
+        return self.client.post('/users/login', data=json.dumps({
+            'username': 'buyer', 'password': password,
+        }), content_type='application/json')
+
+    def add_user(self, pwhash):
+        with self.app.app_context():
+            db.session.add(User(username='buyer', email='buyer@example.com', password=pwhash, role='buyer'))
+            db.session.commit()
+
+    def stored_hash(self):
+        with self.app.app_context():
+            return User.query.one().password
+
+    def test_hash_uses_configured_method(self):
+        with self.app.app_context():
+            hasher = get_password_hasher()
+            pwhash = hasher.hash('secret')
+            self.assertTrue(pwhash.startswith(FAST_METHOD + '$'))
+            self.assertTrue(hasher.verify(pwhash, 'secret'))
+            self.assertFalse(hasher.verify(pwhash, 'wrong'))
+            self.assertFalse(hasher.verify(None, 'secret'))
+            self.assertFalse(hasher.needs_rehash(pwhash))
+
+    def test_login_rehashes_old_hash(self):
+        old_hash = generate_password_hash('password', 'pbkdf2:sha256:500')
+        self.add_user(old_hash)
+        self.assertEqual(self.login().status_code, 200)
+        new_hash = self.stored_hash()
+        self.assertTrue(new_hash.startswith(FAST_METHOD + '$'))
+        self.assertEqual(self.login().status_code, 200)
+        self.assertEqual(self.stored_hash(), new_hash)
+
+    def test_failed_login_keeps_hash(self):
+        old_hash = generate_password_hash('password', 'pbkdf2:sha256:500')
+        self.add_user(old_hash)
+        self.assertEqual(self.login('wrong').status_code, 400)
+        self.assertEqual(self.stored_hash(), old_hash)
+
+    def hold(self, hasher, release):
+        started = threading.Event()
+
+        def blocker():
+            started.set()
+            release.wait()
+
+        thread = threading.Thread(target=hasher._call, args=(blocker,))
+        thread.start()
+        started.wait()
+        return thread
+
+    def test_saturated_hasher_returns_503(self):
+        self.add_user(generate_password_hash('password', FAST_METHOD))
+        release = threading.Event()
+        with self.app.app_context():
+            hasher = get_password_hasher()
+            hasher.workers, hasher.max_queue = 1, 0
+            blocked = self.hold(hasher, release)
+            try:
+                response = self.login()
+            finally:
+                release.set()
+                blocked.join()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.login().status_code, 200)
+
+    def test_queue_limit(self):
+        hasher = PasswordHasher(FAST_METHOD, workers=1, max_queue=1, timeout=5)
+        release = threading.Event()
+        running = self.hold(hasher, release)
+        waiting = threading.Thread(target=hasher._call, args=(release.wait,))
+        waiting.start()
+        # wait until the second call holds its queue slot
+        while hasher._slots._value:
+            time.sleep(0.01)
+        with self.assertRaises(CustomException) as error:
+            hasher._call(release.wait)
+        self.assertEqual(error.exception.status_code, 503)
+        release.set()
+        running.join()
+        waiting.join()
+        self.assertTrue(hasher.verify(hasher.hash('secret'), 'secret'))
+
+    def test_wait_times_out(self):
+        hasher = PasswordHasher(FAST_METHOD, workers=1, max_queue=1, timeout=0.05)
+        release = threading.Event()
+        running = self.hold(hasher, release)
+        try:
+            with self.assertRaises(CustomException) as error:
+                hasher.hash('secret')
+        finally:
+            release.set()
+            running.join()
+        self.assertEqual(error.exception.status_code, 503)
+        self.assertIn('timed out', error.exception.message)
+
+    def test_hash_runs_in_the_calling_thread(self):
+        hasher = PasswordHasher(FAST_METHOD)
+        self.assertIs(hasher._call(threading.current_thread), threading.current_thread())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,164 @@
+import unittest
+import json
+from unittest import mock
+from app.main import create_app, db
+from app.query_stats import count_queries
+from user.user_models import User
+from product.product_models import Product
+from product import product_bulk
+from flask_jwt_extended import create_access_token
+
+
+
+class ProductBulkTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'SQLALCHEMY_ECHO': False,
+        })
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            seller = User(username='seller', email='seller@example.com', role='seller')
+            other = User(username='other', email='other@example.com', role='seller')
+            db.session.add_all([seller, other])
+            db.session.commit()
+            foreign = Product(product_name='foreign', cost=1, amount_available=1, seller_id=other.id)
+            db.session.add(foreign)
+            db.session.commit()
+            self.seller_id = seller.id
+            self.foreign_id = foreign.id
+            self.foreign_seller = other.id
+            self.headers = {'Authorization': f"Bearer {create_access_token(identity='seller')}"}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def send(self, method, body):
+        return getattr(self.client, method)('/products/bulk', headers=self.headers,
+                                            content_type='application/json', data=json.dumps(body))
+
+    def create(self, count):
+        items = [{'product_name': f'item {i}', 'cost': i + 1, 'amount_available': 3} for i in range(count)]
+        response = self.send('post', {'items': items})
+        self.assertEqual(response.status_code, 200)
+        return [result['id'] for result in response.json['results']]
+
+    def test_bulk_create_in_chunks(self):
+        product_bulk.BULK_CHUNK_SIZE, chunk_size = 4, product_bulk.BULK_CHUNK_SIZE
+        try:
+            ids = self.create(10)
+        finally:
+            product_bulk.BULK_CHUNK_SIZE = chunk_size
+        with self.app.app_context():
+            products = Product.query.filter(Product.id.in_(ids)).order_by(Product.id).all()
+        self.assertEqual([p.product_name for p in products], [f'item {i}' for i in range(10)])
+        self.assertTrue(all(p.seller_id == self.seller_id for p in products))
+
+    def test_bulk_create_reports_invalid_items(self):
+        response = self.send('post', {'items': [
+            {'product_name': 'ok', 'cost': 2},
+            {'product_name': 'no cost'},
+            {'product_name': 'negative', 'cost': -1},
+            {'product_name': 'fraction', 'cost': 19.99},
+        ]})
+        statuses = [result['status'] for result in response.json['results']]
+        self.assertEqual(statuses, ['created', 'error', 'error', 'error'])
+        self.assertIn('cost', response.json['results'][1]['errors'])
+        self.assertIn('cost', response.json['results'][3]['errors'])
+        self.assertEqual(response.json['failed'], 3)
+
+    def test_bulk_update_checks_ownership(self):
+        ids = self.create(2)
+        response = self.send('patch', {'items': [
+            {'id': ids[0], 'cost': 42},
+            {'id': self.foreign_id, 'cost': 42},
+            {'id': 999, 'cost': 42},
+            {'id': ids[1], 'product_name': 'renamed'},
+        ]})
+        results = response.json['results']
+        self.assertEqual([r['status'] for r in results], ['updated', 'error', 'error', 'updated'])
+        with self.app.app_context():
+            self.assertEqual(db.session.get(Product, ids[0]).cost, 42)
+            self.assertEqual(db.session.get(Product, ids[1]).product_name, 'renamed')
+            self.assertEqual(db.session.get(Product, self.foreign_id).cost, 1)
+
+    def test_bulk_update_needs_integer_ids(self):
+        ids = self.create(1)
+        response = self.send('patch', {'items': [
+            {'id': str(ids[0]), 'cost': 42},
+            {'id': ids[0] + 0.7, 'cost': 42},
+        ]})
+        self.assertEqual([r['status'] for r in response.json['results']], ['error', 'error'])
+        with self.app.app_context():
+            self.assertEqual(db.session.get(Product, ids[0]).cost, 1)
+
+    def test_bulk_delete(self):
+        ids = self.create(3)
+        response = self.send('delete', {'ids': ids + [self.foreign_id, 'x']})
+        self.assertEqual([r['status'] for r in response.json['results']],
+                         ['deleted', 'deleted', 'deleted', 'error', 'error'])
+        with self.app.app_context():
+            self.assertEqual([p.id for p in Product.query.all()], [self.foreign_id])
+
+    def test_bulk_create_query_budget(self):
+        self.create(1)
+        items = [{'product_name': f'item {i}', 'cost': i + 1} for i in range(100)]
+        with count_queries() as queries:
+            response = self.send('post', {'items': items})
+        ids = [result['id'] for result in response.json['results']]
+        # max(id), one executemany insert, the ids, the table counter
+        self.assertEqual(len(queries), 4, queries.statements)
+        self.assertEqual(len(set(ids)), 100)
+        with self.app.app_context():
+            names = dict(db.session.execute(
+                db.select(Product.id, Product.product_name).where(Product.id.in_(ids))).all())
+        self.assertEqual([names[product_id] for product_id in ids], [item['product_name'] for item in items])
+
+    def owners_then(self, change):
+        # product_owners() answering with the rows as they were before change
+        product_owners = product_bulk.product_owners
+
+        def stale(ids):
+            owners = product_owners(ids)
+            change()
+            return owners
+
+        return mock.patch.object(product_bulk, 'product_owners', side_effect=stale)
+
+    def test_bulk_update_reports_rows_gone_before_the_write(self):
+        ids = self.create(2)
+
+        def delete_and_reassign():
+            db.session.execute(db.delete(Product).where(Product.id == ids[0]))
+            db.session.execute(db.update(Product).where(Product.id == ids[1]).values(seller_id=self.foreign_seller))
+
+        with self.owners_then(delete_and_reassign):
+            response = self.send('patch', {'items': [{'id': ids[0], 'cost': 42}, {'id': ids[1], 'cost': 42}]})
+        results = response.json['results']
+        self.assertEqual([r['status'] for r in results], ['error', 'error'])
+        self.assertEqual([r['error'] for r in results], [product_bulk.NOT_FOUND, product_bulk.FORBIDDEN])
+        with self.app.app_context():
+            self.assertEqual(db.session.get(Product, ids[1]).cost, 2)
+
+    def test_bulk_delete_reports_rows_gone_before_the_write(self):
+        ids = self.create(2)
+
+        def delete_first():
+            db.session.execute(db.delete(Product).where(Product.id == ids[0]))
+
+        with self.owners_then(delete_first):
+            response = self.send('delete', {'ids': ids})
+        results = response.json['results']
+        self.assertEqual([r['status'] for r in results], ['error', 'deleted'])
+        self.assertEqual(results[0]['error'], product_bulk.NOT_FOUND)
+
+    def test_empty_batch(self):
+        self.assertEqual(self.send('post', {'items': []}).status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import io
+import json
+import unittest
+from unittest import mock
+from app.main import create_app, db
+from user.user_models import User
+from product.product_models import Product, ProductImportJob
+from product import product_importer
+from product.product_importer import import_products
+from flask_jwt_extended import create_access_token
+
+
+
+class ProductImportTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'SQLALCHEMY_ECHO': False,
+        })
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            seller = User(username='seller', email='seller@example.com', role='seller')
+            db.session.add(seller)
+            db.session.commit()
+            self.seller_id = seller.id
+            self.headers = {'Authorization': f"Bearer {create_access_token(identity='seller')}"}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def csv_file(self, count, bad_rows=()):
+        lines = ['product_name,cost,amount_available,description']
+        for i in range(count):
+            cost = 'free' if i in bad_rows else i + 1
+            lines.append(f'"item {i}",{cost},{i % 4},"line one,\nline two of the same field"')
+        return io.BytesIO(('\n'.join(lines) + '\n').encode())
+
+    def product_names(self):
+        return [p.product_name for p in Product.query.order_by(Product.id)]
+
+    def test_csv_import_with_rejected_rows(self):
+        with self.app.app_context():
+            summary = import_products(self.csv_file(25, bad_rows={3, 17}), 'csv', self.seller_id, 'job', chunk_size=10)
+            self.assertEqual((summary['rows'], summary['imported'], summary['rejected']), (25, 23, 2))
+            self.assertEqual(len(self.product_names()), 23)
+            self.assertIn('rows_per_second', summary)
+
+    def test_ndjson_import_updates_by_id(self):
+        with self.app.app_context():
+            db.session.add(Product(product_name='old', cost=1, seller_id=self.seller_id))
+            db.session.commit()
+            data = b'{"id": 1, "product_name": "renamed"}\n\n{"product_name": "new", "cost": 3}\nnot json\n'
+            summary = import_products(io.BytesIO(data), 'ndjson', self.seller_id, 'job')
+            self.assertEqual((summary['imported'], summary['rejected']), (2, 1))
+            self.assertEqual(self.product_names(), ['renamed', 'new'])
+
+    def test_interrupted_import_resumes_after_last_chunk(self):
+        write_chunk = product_importer.write_chunk
+        calls = []
+
+        def failing_write_chunk(job, chunk):
+            calls.append(len(chunk))
+            if len(calls) == 3:
+                raise RuntimeError('worker killed')
+            return write_chunk(job, chunk)
+
+        with self.app.app_context():
+            with mock.patch.object(product_importer, 'write_chunk', failing_write_chunk):
+                with self.assertRaises(RuntimeError):
+                    import_products(self.csv_file(45), 'csv', self.seller_id, 'job', chunk_size=10)
+            self.assertEqual(len(self.product_names()), 20)
+            self.assertEqual(ProductImportJob.query.one().rows, 20)
+
+            summary = import_products(self.csv_file(45), 'csv', self.seller_id, 'job', chunk_size=10)
+            self.assertEqual(summary['resumed_from'], 20)
+            self.assertEqual(self.product_names(), [f'item {i}' for i in range(45)])
+
+    def test_csv_import_updates_by_id(self):
+        with self.app.app_context():
+            db.session.add(Product(product_name='old', cost=1, seller_id=self.seller_id))
+            db.session.commit()
+            data = b'id,product_name\n1,renamed\n1.7,other\n'
+            summary = import_products(io.BytesIO(data), 'csv', self.seller_id, 'job')
+            self.assertEqual((summary['imported'], summary['rejected']), (1, 1))
+            self.assertEqual(self.product_names(), ['renamed'])
+
+    def test_upload_of_another_file_does_not_resume(self):
+        def upload(file):
+            return self.client.post('/products/import', headers=self.headers, data={
+                'file': (file, 'catalog.csv'),
+                'chunk_size': '10',
+            }, content_type='multipart/form-data')
+
+        write_chunk = product_importer.write_chunk
+        calls = []
+
+        def failing_write_chunk(job, chunk):
+            calls.append(len(chunk))
+            if len(calls) == 3:
+                raise RuntimeError('worker killed')
+            return write_chunk(job, chunk)
+
+        with mock.patch.object(product_importer, 'write_chunk', failing_write_chunk):
+            with self.assertRaises(RuntimeError):
+                upload(self.csv_file(45))
+
+        response = upload(self.csv_file(30, bad_rows={0}))
+        self.assertEqual((response.json['resumed_from'], response.json['rows']), (0, 30))
+        response = upload(self.csv_file(45))
+        self.assertEqual(response.json['resumed_from'], 20)
+
+    def test_upload_endpoint(self):
+        response = self.client.post('/products/import', headers=self.headers, data={
+            'file': (self.csv_file(5), 'catalog.csv'),
+            'chunk_size': '2',
+        }, content_type='multipart/form-data')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['imported'], 5)
+
+    def test_cli_command(self):
+        runner = self.app.test_cli_runner()
+        with runner.isolated_filesystem():
+            with open('catalog.ndjson', 'w') as f:
+                f.write('\n'.join(json.dumps({'product_name': f'p{i}', 'cost': 1}) for i in range(3)))
+            result = runner.invoke(args=['import-products', 'catalog.ndjson', '--seller', 'seller'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('3 imported', result.output)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import unittest
+import json
+from app.main import create_app, db
+from user.user_models import User
+from product.product_models import Product
+from utils.pagination import encode_cursor
+from flask_jwt_extended import create_access_token
+
+
+
+class ProductListingTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'SQLALCHEMY_ECHO': False,
+        })
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            self.create_products()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def create_products(self):
+        seller = User(username='seller', email='seller@example.com', role='seller')
+        other = User(username='other', email='other@example.com', role='seller')
+        db.session.add_all([seller, other])
+        db.session.commit()
+        self.seller_id = seller.id
+        for i in range(25):
+            db.session.add(Product(
+                product_name=f'product {i:02d}',
+                cost=(i % 5) * 10 + 5,
+                amount_available=i % 3,
+                seller_id=seller.id if i % 2 else other.id,
+            ))
+        db.session.commit()
+        self.headers = {'Authorization': f"Bearer {create_access_token(identity='seller')}"}
+
+    def fetch_all(self, query):
+        ids, cursor = [], None
+        while True:
+            url = f'/products?{query}' + (f'&cursor={cursor}' if cursor else '')
+            response = self.client.get(url, headers=self.headers)
+            self.assertEqual(response.status_code, 200)
+            ids += [p['id'] for p in response.json['products']]
+            cursor = response.json['next']
+            if cursor is None:
+                return ids
+
+    def test_first_page_has_next_cursor(self):
+        response = self.client.get('/products?limit=10', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json['products']), 10)
+        self.assertIsNotNone(response.json['next'])
+
+    def test_cursor_walks_every_row_once(self):
+        ids = self.fetch_all('limit=7')
+        self.assertEqual(ids, list(range(1, 26)))
+
+    def test_sort_by_cost_descending(self):
+        ids = self.fetch_all('limit=4&sort=-cost')
+        with self.app.app_context():
+            expected = [p.id for p in Product.query.order_by(Product.cost.desc(), Product.id.desc())]
+        self.assertEqual(ids, expected)
+
+    def test_filters(self):
+        ids = self.fetch_all(f'limit=3&seller_id={self.seller_id}&min_cost=10&max_cost=40&in_stock=true')
+        with self.app.app_context():
+            expected = [
+                p.id for p in Product.query.order_by(Product.id)
+                if p.seller_id == self.seller_id and 10 <= p.cost <= 40 and p.amount_available > 0
+            ]
+        self.assertTrue(expected)
+        self.assertEqual(ids, expected)
+
+    def test_cursor_from_other_sort_is_rejected(self):
+        cursor = self.client.get('/products?limit=5', headers=self.headers).json['next']
+        response = self.client.get(f'/products?sort=cost&cursor={cursor}', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+    def test_malformed_cursor_is_rejected(self):
+        for key in (5, [1], [1, 2, 3], [[1], 2], [1, 'x'], None):
+            with self.subTest(key=key):
+                cursor = encode_cursor({'s': 'cost', 'k': key})
+                response = self.client.get(f'/products?sort=cost&cursor={cursor}', headers=self.headers)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json['error'], 'invalid cursor')
+
+    def test_ndjson_export_streams_all_matching_rows(self):
+        headers = dict(self.headers, Accept='application/x-ndjson')
+        response = self.client.get(f'/products?seller_id={self.seller_id}', headers=headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/x-ndjson')
+        lines = [json.loads(line) for line in response.data.decode().splitlines()]
+        self.assertEqual([p['id'] for p in lines], list(range(2, 26, 2)))
+
+    def test_invalid_sort(self):
+        response = self.client.get('/products?sort=description', headers=self.headers)
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
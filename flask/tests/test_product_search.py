@@ -0,0 +1,117 @@
+import unittest
+import json
+from app.main import create_app, db
+from user.user_models import User
+from product.product_models import Product
+from unittest import mock
+from product import product_search
+from product.product_search import match_expression
+from flask_jwt_extended import create_access_token
+
+
+
+class ProductSearchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'SQLALCHEMY_ECHO': False,
+        })
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            seller = User(username='seller', email='seller@example.com', role='seller')
+            db.session.add(seller)
+            db.session.flush()
+            db.session.add_all([
+                Product(product_name='Green tea', cost=5, amount_available=1, seller_id=seller.id,
+                        description='loose leaf, goes well with <b>lemon</b>'),
+                Product(product_name='Lemon soda', cost=5, amount_available=1, seller_id=seller.id,
+                        description='sparkling'),
+                Product(product_name='Crème brûlée', cost=5, amount_available=1, seller_id=seller.id),
+            ])
+            db.session.commit()
+            self.headers = {'Authorization': f"Bearer {create_access_token(identity='seller')}"}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def search(self, q, **params):
+        return self.client.get('/products/search', headers=self.headers, query_string={'q': q, **params})
+
+    def ids(self, q):
+        response = self.search(q)
+        self.assertEqual(response.status_code, 200, response.json)
+        return [product['id'] for product in response.json['products']]
+
+    def test_name_ranks_above_description(self):
+        self.assertEqual(self.ids('lemon'), [2, 1])
+
+    def test_every_word_must_match_last_is_prefix(self):
+        self.assertEqual(self.ids('tea lem'), [1])
+        self.assertEqual(self.ids('spark'), [2])
+        self.assertEqual(self.ids('coffee'), [])
+        # a prefix shorter than MIN_PREFIX_LENGTH only matches a whole word
+        self.assertEqual(match_expression('tea le'), '"tea" "le"')
+        self.assertEqual(self.ids('tea le'), [])
+
+    def test_diacritics_and_case(self):
+        self.assertEqual(self.ids('CREME brulee'), [3])
+
+    def test_highlight_is_escaped(self):
+        product = self.search('lemon').json['products'][1]
+        self.assertEqual(product['highlight']['description'],
+                         'loose leaf, goes well with &lt;b&gt;<mark>lemon</mark>&lt;/b&gt;')
+        self.assertEqual(product['highlight']['product_name'], 'Green tea')
+        self.assertEqual(product['description'], 'loose leaf, goes well with <b>lemon</b>')
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(match_expression('tea OR "soda" NEAR(x'), '"tea" "OR" "soda" "NEAR" "x"')
+        self.assertEqual(self.search('lemon OR soda').status_code, 200)
+        self.assertEqual(self.search('  ').status_code, 400)
+        self.assertEqual(self.client.get('/products/search', headers=self.headers).status_code, 400)
+
+    def test_pagination(self):
+        first = self.search('lemon', limit=1).json
+        self.assertEqual([p['id'] for p in first['products']], [2])
+        second = self.search('lemon', limit=1, cursor=first['next']).json
+        self.assertEqual([p['id'] for p in second['products']], [1])
+        self.assertIsNone(second['next'])
+        self.assertEqual(self.search('tea', cursor=first['next']).status_code, 400)
+
+    def test_pagination_stops_at_max_offset(self):
+        with mock.patch.object(product_search, 'MAX_SEARCH_OFFSET', 1):
+            first = self.search('lemon', limit=1).json
+            self.assertEqual(len(first['products']), 1)
+            self.assertIsNone(first['next'])
+        cursor = self.search('lemon', limit=1).json['next']
+        with mock.patch.object(product_search, 'MAX_SEARCH_OFFSET', 1):
+            self.assertEqual(self.search('lemon', limit=1, cursor=cursor).status_code, 400)
+
+    def test_index_follows_writes(self):
+        self.client.put('/products/3', headers=self.headers, json={'product_name': 'Iced lemon tea'})
+        self.assertEqual(sorted(self.ids('lemon')), [1, 2, 3])
+        self.assertEqual(self.ids('creme'), [])
+
+        self.client.delete('/products/2', headers=self.headers)
+        self.assertEqual(sorted(self.ids('lemon')), [1, 3])
+
+        response = self.client.post('/products/bulk', headers=self.headers, content_type='application/json',
+                                    data=json.dumps({'items': [{'product_name': 'lemon drops', 'cost': 1}]}))
+        new_id = response.json['results'][0]['id']
+        self.assertIn(new_id, self.ids('drops'))
+
+    def test_rebuild_command(self):
+        with self.app.app_context():
+            db.session.execute(db.text("INSERT INTO product_fts(product_fts) VALUES ('delete-all')"))
+            db.session.commit()
+        self.assertEqual(self.ids('lemon'), [])
+        result = self.app.test_cli_runner().invoke(args=['rebuild-search-index'])
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(self.ids('lemon'), [2, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,305 @@
+import os
+import json
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from app.main import create_app, db
+from user.user_models import User
+from product.product_models import CoinInventory, Product
+from product import purchase as purchase_module
+from product.purchase import purchase
+from utils.custom_exception_class import CustomException
+from flask_jwt_extended import create_access_token
+
+
+
+class PurchaseTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(self.tmp.name, 'db.sqlite3')}",
+            'SQLALCHEMY_ECHO': False,
+        })
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            seller = User(username='seller', email='seller@example.com', role='seller')
+            buyer = User(username='buyer', email='buyer@example.com', role='buyer', deposit=100)
+            db.session.add_all([seller, buyer])
+            db.session.commit()
+            product = Product(product_name='cola', cost=10, amount_available=5, seller_id=seller.id)
+            db.session.add(product)
+            db.session.commit()
+            self.buyer_id = buyer.id
+            self.product_id = product.id
+            self.headers = {'Authorization': f"Bearer {create_access_token(identity='buyer')}"}
+            self.seller = {'Authorization': f"Bearer {create_access_token(identity='seller')}"}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+        self.tmp.cleanup()
+
+    def buy(self, amount, **extra):
+        return self.client.post('/products/buy/product', headers=self.headers, content_type='application/json',
+                                data=json.dumps(dict(product_id=self.product_id, amount=amount, **extra)))
+
+    def state(self):
+        with self.app.app_context():
+            return (db.session.get(Product, self.product_id).amount_available,
+                    db.session.get(User, self.buyer_id).deposit)
+
+    def set_coins(self, **counts):
+        with self.app.app_context():
+            for coin, count in counts.items():
+                db.session.merge(CoinInventory(machine_id=1, coin=int(coin[1:]), count=count))
+            db.session.commit()
+
+    def coins(self):
+        with self.app.app_context():
+            return {row.coin: row.count for row in db.session.scalars(db.select(CoinInventory))}
+
+    def test_buy_decrements_stock_and_deposit(self):
+        response = self.buy(2)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['total_spent'], 20)
+        self.assertEqual(response.json['change'], {'50 cent': 1, '20 cent': 1, '10 cent': 1})
+        self.assertEqual(self.state(), (3, 0))
+
+    def test_change_comes_from_the_coin_inventory(self):
+        # greedy would take the 50 and get stuck at 10 cents
+        self.set_coins(c50=1, c20=3, c10=0)
+        response = self.buy(4)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['change'], {'20 cent': 3})
+        self.assertEqual(self.state(), (1, 0))
+        self.assertEqual(self.coins(), {50: 1, 20: 0, 10: 0})
+
+    def test_no_exact_change_buys_nothing(self):
+        self.set_coins(c50=1, c5=4)
+        response = self.buy(2)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.state(), (5, 100))
+        self.assertEqual(self.coins(), {50: 1, 5: 4})
+
+    def test_deposit_puts_the_coin_in_the_machine(self):
+        self.set_coins(c20=0, c50=2)
+        response = self.client.post('/users/deposit/money', headers=self.headers, content_type='application/json',
+                                    data=json.dumps({'amount': 20}))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.coins(), {20: 1, 50: 2})
+
+    def deposit(self, amount):
+        return self.client.post('/users/deposit/money', headers=self.headers, content_type='application/json',
+                                data=json.dumps({'amount': amount}))
+
+    def test_deposits_add_up(self):
+        self.assertEqual(self.deposit(20).status_code, 200)
+        self.assertEqual(self.deposit(5).status_code, 200)
+        self.assertEqual(self.state(), (5, 125))
+
+    def test_reset_pays_the_deposit_out(self):
+        self.set_coins(c100=0, c50=3, c20=1, c5=1)
+        response = self.client.post('/users/reset/deposit', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json[0]['change'], {'50 cent': 2})
+        self.assertEqual(self.state(), (5, 0))
+        self.assertEqual(self.coins(), {100: 0, 50: 1, 20: 1, 5: 1})
+
+    def test_reset_without_exact_change_keeps_the_deposit(self):
+        self.set_coins(c100=0, c50=1, c20=2)
+        response = self.client.post('/users/reset/deposit', headers=self.headers)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.state(), (5, 100))
+        self.assertEqual(self.coins(), {100: 0, 50: 1, 20: 2})
+
+    def test_cost_must_be_whole_cents(self):
+        response = self.client.post('/products', headers=self.seller, json={'product_name': 'tea', 'cost': 19.99})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.put(f'/products/{self.product_id}', headers=self.seller, json={'cost': 19.99})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.put(f'/products/{self.product_id}', headers=self.seller, json={'cost': 20.0})
+        self.assertEqual(response.status_code, 200)
+
+    def test_fractional_cost_is_not_blamed_on_the_coins(self):
+        with self.app.app_context():
+            db.session.get(Product, self.product_id).cost = 9.99
+            db.session.commit()
+        response = self.buy(1)
+        self.assertEqual(response.status_code, 409)
+        self.assertIn('whole number of cents', response.json['error'])
+        self.assertEqual(self.state(), (5, 100))
+
+    def test_client_deposit_is_ignored(self):
+        with self.app.app_context():
+            db.session.get(User, self.buyer_id).deposit = 5
+            db.session.commit()
+        response = self.buy(1, deposit=1000)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.state(), (5, 5))
+
+    def test_not_enough_stock(self):
+        response = self.buy(6)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.state(), (5, 100))
+
+    def test_invalid_amount(self):
+        self.assertEqual(self.buy(0).status_code, 400)
+        self.assertEqual(self.buy('2').status_code, 400)
+
+    def checkout(self, items):
+        return self.client.post('/products/checkout', headers=self.headers, content_type='application/json',
+                                data=json.dumps({'items': items}))
+
+    def add_product(self, cost, amount_available):
+        with self.app.app_context():
+            product = Product(product_name='chips', cost=cost, amount_available=amount_available,
+                              seller_id=db.session.get(Product, self.product_id).seller_id)
+            db.session.add(product)
+            db.session.commit()
+            return product.id
+
+    def test_checkout_buys_every_item(self):
+        chips_id = self.add_product(cost=5, amount_available=3)
+        response = self.checkout([
+            {'product_id': self.product_id, 'amount': 2},
+            {'product_id': chips_id, 'amount': 1},
+            {'product_id': chips_id, 'amount': 2},
+        ])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['total_spent'], 35)
+        self.assertEqual(response.json['change'], {'50 cent': 1, '10 cent': 1, '5 cent': 1})
+        self.assertEqual(self.state(), (3, 0))
+        with self.app.app_context():
+            self.assertEqual(db.session.get(Product, chips_id).amount_available, 0)
+
+    def test_checkout_is_all_or_nothing(self):
+        chips_id = self.add_product(cost=5, amount_available=1)
+        response = self.checkout([
+            {'product_id': self.product_id, 'amount': 2},
+            {'product_id': chips_id, 'amount': 2},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.state(), (5, 100))
+
+    def test_checkout_unknown_product(self):
+        response = self.checkout([{'product_id': 999, 'amount': 1}])
+        self.assertEqual(response.status_code, 404)
+
+    def test_checkout_deposit_not_enough(self):
+        chips_id = self.add_product(cost=50, amount_available=3)
+        response = self.checkout([
+            {'product_id': self.product_id, 'amount': 1},
+            {'product_id': chips_id, 'amount': 2},
+        ])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.state(), (5, 100))
+
+    def test_concurrent_buyers_never_oversell(self):
+        with self.app.app_context():
+            buyers = [User(username=f'buyer{i}', email=f'buyer{i}@example.com', role='buyer', deposit=100)
+                      for i in range(12)]
+            db.session.add_all(buyers)
+            db.session.commit()
+            buyer_ids = [buyer.id for buyer in buyers]
+        self.set_coins(c50=12, c20=12, c10=12)
+        results = []
+
+        def worker(buyer_id):
+            with self.app.app_context():
+                try:
+                    purchase(buyer_id, self.product_id, 1)
+                    results.append(True)
+                except CustomException:
+                    results.append(False)
+                finally:
+                    db.session.remove()
+
+        threads = [threading.Thread(target=worker, args=(buyer_id,)) for buyer_id in buyer_ids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count(True), 5)
+        with self.app.app_context():
+            self.assertEqual(db.session.get(Product, self.product_id).amount_available, 0)
+            deposits = sorted(db.session.get(User, buyer_id).deposit for buyer_id in buyer_ids)
+        self.assertEqual(deposits, [0] * 5 + [100] * 7)
+        self.assertEqual(self.coins(), {50: 7, 20: 2, 10: 12})
+
+    def test_deposit_is_spent_once(self):
+        results = []
+
+        def worker():
+            with self.app.app_context():
+                try:
+                    purchase(self.buyer_id, self.product_id, 1)
+                    results.append(True)
+                except CustomException:
+                    results.append(False)
+                finally:
+                    db.session.remove()
+
+        threads = [threading.Thread(target=worker) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results.count(True), 1)
+        self.assertEqual(self.state(), (4, 0))
+
+    def test_buyer_retries_when_another_buyer_holds_the_write_lock(self):
+        app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': self.app.config['SQLALCHEMY_DATABASE_URI'],
+            'SQLITE_PRAGMAS': {'busy_timeout': 0},
+        })
+        path = os.path.join(self.tmp.name, 'db.sqlite3')
+        locked, release, committed = threading.Event(), threading.Event(), threading.Event()
+
+        def other_buyer():
+            # another worker's purchase, holding the write lock until released
+            connection = sqlite3.connect(path, isolation_level=None)
+            connection.execute('BEGIN IMMEDIATE')
+            connection.execute('UPDATE product SET amount_available = amount_available - 1 WHERE id = ?',
+                               (self.product_id,))
+            locked.set()
+            release.wait()
+            connection.execute('COMMIT')
+            connection.close()
+            committed.set()
+
+        load_inventory = purchase_module.load_inventory
+        calls = []
+
+        def between_read_and_write(*args):
+            calls.append(1)
+            if len(calls) == 1:
+                threading.Thread(target=other_buyer).start()
+                self.assertTrue(locked.wait(5))
+            else:
+                release.set()
+                self.assertTrue(committed.wait(5))
+            return load_inventory(*args)
+
+        with app.app_context(), mock.patch.object(purchase_module, 'load_inventory', between_read_and_write):
+            try:
+                receipt = purchase(self.buyer_id, self.product_id, 2)
+            finally:
+                release.set()
+                db.session.remove()
+                db.engine.dispose()
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(receipt['total_cost'], 20)
+        self.assertEqual(self.state(), (2, 0))
+
+if __name__ == '__main__':
+    unittest.main()
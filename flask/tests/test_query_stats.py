@@ -0,0 +1,116 @@
+import time
+import unittest
+from app.main import create_app, db
+from app.query_stats import count_queries, statement_shape
+from user.user_models import User
+from product.product_models import Product
+from flask_jwt_extended import create_access_token
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+
+
+class QueryStatsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'SQLALCHEMY_ECHO': False,
+            'QUERY_STATS_HEADERS': True,
+            'QUERY_REPEAT_THRESHOLD': 3,
+        })
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            seller = User(username='seller', email='seller@example.com', role='seller')
+            buyer = User(username='buyer', email='buyer@example.com', role='buyer', deposit=100)
+            db.session.add_all([seller, buyer])
+            db.session.flush()
+            db.session.add_all(
+                Product(product_name=f'item {i}', cost=5, amount_available=10, seller_id=seller.id)
+                for i in range(5)
+            )
+            db.session.commit()
+            self.seller = {'Authorization': f"Bearer {create_access_token(identity='seller')}"}
+            self.buyer = {'Authorization': f"Bearer {create_access_token(identity='buyer')}"}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def assertQueryBudget(self, budget, method, url, headers, json=None, prepare=None):
+        # the first call fills the blocklist and identity caches. json may be a
+        # function of the call number, so that every write changes something
+        body = json if callable(json) else (lambda call: json)
+        prepare = prepare or (lambda: None)
+        prepare()
+        getattr(self.client, method)(url, headers=headers, json=body(0))
+        prepare()
+        with count_queries() as queries:
+            response = getattr(self.client, method)(url, headers=headers, json=body(1))
+        self.assertLess(response.status_code, 400, response.json)
+        self.assertEqual(len(queries), budget, queries.statements)
+        self.assertEqual(response.headers['X-Query-Count'], str(len(queries)))
+
+    def refill_deposit(self):
+        with self.app.app_context():
+            db.session.execute(db.update(User).where(User.username == 'buyer').values(deposit=100))
+            db.session.commit()
+
+    def test_query_budgets(self):
+        # the table counter lookup comes first, it answers conditional gets alone
+        self.assertQueryBudget(2, 'get', '/products', self.seller)
+        self.assertQueryBudget(1, 'get', '/products/1', self.seller)
+        # load, update, table_version and the refresh for the response
+        self.assertQueryBudget(4, 'put', '/products/1', self.seller, lambda call: {'cost': 6 + call})
+        # the deposit and the machine's coins are read to solve the change,
+        # plus one table_version update for product and users before the
+        # commit. the cached identity is kept, a buy changes none of its
+        # fields. a buy spends the whole deposit so it is refilled before each one
+        self.assertQueryBudget(6, 'post', '/products/buy/product', self.buyer, {'product_id': 2, 'amount': 1},
+                               prepare=self.refill_deposit)
+        self.assertQueryBudget(1, 'get', '/users/1', self.seller)
+
+    def test_headers(self):
+        response = self.client.get('/products', headers=self.seller)
+        self.assertGreaterEqual(int(response.headers['X-Query-Count']), 1)
+        self.assertGreaterEqual(float(response.headers['X-Query-Time-Ms']), 0)
+
+        self.app.extensions['query_stats'].headers = False
+        self.assertNotIn('X-Query-Count', self.client.get('/products', headers=self.seller).headers)
+
+    def test_repeated_statement_is_logged(self):
+        @self.app.route('/n-plus-one')
+        def n_plus_one():
+            return {'names': [db.session.get(Product, i).product_name for i in range(1, 5)]}
+
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            self.client.get('/n-plus-one')
+        self.assertIn('ran the same statement 4 times', logs.output[0])
+
+    def test_failed_statement_does_not_skew_timings(self):
+        with self.app.app_context():
+            with db.engine.connect() as connection:
+                with self.assertRaises(OperationalError):
+                    connection.execute(text('SELECT * FROM missing_table'))
+                started = time.perf_counter()
+                with count_queries() as queries:
+                    connection.execute(text('SELECT 1'))
+                elapsed = time.perf_counter() - started
+        self.assertEqual(len(queries), 1)
+        self.assertLessEqual(queries.seconds, elapsed)
+
+    def test_statement_shape(self):
+        self.assertEqual(
+            statement_shape('SELECT * FROM product WHERE id IN (?, ?, ?)'),
+            statement_shape('SELECT * FROM product\nWHERE id IN (?, ?)'),
+        )
+        self.assertEqual(
+            statement_shape('INSERT INTO product (a, b) VALUES (?, ?), (?, ?), (?, ?)'),
+            'INSERT INTO product (a, b) VALUES (?)',
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()
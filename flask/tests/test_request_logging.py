@@ -0,0 +1,131 @@
+import json
+import os
+import tempfile
+import unittest
+import logging
+from unittest import mock
+from app.main import create_app, db
+from flask import abort, jsonify, request
+from logs import logger_utils
+from logs.logger_utils import EnqueueHandler, flush_loggers, restart_loggers, setup_logger
+from logs.logging_aspects import view_logging_aspect
+
+LOG_DIR = tempfile.mkdtemp()
+LOG_FILE = os.path.join(LOG_DIR, 'requests.log')
+TEST_LOGGER = 'test_request_logger'
+
+
+
+class RequestLoggingTestCase(unittest.TestCase):
+    def setUp(self):
+        open(LOG_FILE, 'w').close()
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'SQLALCHEMY_ECHO': False,
+            'LOG_PAYLOAD_MAX_BYTES': 16,
+        })
+
+        @self.app.route('/logged', methods=['GET', 'POST'])
+        @view_logging_aspect(TEST_LOGGER, LOG_FILE)
+        def logged():
+            if request.args.get('fail'):
+                raise ValueError('boom')
+            if request.args.get('missing'):
+                abort(404)
+            return jsonify({'ok': True}), 201 if request.method == 'POST' else 200
+
+        self.client = self.app.test_client()
+
+    def records(self):
+        flush_loggers()
+        with open(LOG_FILE) as f:
+            return [json.loads(line) for line in f]
+
+    def test_write_is_logged_as_json_line(self):
+        self.client.post('/logged', data=json.dumps({'description': 'x' * 100}), content_type='application/json')
+        [record] = self.records()
+        self.assertEqual(record['method'], 'POST')
+        self.assertEqual(record['endpoint'], 'logged')
+        self.assertEqual(record['status'], 201)
+        self.assertEqual(len(record['payload']), 16)
+
+    def test_successful_reads_are_sampled(self):
+        self.client.get('/logged')
+        self.assertEqual(self.records(), [])
+        self.app.config['LOG_READ_SAMPLE_RATE'] = 1.0
+        self.client.get('/logged')
+        self.assertEqual(len(self.records()), 1)
+
+    def test_exception_is_logged(self):
+        self.app.config['PROPAGATE_EXCEPTIONS'] = False
+        self.client.get('/logged?fail=1')
+        [record] = self.records()
+        self.assertEqual(record['level'], 'ERROR')
+        self.assertIn('ValueError: boom', record['exception'])
+
+    def test_http_error_is_not_logged_as_crash(self):
+        self.client.post('/logged?missing=1')
+        [record] = self.records()
+        self.assertEqual(record['level'], 'WARNING')
+        self.assertEqual(record['status'], 404)
+        self.assertNotIn('exception', record)
+
+    def test_secrets_are_redacted(self):
+        self.app.config['LOG_PAYLOAD_MAX_BYTES'] = 1024
+        body = {
+            'username': 'jane',
+            'password': 'hunter2',
+            'refresh_token': 'r',
+            'items': [{'api_secret': 's', 'amount': 1}],
+        }
+        self.client.post('/logged', data=json.dumps(body), content_type='application/json')
+        [record] = self.records()
+        self.assertNotIn('hunter2', json.dumps(record))
+        self.assertEqual(json.loads(record['payload']), {
+            'username': 'jane',
+            'password': '[redacted]',
+            'refresh_token': '[redacted]',
+            'items': [{'api_secret': '[redacted]', 'amount': 1}],
+        })
+
+    def test_large_body_is_logged_by_size(self):
+        self.app.config['LOG_PAYLOAD_MAX_BODY_BYTES'] = 64
+        body = json.dumps({'items': [{'product_name': 'x'}] * 10})
+        with mock.patch('logs.logging_aspects._redact') as redact:
+            self.client.post('/logged', data=body, content_type='application/json')
+        [record] = self.records()
+        redact.assert_not_called()
+        self.assertNotIn('payload', record)
+        self.assertEqual(record['content_length'], len(body))
+
+    def test_payload_is_redacted_off_the_request_thread(self):
+        with mock.patch('logs.logging_aspects._redact', side_effect=lambda body: body) as redact:
+            self.client.post('/logged', data=json.dumps({'a': 1}), content_type='application/json')
+            redact.assert_not_called()
+            self.records()
+        redact.assert_called_with({'a': 1})
+
+    def test_forked_worker_writes_its_own_file(self):
+        log_file = os.path.join(LOG_DIR, 'worker.log')
+        with mock.patch.dict(logger_utils._listeners, clear=True):
+            logger = setup_logger('test_worker_logger', log_file)
+            restart_loggers()
+            logger.info('from the worker')
+            flush_loggers()
+            [listener] = logger_utils._listeners.values()
+            listener.stop()
+        self.assertFalse(os.path.exists(log_file))
+        with open(os.path.join(LOG_DIR, f'worker.{os.getpid()}.log')) as f:
+            self.assertEqual(json.loads(f.read())['message'], 'from the worker')
+
+    def test_setup_logger_adds_one_handler(self):
+        setup_logger(TEST_LOGGER, LOG_FILE)
+        setup_logger(TEST_LOGGER, LOG_FILE)
+        # count only ours, pytest adds its capture handlers to every logger
+        handlers = [h for h in logging.getLogger(TEST_LOGGER).handlers if isinstance(h, EnqueueHandler)]
+        self.assertEqual(len(handlers), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
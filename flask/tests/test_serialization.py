@@ -0,0 +1,80 @@
+import json
+import unittest
+from datetime import datetime
+from app.main import create_app, db
+from schemas import ProductSchema, UserSchema, product_serializer
+from user.user_models import Role, User
+from product.product_models import Product
+from utils.serialization import Serializer
+from flask_jwt_extended import create_access_token
+from flask.json.provider import DefaultJSONProvider
+from marshmallow import Schema, fields
+
+
+
+class SerializationTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'SQLALCHEMY_ECHO': False,
+        })
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            seller = User(username='seller', email='seller@example.com', role='seller', deposit=20)
+            db.session.add(seller)
+            db.session.flush()
+            db.session.add(Product(product_name='tea', cost=5.5, amount_available=None, description='green', seller_id=seller.id))
+            db.session.commit()
+            self.headers = {'Authorization': f"Bearer {create_access_token(identity='seller')}"}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_to_dict_matches_schema(self):
+        products = [
+            Product(id=i, product_name=f'p{i}', cost=i * 1.5, amount_available=None if i % 3 else i / 2,
+                    description=None, seller_id=1)
+            for i in range(10)
+        ]
+        self.assertEqual([p.to_dict() for p in products], ProductSchema().dump(products, many=True))
+        self.assertEqual(product_serializer.dump(products, many=True), ProductSchema().dump(products, many=True))
+        user = User(id=1, username='u', email='u@example.com', deposit=7.5, role=Role.buyer)
+        self.assertEqual(user.to_dict(), UserSchema().dump(user))
+
+    def test_other_fields_use_the_schema(self):
+        class EventSchema(Schema):
+            name = fields.String(data_key='title')
+            at = fields.DateTime()
+            ok = fields.Boolean()
+
+        class Event:
+            name, at, ok = 'launch', datetime(2024, 5, 1, 12), 1
+
+        self.assertEqual(Serializer(EventSchema()).dump(Event()), EventSchema().dump(Event()))
+
+    def test_get_product(self):
+        response = self.client.get('/products/1', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json, {
+            'id': 1, 'product_name': 'tea', 'cost': 5, 'amount_available': None,
+            'description': 'green', 'seller_id': 1,
+        })
+
+    def test_json_provider_matches_default(self):
+        data = {'b': [1, 2.5, None], 'a': {'date': datetime(2024, 5, 1, 12)}, 'text': 'café'}
+        default = DefaultJSONProvider(self.app)
+        self.assertEqual(self.app.json.loads(self.app.json.dumps(data)), json.loads(default.dumps(data)))
+        self.assertTrue(self.app.json.dumps(data).startswith('{"a"'))
+        with self.app.test_request_context():
+            response = self.app.json.response(data)
+        self.assertEqual(response.mimetype, 'application/json')
+        self.assertEqual(response.json['a']['date'], 'Wed, 01 May 2024 12:00:00 GMT')
+        self.assertEqual(self.app.json.dumps(data, indent=1), default.dumps(data, indent=1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+import importlib.util
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import textwrap
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+from app.main import create_app, db
+from app.server import DRAINING, READY, STARTING, drain_on_sigterm, get_readiness, warm_up
+
+
+FLASK_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SERVE_APP = textwrap.dedent('''
+    import os, time
+    from app.main import create_app, db
+
+    app = create_app({{
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///{path}',
+        'SQLALCHEMY_ECHO': False,
+    }})
+
+    @app.route('/slow')
+    def slow():
+        time.sleep(1)
+        return {{'pid': os.getpid()}}
+
+    with app.app_context():
+        db.create_all()
+''')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class ReadinessTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'SQLALCHEMY_ECHO': False,
+        })
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_not_ready_before_warm_up(self):
+        response = self.client.get('/ready')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json, {'status': STARTING, 'pid': os.getpid()})
+
+    def test_not_ready_while_draining(self):
+        get_readiness(self.app).state = DRAINING
+        response = self.client.get('/ready')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json['status'], DRAINING)
+
+    def test_drain_on_sigterm(self):
+        stopped = threading.Event()
+        previous = signal.signal(signal.SIGTERM, lambda signum, frame: stopped.set())
+        self.addCleanup(signal.signal, signal.SIGTERM, previous)
+        warm_up(self.app)
+        drain_on_sigterm(self.app, 0.2)
+
+        os.kill(os.getpid(), signal.SIGTERM)
+        # still serving, the load balancer sees the worker draining
+        self.assertFalse(stopped.is_set())
+        response = self.client.get('/ready')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json['status'], DRAINING)
+        # then the worker's own handler stops it
+        self.assertTrue(stopped.wait(5))
+
+    def test_warm_up_connects(self):
+        warm_up(self.app)
+        response = self.client.get('/ready')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json['status'], READY)
+
+
+@unittest.skipUnless(importlib.util.find_spec('gunicorn'), 'needs gunicorn')
+class GunicornTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.port = free_port()
+        with open(os.path.join(self.tmp.name, 'serve_app.py'), 'w') as f:
+            f.write(SERVE_APP.format(path=os.path.join(self.tmp.name, 'db.sqlite3')))
+        env = dict(
+            os.environ, PYTHONPATH=os.pathsep.join([FLASK_DIR, self.tmp.name]), GUNICORN_DRAIN_DELAY='1',
+        )
+        self.process = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', os.path.join(FLASK_DIR, 'gunicorn.conf.py'),
+             '--bind', f'127.0.0.1:{self.port}', '--workers', '2', '--max-requests', '5',
+             '--max-requests-jitter', '0', '--graceful-timeout', '5', 'serve_app:app'],
+            cwd=self.tmp.name, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        self.addCleanup(self.tmp.cleanup)
+        self.addCleanup(self.stop)
+
+    def stop(self):
+        if self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
+        self.process.stderr.close()
+
+    def get(self, path):
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{self.port}{path}', timeout=5) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def wait_ready(self):
+        deadline = time.monotonic() + 20
+        while time.monotonic() < deadline:
+            try:
+                status, body = self.get('/ready')
+                if status == 200:
+                    return body
+            except OSError:
+                pass
+            time.sleep(0.1)
+        self.fail('server did not become ready')
+
+    def test_workers_are_recycled_and_drained(self):
+        body = self.wait_ready()
+        self.assertEqual(body['status'], READY)
+        self.assertNotEqual(body['pid'], self.process.pid)
+
+        # 2 workers recycled after 5 requests each
+        pids = {self.get('/ready')[1]['pid'] for _ in range(30)}
+        self.assertGreater(len(pids), 2)
+
+        result = {}
+        request = threading.Thread(target=lambda: result.update(slow=self.get('/slow')))
+        request.start()
+        time.sleep(0.3)
+        self.process.send_signal(signal.SIGTERM)
+        time.sleep(0.3)
+        # the other worker keeps serving for the drain delay, reporting draining
+        status, body = self.get('/ready')
+        self.assertEqual((status, body['status']), (503, DRAINING))
+        request.join()
+        self.assertEqual(self.process.wait(timeout=15), 0)
+        # the request in flight was answered before the worker exited
+        self.assertEqual(result['slow'][0], 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,222 @@
+import os
+import tempfile
+import time
+import unittest
+import uuid
+from app.main import create_app, db
+from user.user_models import TokenBlocklist, TokenBlocklistVersion, User, jti_key
+from user.blocklist_cache import TokenBlocklistCache, get_blocklist_cache
+from user.blocklist_purge import get_blocklist_purger, purge_expired_tokens
+from sqlalchemy import event
+from flask_jwt_extended import create_access_token, decode_token
+
+
+
+class TokenBlocklistCacheTestCase(unittest.TestCase):
+    def setUp(self):
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': 'sqlite:///:memory:',
+            'SQLALCHEMY_ECHO': False,
+            'BLOCKLIST_SYNC_INTERVAL': 3600,
+        })
+        self.client = self.app.test_client()
+        with self.app.app_context():
+            db.create_all()
+            db.session.add(User(username='testuser', email='test@example.com', role='buyer'))
+            db.session.commit()
+            self.headers = {'Authorization': f"Bearer {create_access_token(identity='testuser')}"}
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def count_statements(self):
+        statements = []
+        with self.app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+        return statements
+
+    def test_logout_revokes_token(self):
+        response = self.client.get('/users/logout', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get('/users/current/user', headers=self.headers)
+        self.assertEqual(response.status_code, 401)
+        with self.app.app_context():
+            row = TokenBlocklist.query.one()
+        self.assertEqual(len(row.jti), 16)
+        self.assertGreater(row.exp, time.time())
+
+    def test_double_logout(self):
+        # a second worker that has not synced the first logout yet
+        with self.app.app_context():
+            other_worker = TokenBlocklistCache(sync_interval=3600)
+            other_worker.sync(force=True)
+        self.assertEqual(self.client.get('/users/logout', headers=self.headers).status_code, 200)
+        self.app.extensions['token_blocklist_cache'] = other_worker
+        response = self.client.get('/users/logout', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        with self.app.app_context():
+            self.assertEqual(TokenBlocklist.query.count(), 1)
+            self.assertTrue(other_worker.is_revoked(decode_token(self.headers['Authorization'][7:])['jti']))
+
+    def test_jti_key(self):
+        jti = str(uuid.uuid4())
+        self.assertEqual(jti_key(jti), uuid.UUID(jti).bytes)
+        self.assertEqual(len(jti_key('not-a-uuid')), 16)
+        self.assertNotEqual(jti_key('not-a-uuid'), jti_key('not-a-uuid2'))
+
+    def test_not_revoked_lookup_skips_database(self):
+        self.client.get('/users/current/user', headers=self.headers)
+        statements = self.count_statements()
+        with self.app.app_context():
+            self.assertFalse(get_blocklist_cache().is_revoked('unknown-jti'))
+        self.assertEqual(statements, [])
+
+    def test_other_worker_revocation_is_synced(self):
+        other_worker = TokenBlocklistCache(sync_interval=0)
+        with self.app.app_context():
+            cache = get_blocklist_cache()
+            cache.sync(force=True)
+            other_worker.revoke('revoked-elsewhere')
+            self.assertFalse(cache.is_revoked('revoked-elsewhere'))
+            cache.sync(force=True)
+            self.assertTrue(cache.is_revoked('revoked-elsewhere'))
+
+    def test_create_app_does_not_touch_the_database(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'db.sqlite3')
+            config = {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}', 'SQLALCHEMY_ECHO': False}
+            app = create_app(config)
+            self.assertFalse(os.path.exists(path))
+
+            with app.app_context():
+                db.create_all()
+                get_blocklist_cache().revoke('revoked-before-start')
+                db.engine.dispose()
+            app = create_app(config)
+            with app.app_context():
+                cache = get_blocklist_cache()
+                self.assertEqual(len(cache), 0)
+                # loaded on first use
+                self.assertTrue(cache.is_revoked('revoked-before-start'))
+                db.engine.dispose()
+
+    def test_version_row_is_created_with_the_table(self):
+        with self.app.app_context():
+            self.assertEqual(TokenBlocklistVersion.current(), 0)
+            TokenBlocklistVersion.bump()
+            db.session.commit()
+            self.assertEqual(TokenBlocklistVersion.current(), 1)
+
+    def test_version_insert_race(self):
+        with self.app.app_context():
+            db.session.execute(db.delete(TokenBlocklistVersion))
+            db.session.commit()
+
+            # another first revocation inserts the row between our update and insert
+            def insert_first(conn, cursor, statement, parameters, context, executemany):
+                if statement.startswith('UPDATE token_blocklist_version') and not cursor.rowcount:
+                    conn.connection.cursor().execute('INSERT INTO token_blocklist_version (id, version) VALUES (1, 1)')
+
+            event.listen(db.engine, 'after_cursor_execute', insert_first)
+            try:
+                TokenBlocklistVersion.bump()
+            finally:
+                event.remove(db.engine, 'after_cursor_execute', insert_first)
+            db.session.commit()
+            self.assertEqual(TokenBlocklistVersion.current(), 2)
+
+
+class TokenBlocklistPurgeTestCase(unittest.TestCase):
+    def setUp(self):
+        # the purger thread opens its own connection, a :memory: database
+        # would share one with the test
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(self.tmp.name, 'db.sqlite3')}",
+            'SQLALCHEMY_ECHO': False,
+            'BLOCKLIST_SYNC_INTERVAL': 3600,
+            'BLOCKLIST_PURGE_INTERVAL': 0.01,
+        })
+        now = int(time.time())
+        with self.app.app_context():
+            db.create_all()
+            cache = get_blocklist_cache()
+            for i in range(5):
+                cache.revoke(f'expired-{i}', exp=now - 60)
+            cache.revoke('live', exp=now + 600)
+            cache.revoke('no-exp')
+
+    def tearDown(self):
+        get_blocklist_purger(self.app).stop()
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+
+    def remaining(self):
+        with self.app.app_context():
+            keys = set(db.session.execute(db.select(TokenBlocklist.jti)).scalars())
+        return {jti for jti in ('expired-0', 'live', 'no-exp') if jti_key(jti) in keys}
+
+    def test_purge_deletes_expired_rows_in_batches(self):
+        with self.app.app_context():
+            self.assertEqual(purge_expired_tokens(batch_size=2), 5)
+            self.assertEqual(purge_expired_tokens(batch_size=2), 0)
+        self.assertEqual(self.remaining(), {'live', 'no-exp'})
+
+    def test_leeway_keeps_rows(self):
+        self.app.config['JWT_DECODE_LEEWAY'] = 120
+        with self.app.app_context():
+            self.assertEqual(purge_expired_tokens(), 0)
+
+    def test_cache_drops_expired_tokens(self):
+        with self.app.app_context():
+            cache = get_blocklist_cache()
+            cache.sync(force=True)
+            self.assertEqual(len(cache), 2)
+            self.assertTrue(cache.is_revoked('live'))
+            self.assertTrue(cache.is_revoked('no-exp'))
+            self.assertFalse(cache.is_revoked('expired-0'))
+
+            fresh = TokenBlocklistCache()
+            fresh.sync(force=True)
+            self.assertEqual(len(fresh), 2)
+
+    def test_revocation_after_purge_is_synced(self):
+        other_worker = TokenBlocklistCache(sync_interval=0)
+        with self.app.app_context():
+            cache = get_blocklist_cache()
+            other_worker.revoke('short-lived', exp=int(time.time()) + 600)
+            cache.sync(force=True)
+            self.assertTrue(cache.is_revoked('short-lived'))
+
+            # the newest row expires and is purged, its id must not be reused
+            db.session.execute(
+                db.update(TokenBlocklist).where(TokenBlocklist.jti == jti_key('short-lived')).values(exp=0)
+            )
+            db.session.commit()
+            self.assertEqual(purge_expired_tokens(), 6)
+            other_worker.revoke('after-purge')
+            cache.sync(force=True)
+            self.assertTrue(cache.is_revoked('after-purge'))
+
+    def test_command(self):
+        result = self.app.test_cli_runner().invoke(args=['purge-blocklist', '--batch-size', '3'])
+        self.assertIn('purged 5 expired tokens', result.output)
+
+    def test_background_purge(self):
+        get_blocklist_purger(self.app).start()
+        deadline = time.monotonic() + 5
+        while 'expired-0' in self.remaining() and time.monotonic() < deadline:
+            time.sleep(0.01)
+        get_blocklist_purger(self.app).stop()
+        self.assertEqual(self.remaining(), {'live', 'no-exp'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+import threading
+import time
+from datetime import timedelta
+
+from flask import current_app
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+
+from app.config import db
+from user.user_models import TokenBlocklist, TokenBlocklistVersion, jti_key
+
+
+DEFAULT_SYNC_INTERVAL = 5.0
+
+
+def expiry_cutoff(now=None):
+    """
+    unix time from which on a token with an exp before it is rejected as
+    expired anyway, JWT_DECODE_LEEWAY keeps tokens valid that much longer.
+    """
+    leeway = current_app.config.get("JWT_DECODE_LEEWAY", 0)
+    if isinstance(leeway, timedelta):
+        leeway = leeway.total_seconds()
+    return int((time.time() if now is None else now) - leeway)
+
+
+class TokenBlocklistCache:
+    """
+    process local set of revoked jti (as jti_key()).
+
+    a jti missing from the set is "not revoked" without a database query.
+    the set is refreshed at most every sync_interval seconds by reading the
+    TokenBlocklistVersion counter (one primary key lookup) and, only when it
+    moved, loading the rows added since the last sync. revocations made by
+    this process are visible immediately, revocations made by other workers
+    after at most sync_interval seconds. expired tokens are dropped from
+    the set, like the purge drops their rows.
+    """
+
+    def __init__(self, sync_interval=DEFAULT_SYNC_INTERVAL):
+        self.sync_interval = sync_interval
+        # jti key -> exp
+        self._jtis = {}
+        # earliest exp in _jtis, nothing to drop before it
+        self._next_expiry = None
+        self._last_id = 0
+        self._version = None
+        self._loaded = False
+        self._next_sync = 0.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.sync_interval = app.config.get("BLOCKLIST_SYNC_INTERVAL", self.sync_interval)
+        app.extensions["token_blocklist_cache"] = self
+
+    def warm(self):
+        """
+        load the whole blocklist now instead of on the first is_revoked(),
+        only called by the explicit warm_up() of a worker. create_app() never
+        touches the database.
+        """
+        self.sync(force=True)
+
+    def is_revoked(self, jti):
+        if time.monotonic() >= self._next_sync:
+            self.sync()
+        return jti_key(jti) in self._jtis
+
+    def revoke(self, jti, exp=None):
+        key = jti_key(jti)
+        try:
+            TokenBlocklist(jti=key, exp=exp).save()
+        except IntegrityError:
+            # revoked already, by a worker this one has not synced with yet
+            db.session.rollback()
+        # sync() may be rebuilding the set in another thread
+        with self._lock:
+            self._add(key, exp)
+
+    def _add(self, key, exp):
+        self._jtis[key] = exp
+        if exp is not None and (self._next_expiry is None or exp < self._next_expiry):
+            self._next_expiry = exp
+
+    def _drop_expired(self, cutoff):
+        self._jtis = {key: exp for key, exp in self._jtis.items() if exp is None or exp >= cutoff}
+        self._next_expiry = min((exp for exp in self._jtis.values() if exp is not None), default=None)
+
+    def sync(self, force=False):
+        with self._lock:
+            now = time.monotonic()
+            if not force and now < self._next_sync:
+                return
+            cutoff = expiry_cutoff()
+            version = TokenBlocklistVersion.current()
+            if force or not self._loaded or version != self._version:
+                rows = db.session.execute(
+                    db.select(TokenBlocklist.id, TokenBlocklist.jti, TokenBlocklist.exp)
+                    .where(TokenBlocklist.id > self._last_id)
+                    .where(or_(TokenBlocklist.exp.is_(None), TokenBlocklist.exp >= cutoff))
+                    .order_by(TokenBlocklist.id)
+                ).all()
+                for row_id, key, exp in rows:
+                    self._add(key, exp)
+                    self._last_id = row_id
+                self._version = version
+                self._loaded = True
+            if self._next_expiry is not None and self._next_expiry < cutoff:
+                self._drop_expired(cutoff)
+            self._next_sync = now + self.sync_interval
+
+    def __len__(self):
+        return len(self._jtis)
+
+
+def get_blocklist_cache():
+    return current_app.extensions["token_blocklist_cache"]
@@ -0,0 +1,122 @@
+import logging
+import random
+import threading
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from app.config import db
+from user.blocklist_cache import expiry_cutoff
+from user.user_models import TokenBlocklist
+
+
+DEFAULT_PURGE_INTERVAL = 300.0
+DEFAULT_PURGE_BATCH = 500
+# between two batches, lets the logouts waiting for the write lock in
+DEFAULT_PURGE_PAUSE = 0.05
+
+logger = logging.getLogger(__name__)
+
+
+def purge_batch(batch_size=DEFAULT_PURGE_BATCH, cutoff=None):
+    """
+    delete up to batch_size expired blocklist rows in one transaction,
+    oldest exp first. returns the number deleted.
+    """
+    cutoff = expiry_cutoff() if cutoff is None else cutoff
+    expired = (
+        db.select(TokenBlocklist.id)
+        .where(TokenBlocklist.exp < cutoff)
+        .order_by(TokenBlocklist.exp)
+        .limit(batch_size)
+    )
+    deleted = db.session.execute(
+        db.delete(TokenBlocklist).where(TokenBlocklist.id.in_(expired.scalar_subquery())),
+        execution_options={"synchronize_session": False},
+    ).rowcount
+    db.session.commit()
+    return deleted
+
+
+def purge_expired_tokens(batch_size=DEFAULT_PURGE_BATCH, pause=0.0, stop=None):
+    """
+    delete every blocklist row past its exp, batch_size rows per
+    transaction so no write waits long for the lock. stop is an optional
+    threading.Event ending the purge between two batches.
+    """
+    stop = stop or threading.Event()
+    cutoff = expiry_cutoff()
+    purged = 0
+    while True:
+        deleted = purge_batch(batch_size, cutoff)
+        purged += deleted
+        if deleted < batch_size or stop.wait(pause):
+            return purged
+
+
+class BlocklistPurger:
+    """
+    background thread running purge_expired_tokens() every interval seconds.
+
+    config:
+    BLOCKLIST_PURGE_INTERVAL: seconds between purges, 0 disables the thread
+    BLOCKLIST_PURGE_BATCH: rows deleted per transaction
+
+    started in every gunicorn worker (start_worker()), every worker purges
+    (the deletes are idempotent) at its own random offset. without them run
+    `flask purge-blocklist` from cron.
+    """
+
+    def __init__(self):
+        self.app = None
+        self.interval = DEFAULT_PURGE_INTERVAL
+        self.batch_size = DEFAULT_PURGE_BATCH
+        self._thread = None
+        self._stop = threading.Event()
+
+    def init_app(self, app):
+        self.app = app
+        self.interval = app.config.get("BLOCKLIST_PURGE_INTERVAL", self.interval)
+        self.batch_size = app.config.get("BLOCKLIST_PURGE_BATCH", self.batch_size)
+        app.extensions["blocklist_purger"] = self
+
+    def start(self):
+        if not self.interval or self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="blocklist-purge", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def _run(self):
+        # workers start together, spread their purges over the interval
+        delay = random.uniform(0, self.interval)
+        while not self._stop.wait(delay):
+            try:
+                with self.app.app_context():
+                    purged = purge_expired_tokens(self.batch_size, DEFAULT_PURGE_PAUSE, self._stop)
+                if purged:
+                    logger.info("purged %s expired blocklist rows", purged)
+            except Exception:
+                logger.exception("blocklist purge failed")
+            delay = self.interval
+
+
+def get_blocklist_purger(app=None):
+    return (app or current_app).extensions["blocklist_purger"]
+
+
+@click.command("purge-blocklist")
+@click.option("--batch-size", default=DEFAULT_PURGE_BATCH, show_default=True, type=int)
+@with_appcontext
+def purge_blocklist_command(batch_size):
+    """Delete the revoked tokens past their expiry."""
+    purged = purge_expired_tokens(batch_size, DEFAULT_PURGE_PAUSE)
+    click.echo(f"purged {purged} expired tokens")
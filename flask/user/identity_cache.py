@@ -0,0 +1,109 @@
+import threading
+import time
+from collections import OrderedDict
+
+from flask import current_app
+from flask_login import UserMixin
+
+from app.config import db
+from user.user_models import User
+
+
+DEFAULT_MAX_SIZE = 10000
+# also the longest another worker honours a deleted user or an old role
+DEFAULT_TTL = 5.0
+
+
+class CachedUser(UserMixin):
+    """
+    slim read only copy of a User row, enough for jwt identity, role checks
+    and ownership checks. the deposit is not copied, other workers would
+    serve a stale balance until the entry expires, call load() to read it or
+    to get the ORM object before changing it.
+    """
+
+    def __init__(self, id, username, email, role):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.role = role
+
+    @classmethod
+    def from_user(cls, user):
+        return cls(user.id, user.username, user.email, user.role)
+
+    def load(self):
+        """
+        the User row, None when it was deleted since it was cached.
+        """
+        return db.session.get(User, self.id)
+
+    def __repr__(self):
+        return f"<CachedUser {self.username}>"
+
+
+class UserIdentityCache:
+    """
+    bounded LRU + TTL cache of CachedUser keyed by jwt identity (username)
+    and by id. views changing a cached field (username, email, role) or
+    deleting a user call invalidate() so this worker never serves a stale
+    record, a deposit or a purchase changes none of them. the cache is per
+    process though, the other workers keep their copy until it expires: for
+    up to ttl seconds after a user was deleted or got another role, a token
+    of that user still authenticates there with the old role. keep USER_CACHE_TTL short, a hit
+    saves one primary key lookup and a few seconds already absorb a burst.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, ttl=DEFAULT_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.max_size = app.config.get("USER_CACHE_MAX_SIZE", self.max_size)
+        self.ttl = app.config.get("USER_CACHE_TTL", self.ttl)
+        app.extensions["user_identity_cache"] = self
+
+    def resolve(self, username):
+        return self._resolve(("username", username), lambda: User.get_user_by_username(username))
+
+    def resolve_id(self, user_id):
+        return self._resolve(("id", int(user_id)), lambda: db.session.get(User, int(user_id)))
+
+    def invalidate(self, user):
+        with self._lock:
+            self._entries.pop(("id", user.id), None)
+            self._entries.pop(("username", user.username), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _resolve(self, key, loader):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                return entry[1]
+
+        user = loader()
+        if user is None:
+            return None
+        record = CachedUser.from_user(user)
+        with self._lock:
+            expires_at = now + self.ttl
+            self._entries[("id", record.id)] = (expires_at, record)
+            self._entries[("username", record.username)] = (expires_at, record)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return record
+
+    def __len__(self):
+        return len(self._entries)
+
+
+def get_identity_cache():
+    return current_app.extensions["user_identity_cache"]
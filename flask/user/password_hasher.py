@@ -0,0 +1,90 @@
+import os
+import threading
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+from utils.custom_exception_class import CustomException
+
+
+# werkzeug method string, "scrypt:32768:8:1" or "pbkdf2:sha256:600000" ...
+DEFAULT_METHOD = "scrypt"
+DEFAULT_MAX_QUEUE = 64
+DEFAULT_TIMEOUT = 10.0
+
+
+class PasswordHasher:
+    """
+    hash and verify passwords with bounded concurrency.
+
+    the hash runs synchronously in the request thread, nothing is offloaded.
+    a semaphore lets at most workers hashes run at once (hashlib releases the
+    GIL, so they use several cores) and at most max_queue more wait for a
+    turn, above that the call fails fast with 503 instead of piling up
+    behind a login burst.
+
+    config:
+    PASSWORD_HASH_METHOD: werkzeug method string (algorithm and cost)
+    PASSWORD_HASH_WORKERS: hashes running at once (default cpu count)
+    PASSWORD_HASH_MAX_QUEUE: hashes allowed to wait for a turn
+    PASSWORD_HASH_TIMEOUT: seconds a request waits for its turn
+    """
+
+    def __init__(self, method=DEFAULT_METHOD, workers=None, max_queue=DEFAULT_MAX_QUEUE, timeout=DEFAULT_TIMEOUT):
+        self.method = method
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self._running = None
+        self._slots = None
+        self._pid = None
+        self._prefix = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.method = app.config.get("PASSWORD_HASH_METHOD", self.method)
+        self.workers = app.config.get("PASSWORD_HASH_WORKERS", self.workers)
+        self.max_queue = app.config.get("PASSWORD_HASH_MAX_QUEUE", self.max_queue)
+        self.timeout = app.config.get("PASSWORD_HASH_TIMEOUT", self.timeout)
+        app.extensions["password_hasher"] = self
+
+    def _call(self, function, *args):
+        with self._lock:
+            # a semaphore held by another thread at fork stays taken in the child
+            if self._running is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._running = threading.BoundedSemaphore(self.workers)
+                self._slots = threading.BoundedSemaphore(self.workers + self.max_queue)
+        if not self._slots.acquire(blocking=False):
+            raise CustomException(503, "too many login requests, please try again")
+        try:
+            if not self._running.acquire(timeout=self.timeout):
+                raise CustomException(503, "password hashing timed out, please try again")
+            try:
+                return function(*args)
+            finally:
+                self._running.release()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._call(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        if not pwhash:
+            return False
+        return self._call(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """
+        True if pwhash was made with another algorithm or cost than the
+        configured method.
+        """
+        if self._prefix is None:
+            # werkzeug fills in default parameters, hash once to learn them
+            self._prefix = self.hash("").split("$", 1)[0]
+        return not pwhash or pwhash.split("$", 1)[0] != self._prefix
+
+
+def get_password_hasher():
+    return current_app.extensions["password_hasher"]
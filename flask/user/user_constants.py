@@ -1,2 +1,6 @@
+import os
+
+from logs.logger_utils import LOG_DIR
+
 USER_LOGGER = "user_logger"
-USER_LOG_FILE_PATH = "./logs/user_importing_log_file.log"
+USER_LOG_FILE_PATH = os.path.join(LOG_DIR, "user_importing_log_file.log")
@@ -1,8 +1,14 @@
 from app.config import db
+from app.table_version import Versioned
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from user.password_hasher import get_password_hasher
+from utils.serialization import SerializerMixin
 from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
 import enum
+import hashlib
+import uuid
 
 
 class Role(enum.Enum):
@@ -16,10 +22,10 @@ class Role(enum.Enum):
 
     
 
-class User(db.Model,UserMixin):
+class User(db.Model, Versioned, UserMixin, SerializerMixin):
     __tablename__ = "users"
     id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(), nullable=False)
+    username = db.Column(db.String(), nullable=False, unique=True, index=True)
     email = db.Column(db.String(), nullable=False)
     password = db.Column(db.Text())
     deposit = db.Column(db.Float, nullable=False,default=0)    
@@ -31,10 +37,20 @@ class User(db.Model,UserMixin):
         return f"<User {self.username}>"
 
     def set_password(self, password):
-        self.password = generate_password_hash(password)
+        self.password = get_password_hasher().hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password, password)
+        return get_password_hasher().verify(self.password, password)
+
+    def rehash_password_if_needed(self, password):
+        """
+        re hash a just verified password made with an older algorithm or
+        cost, the caller saves the user.
+        """
+        if get_password_hasher().needs_rehash(self.password):
+            self.set_password(password)
+            return True
+        return False
 
     @classmethod
     def get_user_by_username(cls, username):
@@ -51,26 +67,70 @@ class User(db.Model,UserMixin):
 
 
 
+def jti_key(jti):
+    """
+    16 byte blocklist key of a jti: the bytes of a uuid jti (the ones
+    flask-jwt-extended makes), a digest of any other string.
+    """
+    try:
+        return uuid.UUID(jti).bytes
+    except ValueError:
+        return hashlib.blake2b(jti.encode(), digest_size=16).digest()
+
+
 class TokenBlocklist(db.Model):
+    """
+    revoked tokens, jti stored as jti_key(). exp is the token's expiry
+    (unix time, null for tokens that never expire), rows past it are
+    deleted by purge_expired_tokens().
+
+    id is AUTOINCREMENT so the ids of purged rows are never handed out
+    again, the workers' caches load the rows above the last id they saw.
+    """
+    __table_args__ = {"sqlite_autoincrement": True}
     id = db.Column(db.Integer(), primary_key=True)
-    jti = db.Column(db.String(), nullable=True)
+    jti = db.Column(db.LargeBinary(16), nullable=False, unique=True, index=True)
+    exp = db.Column(db.Integer(), nullable=True, index=True)
     create_at = db.Column(db.DateTime(), default=datetime.utcnow)
 
     def __repr__(self):
-        return f"<Token {self.jti}>"
+        return f"<Token {self.jti.hex()}>"
     
     def save(self):
         db.session.add(self)
+        TokenBlocklistVersion.bump()
         db.session.commit()
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
-        
\ No newline at end of file
+
+
+class TokenBlocklistVersion(db.Model):
+    """
+    single row counter bumped on every revocation, workers poll it to know
+    when their in-memory blocklist is stale.
+
+    the row is created with the table (create_all and the migrations), so a
+    revocation only ever updates it.
+    """
+    id = db.Column(db.Integer(), primary_key=True)
+    version = db.Column(db.Integer(), nullable=False, default=0)
+
+    @classmethod
+    def current(cls):
+        return db.session.execute(db.select(cls.version).where(cls.id == 1)).scalar()
+
+    @classmethod
+    def bump(cls):
+        bump = db.update(cls).where(cls.id == 1).values(version=cls.version + 1)
+        if db.session.execute(bump).rowcount:
+            return
+        # a database made without the row, the first revocations may race
+        # to insert it, the loser bumps the winner's row
+        try:
+            with db.session.begin_nested():
+                db.session.execute(db.insert(cls).values(id=1, version=1))
+        except IntegrityError:
+            db.session.execute(bump)
+
+
+@event.listens_for(TokenBlocklistVersion.__table__, "after_create")
+def _seed_blocklist_version(table, connection, **kw):
+    connection.execute(table.insert().values(id=1, version=0))
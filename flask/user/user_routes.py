@@ -1,10 +1,7 @@
-from flask import Blueprint, session, jsonify,request
+from flask import Blueprint, abort, session, jsonify,request
 from utils.role_required_decorator import role_required
-from flasgger import Swagger
-from flasgger.utils import swag_from
-from flasgger import LazyString, LazyJSONEncoder
 
-from schemas import UserSchema
+from schemas import user_serializer
 from flask_jwt_extended import (
     get_jwt,
     create_access_token,
@@ -13,9 +10,19 @@ from flask_jwt_extended import (
     current_user,
     get_jwt_identity,
 )
-from user.user_models import User, TokenBlocklist
+from app.database import read_replica
+from app.table_version import TableVersion
+from product.coin_change import change_coins, insert_coin
+from product.purchase import refund
+from user.user_models import User
+from user.blocklist_cache import get_blocklist_cache
+from user.identity_cache import CachedUser, get_identity_cache
 from logs.logging_aspects import view_logging_aspect
+from utils.custom_exception_class import CustomException
 from utils.exception_handler_decorator import handle_exceptions
+from utils.etag import listing_etag, not_modified, row_etag, with_etag
+from utils.streaming import ndjson_response, wants_ndjson
+from app.config import db
 from .user_constants import (
     USER_LOGGER,
     USER_LOG_FILE_PATH
@@ -26,8 +33,8 @@ auth_bp = Blueprint("auth", __name__)
 
 
 @handle_exceptions
-@view_logging_aspect(USER_LOGGER, USER_LOG_FILE_PATH)
 @auth_bp.post("/register")
+@view_logging_aspect(USER_LOGGER, USER_LOG_FILE_PATH)
 def register_user():
     """
     user register.
@@ -70,8 +77,8 @@ def register_user():
         
 
 @handle_exceptions
-@view_logging_aspect(USER_LOGGER, USER_LOG_FILE_PATH)
 @auth_bp.post("/login")
+@view_logging_aspect(USER_LOGGER, USER_LOG_FILE_PATH)
 def login_user():
     """
     user login.
@@ -90,6 +97,8 @@ def login_user():
     user = User.get_user_by_username(username=data.get("username"))
 
     if user and (user.check_password(password=data.get("password"))):
+        if user.rehash_password_if_needed(password=data.get("password")):
+            user.save()
         access_token = create_access_token(identity=user.username)
         refresh_token = create_refresh_token(identity=user.username)
         return (
@@ -129,25 +138,36 @@ def logout_user():
     jti = jwt['jti']
     token_type = jwt['type']
 
-    token_b = TokenBlocklist(jti=jti)
-
-    token_b.save()
+    get_blocklist_cache().revoke(jti, exp=jwt.get('exp'))
 
     return jsonify({"message": "token revoked successfully"}) , 200
 
 
 @handle_exceptions
-@view_logging_aspect(USER_LOGGER, USER_LOG_FILE_PATH)
 @auth_bp.get("/list")
 @jwt_required()
+@read_replica
+@view_logging_aspect(USER_LOGGER, USER_LOG_FILE_PATH)
 def list_users():
     """
     list users.
 
+    send "Accept: application/x-ndjson" to stream all users
+    (one json object per line) instead of a page.
+
+    the ETag follows the users table counter, If-None-Match gives 304
+    until a user changes.
 
     Returns:
     "tokens": list of all users
     """
+    etag = listing_etag("users", TableVersion.current(User.__tablename__))
+    cached = not_modified(etag)
+    if cached is not None:
+        return cached
+
+    if wants_ndjson():
+        return with_etag(etag, ndjson_response(db.select(User).order_by(User.id), user_serializer))
 
     page = request.args.get("page", default=1, type=int)
 
@@ -155,22 +175,22 @@ def list_users():
 
     users = User.query.paginate(page=page, per_page=per_page)
 
-    result = UserSchema().dump(users, many=True)
+    result = user_serializer.dump(users, many=True)
 
-    return (
+    return with_etag(
+        etag,
         jsonify(
             {
                 "users": result,
             }
         ),
-        200,
     )
     
 
 @handle_exceptions
-@view_logging_aspect(USER_LOGGER, USER_LOG_FILE_PATH)
 @auth_bp.get("/current/user")
 @jwt_required()
+@view_logging_aspect(USER_LOGGER, USER_LOG_FILE_PATH)
 def get_current_user():
     """
     get current user.
@@ -191,28 +211,38 @@ def get_current_user():
     )
 
 @handle_exceptions
-@view_logging_aspect(USER_LOGGER, USER_LOG_FILE_PATH)
 @auth_bp.get("/<int:user_id>")
 @jwt_required()
+@read_replica
+@view_logging_aspect(USER_LOGGER, USER_LOG_FILE_PATH)
 def get(user_id):
     """
     get user by id .
 
     param :user_id
 
+    with If-None-Match only the row version is read to answer 304.
+
     Returns:
     "tokens":  user data in success
     message error in fail
 
     """
+    if request.if_none_match:
+        version = db.session.execute(db.select(User.version).where(User.id == user_id)).scalar()
+        if version is None:
+            abort(404)
+        cached = not_modified(row_etag("user", user_id, version))
+        if cached is not None:
+            return cached
     user = User.query.get_or_404(user_id)
-    return jsonify(UserSchema().dump(user))
+    return with_etag(row_etag("user", user.id, user.version), jsonify(user.to_dict()))
 
 
 @handle_exceptions
-@view_logging_aspect(USER_LOGGER, USER_LOG_FILE_PATH)
 @auth_bp.put("/<int:user_id>")
 @jwt_required()
+@view_logging_aspect(USER_LOGGER, USER_LOG_FILE_PATH)
 def update_user(user_id):
     """
     update user fields .
@@ -225,6 +255,7 @@ def update_user(user_id):
 
     """
     user = User.query.get_or_404(user_id)
+    cached = CachedUser.from_user(user)
     data = request.get_json()
     if add_deposit(data.get('deposit', 0)):
         user.username = data.get('username', user.username)
@@ -236,8 +267,10 @@ def update_user(user_id):
             user.set_password(password=data.get("password"))
 
         user.save()
+        get_identity_cache().invalidate(cached)
+        get_identity_cache().invalidate(user)
 
-        return jsonify(UserSchema().dump(user))
+        return jsonify(user.to_dict())
     else:
         return jsonify({"error": "deposit can only with this values [0,5, 10, 20, 50, 100]"}), 400
 
@@ -245,9 +278,9 @@ def update_user(user_id):
 
 
 @handle_exceptions
-@view_logging_aspect(USER_LOGGER, USER_LOG_FILE_PATH)
 @auth_bp.delete("/<int:user_id>")
 @jwt_required()
+@view_logging_aspect(USER_LOGGER, USER_LOG_FILE_PATH)
 def delete_user(user_id):
     """
     delete user .
@@ -261,6 +294,7 @@ def delete_user(user_id):
     """
     user = User.query.get_or_404(user_id)
     user.delete()
+    get_identity_cache().invalidate(user)
     return jsonify(
         {
             "message": "user deleted"
@@ -272,9 +306,10 @@ def delete_user(user_id):
   
  
 @handle_exceptions
-@view_logging_aspect(USER_LOGGER, USER_LOG_FILE_PATH)
-@role_required('buyer')
 @auth_bp.post("/deposit/money")
+@jwt_required()
+@role_required('buyer')
+@view_logging_aspect(USER_LOGGER, USER_LOG_FILE_PATH)
 def deposit_money():
     """
     make current user  with a “buyer” role can deposit 5, 10, 20, 50, and 100 cent coins into their vending machine account and update it's balance in user table.
@@ -289,10 +324,13 @@ def deposit_money():
     """
     data = request.get_json()
     amount= data.get('amount')
-    if add_deposit(amount, user=current_user):
+    user = load_current_user()
+    if user is None:
+        return jsonify({"error": "user not found"}), 401
+    if add_deposit(amount, user=user):
         return jsonify(
         {
-            "message": f"you balance now is {current_user.deposit}"
+            "message": f"you balance now is {user.deposit}"
         },
         200
             )
@@ -319,25 +357,33 @@ def deposit_money():
 #     )
   
 @handle_exceptions
-@view_logging_aspect(USER_LOGGER, USER_LOG_FILE_PATH)
-@role_required('buyer')
 @auth_bp.post("/reset/deposit")
+@jwt_required()
+@role_required('buyer')
+@view_logging_aspect(USER_LOGGER, USER_LOG_FILE_PATH)
 def reset_deposit():
     """
-    make current user reset deposit balance( make it =0) in user table.
+    make current user reset deposit balance( make it =0) in user table and
+    pay it back in coins from the machine.
 
    .
 
     Returns:
-    success message
+    success message and the change
+    409 when the machine can not give exact change
 
     """
-    user =current_user
-    user.deposit= 0
-    user.save()
+    user = load_current_user()
+    if user is None:
+        return jsonify({"error": "user not found"}), 401
+    try:
+        receipt = refund(user.id)
+    except CustomException as e:
+        return jsonify({"error": e.message}), e.status_code
     return jsonify(
         {
-            "message": "you balance now is 0"
+            "message": "you balance now is 0",
+            "change": change_coins(receipt['change'])
         },
         200
     )  
@@ -345,6 +391,17 @@ def reset_deposit():
 
 
 
+def load_current_user():
+    """
+    the ORM row of the current user, None (and the cached identity dropped)
+    when the user was deleted while its identity was still cached.
+    """
+    user = current_user.load()
+    if user is None:
+        get_identity_cache().invalidate(current_user)
+    return user
+
+
 def add_deposit(value, user=None):
     """
     check money amount in [0,5, 10, 20, 50, 100]
@@ -358,7 +415,11 @@ def add_deposit(value, user=None):
     """
     if value in [0,5, 10, 20, 50, 100]:
         if user:
-            user.deposit= value
+            # added in sql, a concurrent deposit or purchase is not overwritten
+            user.deposit= User.deposit + value
+            if value:
+                # the coin goes into the machine, committed with the deposit
+                insert_coin(value)
             user.save()
         return True
     else:
@@ -0,0 +1,51 @@
+import hashlib
+
+from flask import current_app, make_response, request
+
+from utils.streaming import wants_ndjson
+
+
+def listing_etag(prefix, version):
+    """
+    etag of a listing: the table counter plus every query param and the
+    requested format, so other pages, filters or ndjson get other tags.
+    """
+    args = sorted(request.args.items(multi=True))
+    variant = f"{args!r}{wants_ndjson()}".encode()
+    return f"{prefix}-{version}-{hashlib.sha1(variant).hexdigest()[:16]}"
+
+
+def row_etag(prefix, row_id, version):
+    return f"{prefix}-{row_id}-{version}"
+
+
+def not_modified(etag):
+    """
+    304 response if the client sent this etag in If-None-Match, or the tag
+    of the encoding it would get (app.compression.encoded_etag()), else None.
+    the 304 carries the tag that matched.
+    """
+    compression = current_app.extensions.get("compression")
+    tags = [etag]
+    if compression is not None:
+        encoded = compression.request_etag(etag)
+        if encoded is not None:
+            tags.insert(0, encoded)
+    for tag in tags:
+        if request.if_none_match.contains_weak(tag):
+            response = make_response("", 304)
+            response.set_etag(tag)
+            if compression is not None:
+                response.vary.add("Accept-Encoding")
+            return response
+    return None
+
+
+def with_etag(etag, rv):
+    """
+    make a response of a view return value and tag it.
+    """
+    response = make_response(rv)
+    if response.status_code == 200:
+        response.set_etag(etag)
+    return response
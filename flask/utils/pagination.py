@@ -0,0 +1,100 @@
+import base64
+import json
+
+from sqlalchemy import tuple_
+
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def encode_cursor(payload):
+    """
+    encode keyset position as an opaque url safe token.
+
+    param :payload: json serializable dict
+
+    Returns:
+    cursor string
+
+    """
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """
+    decode cursor made by encode_cursor.
+
+    Returns:
+    payload dict, raise ValueError if cursor is malformed
+
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise ValueError("invalid cursor") from e
+    if not isinstance(payload, dict):
+        raise ValueError("invalid cursor")
+    return payload
+
+
+def _valid_position(key):
+    # [sort value, id] as written by keyset_paginate
+    return (
+        isinstance(key, list)
+        and len(key) == 2
+        and isinstance(key[0], (str, int, float))
+        and isinstance(key[1], int)
+        and not isinstance(key[1], bool)
+    )
+
+
+def page_size(value):
+    """
+    clamp requested page size to [1, MAX_PAGE_SIZE].
+    """
+    if value is None:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(value, MAX_PAGE_SIZE))
+
+
+def keyset_paginate(query, sort_column, id_column, sort_key, cursor=None, limit=DEFAULT_PAGE_SIZE, descending=False):
+    """
+    fetch one page of query ordered by (sort_column, id_column).
+
+    the position after the last row is encoded in the returned cursor, so the
+    next page is a range scan over the matching index instead of an OFFSET.
+
+    param :sort_key: name stored in the cursor, a cursor made for another
+    sort order is rejected
+
+    Returns:
+    (rows, next_cursor) next_cursor is None on the last page
+
+    """
+    if cursor:
+        payload = decode_cursor(cursor)
+        if payload.get("s") != sort_key or "k" not in payload:
+            raise ValueError("cursor does not match sort order")
+        if not _valid_position(payload["k"]):
+            raise ValueError("invalid cursor")
+        if sort_column is id_column:
+            position, boundary = id_column, payload["k"][-1]
+        else:
+            position, boundary = tuple_(sort_column, id_column), tuple_(*payload["k"])
+        query = query.filter(position < boundary if descending else position > boundary)
+
+    order = [sort_column] if sort_column is id_column else [sort_column, id_column]
+    query = query.order_by(*[c.desc() if descending else c.asc() for c in order])
+
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(
+            {"s": sort_key, "k": [getattr(last, sort_column.key), getattr(last, id_column.key)]}
+        )
+    return rows, next_cursor
@@ -0,0 +1,80 @@
+from marshmallow import fields
+
+
+# source of the conversion a field applies when dumping, by field class
+_CONVERTERS = {
+    fields.Integer: "int({})",
+    fields.Float: "float({})",
+    fields.String: "str({})",
+}
+
+_serializers = {}
+
+
+def _converter(field):
+    if type(field) in _CONVERTERS:
+        return _CONVERTERS[type(field)]
+    if type(field) is fields.Enum and not field.by_value:
+        return "{}.name"
+    return None
+
+
+def compile_dump(schema):
+    """
+    build a plain function dumping one object like schema.dump(obj).
+
+    integer, float, string and enum (by name) fields become inline
+    conversions of the attribute, any other field falls back to its own
+    serialize(). the fields are read once here, so a change of the schema
+    class needs a new compile.
+    """
+    namespace = {}
+    items = []
+    for index, (name, field) in enumerate(schema.dump_fields.items()):
+        attribute = field.attribute or name
+        key = field.data_key or name
+        converter = _converter(field)
+        if converter is not None and attribute.isidentifier():
+            value = converter.format("value")
+            items.append(f"{key!r}: None if (value := obj.{attribute}) is None else {value}")
+        else:
+            namespace[f"field_{index}"] = field
+            items.append(f"{key!r}: field_{index}.serialize({name!r}, obj)")
+    source = "def dump(obj):\n    return {\n" + "".join(f"        {item},\n" for item in items) + "    }\n"
+    exec(compile(source, f"<dump {type(schema).__name__}>", "exec"), namespace)
+    return namespace["dump"]
+
+
+class Serializer:
+    """
+    compiled dump of a marshmallow schema, a drop in for schema.dump() when
+    writing responses. build it once at import time and reuse it.
+    """
+
+    def __init__(self, schema):
+        self.schema = schema
+        self._dump = compile_dump(schema)
+
+    def dump(self, obj, many=False):
+        if many:
+            dump = self._dump
+            return [dump(item) for item in obj]
+        return self._dump(obj)
+
+
+def register_serializer(model, schema):
+    """
+    make schema the to_dict() of model, returns the Serializer.
+    """
+    serializer = Serializer(schema)
+    _serializers[model] = serializer
+    return serializer
+
+
+class SerializerMixin:
+    """
+    to_dict() through the Serializer registered for the model (see schemas.py).
+    """
+
+    def to_dict(self):
+        return _serializers[type(self)].dump(self)
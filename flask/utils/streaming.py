@@ -0,0 +1,40 @@
+from flask import Response, current_app, request, stream_with_context
+
+from app.config import db
+
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+STREAM_CHUNK_SIZE = 1000
+
+
+def wants_ndjson():
+    """
+    check if client asked for a streamed export (Accept: application/x-ndjson).
+    """
+    best = request.accept_mimetypes.best_match(["application/json", NDJSON_MIMETYPE])
+    return best == NDJSON_MIMETYPE
+
+
+def ndjson_response(statement, schema, chunk_size=STREAM_CHUNK_SIZE):
+    """
+    stream rows of statement as newline delimited json.
+
+    rows are fetched chunk_size at a time with yield_per and every chunk is
+    dumped and written before the next one is loaded, so memory stays flat no
+    matter how many rows the statement returns.
+
+    param :statement: select() of one ORM entity
+    param :schema: Serializer (or marshmallow schema) used to dump the rows
+
+    Returns:
+    streamed Response
+
+    """
+
+    def generate():
+        dumps = current_app.json.dumps
+        result = db.session.execute(statement.execution_options(yield_per=chunk_size)).scalars()
+        for rows in result.partitions():
+            yield "".join(dumps(row) + "\n" for row in schema.dump(rows, many=True))
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)